@@ -0,0 +1,14 @@
+# Maintenance commands, run as `python -m app.commands.<name>`.
+# Every model is imported so the mappers can resolve their relationships outside the API
+from app.models.product_model import Product
+from app.models.transaction_model import Transaction
+from app.models.client_model import Client
+from app.models.warehouse_model import Warehouse
+from app.models.alert_model import Alert
+from app.models.user_model import User
+from app.models.transaction_products_midtable import TransactionProduct
+from app.models.transaction_counter_model import TransactionCounter
+from app.models.stock_movement_model import StockMovement
+from app.models.inventory_summary_model import InventorySummary
+from app.models.product_movement_daily_model import ProductMovementDaily
+from app.models.warehouse_movement_daily_model import WarehouseMovementDaily
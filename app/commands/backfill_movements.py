@@ -0,0 +1,36 @@
+import argparse
+from datetime import date
+
+from app.db.database import SessionLocal
+from app.repository import movement_rollup_repository
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the daily movement buckets of the products and warehouses "
+                                                 "from the transactions, a chunk of days per database transaction.")
+    parser.add_argument("--from", type=date.fromisoformat, dest="date_from",
+                        help="First day (YYYY-MM-DD), the day of the oldest transaction by default")
+    parser.add_argument("--to", type=date.fromisoformat, dest="date_to",
+                        help="Last day (YYYY-MM-DD), the day of the newest transaction by default")
+    parser.add_argument("--chunk-days", type=int, default=31, help="Days rewritten and committed at a time")
+    args = parser.parse_args()
+
+    if args.chunk_days < 1:
+        raise SystemExit("--chunk-days must be at least 1")
+    if args.date_from and args.date_to and args.date_from > args.date_to:
+        raise SystemExit("--from must not be after --to")
+
+    db = SessionLocal()
+    try:
+        chunks = movement_rollup_repository.backfill_movements(db, args.chunk_days, args.date_from, args.date_to)
+    finally:
+        db.close()
+
+    logger.info("Movements backfilled in %s chunks.", chunks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import argparse
+import json
+import sys
+from datetime import date
+
+from fastapi import HTTPException
+from sqlalchemy import event, select, text
+
+from app.db.database import SessionLocal, engine
+from app.models.alert_model import Alert
+from app.models.client_model import Client
+from app.models.product_model import Product
+from app.models.transaction_products_midtable import TransactionProduct
+from app.models.user_model import User
+from app.models.warehouse_model import Warehouse
+from app.repository import (alert_repository, client_repository, inventory_summary_repository, kit_repository,
+                            movement_rollup_repository, product_repository, stock_movement_repository,
+                            transaction_repository, user_repository, warehouse_repository)
+from app.utils.logger import get_logger
+from app.utils.pagination import Page, PageParams
+
+logger = get_logger(__name__)
+
+PAGE_SIZE = 100
+
+
+class StatementCollector:
+
+    # Records the distinct SELECT statements sent while a repository function runs, with the
+    # parameters of their first execution (EXPLAIN needs real values to pick the plan)
+
+    def __init__(self):
+        self.current = None
+        self.statements = {}
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.current is None or executemany or not statement.lstrip().upper().startswith("SELECT"):
+            return
+        entry = self.statements.setdefault(statement, {"parameters": parameters, "functions": []})
+        if self.current not in entry["functions"]:
+            entry["functions"].append(self.current)
+
+
+def _sample_ids(db) -> dict:
+    # Rows with data behind them, so the nested reads do not stop at their 404
+    warehouse_id = db.scalar(select(Product.warehouse_id).group_by(Product.warehouse_id)
+                             .order_by(text("count(*) DESC")).limit(1))
+    return {
+        "warehouse_id": warehouse_id,
+        "product_id": db.scalar(select(TransactionProduct.product_id).limit(1)),
+        "kit_id": db.scalar(select(Product.kit_id).where(Product.kit_id.isnot(None)).limit(1)),
+        "transaction_id": db.scalar(select(TransactionProduct.transaction_id).limit(1)),
+        "client_id": db.scalar(select(Client.id).where(Client.client_transactions.any()).limit(1)),
+        "admin_id": db.scalar(select(User.admin_id).where(User.admin_id.isnot(None)).limit(1)),
+        "user_id": db.scalar(select(Warehouse.user_id).where(Warehouse.id == warehouse_id)),
+        "alert_id": db.scalar(select(Alert.id).limit(1)),
+        "alert_user_id": db.scalar(select(Alert.user_id).limit(1)),
+        "alert_product_id": db.scalar(select(Alert.product_id).limit(1)),
+        "search_query": db.scalar(select(Product.name).where(Product.warehouse_id == warehouse_id).limit(1)),
+    }
+
+
+def _first_chunk(stream):
+    # One chunk is enough to send the export query, closing the generator releases its session
+    try:
+        return next(stream, None)
+    finally:
+        stream.close()
+
+
+def _workload(ids: dict):
+    # (name, sample id it needs, call) of every read of the repositories, calls take (db, page).
+    # The async variants send the same statements as their sync counterparts
+    return [
+        ("alert_repository.get_alerts", None, lambda db, page: alert_repository.get_alerts(page, db)),
+        ("alert_repository.get_alert_by_id", "alert_id",
+         lambda db, page: alert_repository.get_alert_by_id(ids["alert_id"], db)),
+        ("client_repository.get_clients", None, lambda db, page: client_repository.get_clients(page, db)),
+        ("client_repository.get_client_by_id", "client_id",
+         lambda db, page: client_repository.get_client_by_id(ids["client_id"], db)),
+        ("client_repository.get_transactions_by_client_id", "client_id",
+         lambda db, page: client_repository.get_transactions_by_client_id(ids["client_id"], page, db)),
+        ("product_repository.get_products", None, lambda db, page: product_repository.get_products(page, db)),
+        ("product_repository.get_product_by_id", "product_id",
+         lambda db, page: product_repository.get_product_by_id(ids["product_id"], db)),
+        ("product_repository.get_products_by_product_id", "kit_id",
+         lambda db, page: product_repository.get_products_by_product_id(ids["kit_id"], db)),
+        ("kit_repository.get_bom_by_product_id", "kit_id",
+         lambda db, page: kit_repository.get_bom_by_product_id(ids["kit_id"], db)),
+        ("kit_repository.get_buildable_by_product_id", "kit_id",
+         lambda db, page: kit_repository.get_buildable_by_product_id(ids["kit_id"], db)),
+        ("kit_repository.kits_above", "kit_id", lambda db, page: kit_repository.kits_above([ids["kit_id"]], db)),
+        ("product_repository.get_transactions_by_product_id", "product_id",
+         lambda db, page: product_repository.get_transactions_by_product_id(ids["product_id"], page, db)),
+        ("product_repository.get_alerts_by_product_id", "alert_product_id",
+         lambda db, page: product_repository.get_alerts_by_product_id(ids["alert_product_id"], db)),
+        ("product_repository.search_products", "search_query",
+         lambda db, page: product_repository.search_products(ids["search_query"], ids["warehouse_id"], None, 20, db)),
+        ("stock_movement_repository.get_movements_by_product_id", "product_id",
+         lambda db, page: stock_movement_repository.get_movements_by_product_id(ids["product_id"], page, db)),
+        ("movement_rollup_repository.get_movements_by_product_id", "product_id",
+         lambda db, page: movement_rollup_repository.get_movements_by_product_id(
+             ids["product_id"], date(2000, 1, 1), None, "month", db)),
+        ("transaction_repository.get_transactions", None,
+         lambda db, page: transaction_repository.get_transactions(page, db)),
+        ("transaction_repository.get_transaction_by_id", "transaction_id",
+         lambda db, page: transaction_repository.get_transaction_by_id(ids["transaction_id"], db)),
+        ("transaction_repository.get_products_by_transaction_id", "transaction_id",
+         lambda db, page: transaction_repository.get_products_by_transaction_id(ids["transaction_id"], db)),
+        ("user_repository.get_users", None, lambda db, page: user_repository.get_users(page, db)),
+        ("user_repository.get_user_by_id", "user_id",
+         lambda db, page: user_repository.get_user_by_id(ids["user_id"], db)),
+        ("user_repository.get_users_by_user_id", "admin_id",
+         lambda db, page: user_repository.get_users_by_user_id(ids["admin_id"], db)),
+        ("user_repository.get_clients_by_user_id", "user_id",
+         lambda db, page: user_repository.get_clients_by_user_id(ids["user_id"], db)),
+        ("user_repository.get_warehouses_by_user_id", "user_id",
+         lambda db, page: user_repository.get_warehouses_by_user_id(ids["user_id"], db)),
+        ("user_repository.get_alerts_by_user_id", "alert_user_id",
+         lambda db, page: user_repository.get_alerts_by_user_id(ids["alert_user_id"], db)),
+        ("warehouse_repository.get_warehouses", None, lambda db, page: warehouse_repository.get_warehouses(page, db)),
+        ("warehouse_repository.get_warehouse_by_id", "warehouse_id",
+         lambda db, page: warehouse_repository.get_warehouse_by_id(ids["warehouse_id"], db)),
+        ("warehouse_repository.get_products_by_warehouse_id", "warehouse_id",
+         lambda db, page: warehouse_repository.get_products_by_warehouse_id(ids["warehouse_id"], page, db)),
+        ("warehouse_repository.get_transactions_by_warehouse_id", "warehouse_id",
+         lambda db, page: warehouse_repository.get_transactions_by_warehouse_id(ids["warehouse_id"], page, db)),
+        ("inventory_summary_repository.get_summary_by_warehouse_id", "warehouse_id",
+         lambda db, page: inventory_summary_repository.get_summary_by_warehouse_id(ids["warehouse_id"], db)),
+        ("movement_rollup_repository.get_movements_by_warehouse_id", "warehouse_id",
+         lambda db, page: movement_rollup_repository.get_movements_by_warehouse_id(
+             ids["warehouse_id"], date(2000, 1, 1), None, "month", db)),
+        ("warehouse_repository.stream_transactions_by_warehouse_id", "warehouse_id",
+         lambda db, page: _first_chunk(warehouse_repository.stream_transactions_by_warehouse_id(ids["warehouse_id"]))),
+    ]
+
+
+def run_workload(collector: StatementCollector):
+    db = SessionLocal()
+    try:
+        ids = _sample_ids(db)
+        logger.info("Sample rows: %s", ids)
+        for name, key, call in _workload(ids):
+            if key is not None and ids[key] is None:
+                logger.warning("Skipping %s, the database has no row for %s.", name, key)
+                continue
+            collector.current = name
+            page = PageParams(cursor=None, limit=PAGE_SIZE)
+            try:
+                # The first page and the next one, the keyset condition changes the plan
+                result = call(db, page)
+                if isinstance(result, Page) and result.next_cursor:
+                    call(db, PageParams(cursor=result.next_cursor, limit=PAGE_SIZE))
+            except HTTPException as e:
+                logger.warning("%s answered %s: %s", name, e.status_code, e.detail)
+            finally:
+                collector.current = None
+                db.rollback()
+    finally:
+        db.close()
+
+
+def _postgres_scans(plan: dict, found: list):
+    if plan.get("Node Type") == "Seq Scan":
+        found.append({"table": plan["Relation Name"], "filter": plan.get("Filter"), "rows": plan.get("Plan Rows")})
+    for child in plan.get("Plans", []):
+        _postgres_scans(child, found)
+
+
+def sequential_scans(connection, statement: str, parameters) -> list:
+    # Full table scans in the plan of the statement, EXPLAIN without ANALYZE so nothing is executed
+    cursor = connection.connection.cursor()
+    try:
+        found = []
+        if connection.dialect.name == "postgresql":
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            _postgres_scans(plan[0]["Plan"], found)
+        else:
+            # SQLite: 'SCAN product' reads the whole table, 'SCAN product USING INDEX' walks an index in order
+            # and 'SCAN product_search VIRTUAL TABLE INDEX' is a full text lookup
+            cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            for row in cursor.fetchall():
+                detail = row[-1]
+                if detail.startswith("SCAN ") and " USING " not in detail and " VIRTUAL TABLE " not in detail:
+                    found.append({"table": detail.split()[1], "filter": None, "rows": None})
+        return found
+    finally:
+        cursor.close()
+
+
+def table_rows(connection) -> dict:
+    if connection.dialect.name == "postgresql":
+        rows = connection.execute(text("SELECT relname, reltuples::bigint FROM pg_class "
+                                       "WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace"))
+        return {name: count for name, count in rows}
+    names = connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars().all()
+    return {name: connection.execute(text(f'SELECT count(*) FROM "{name}"')).scalar() for name in names}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run every repository read against the configured (seeded) database, EXPLAIN the statements "
+                    "they send and report the sequential scans. Exits with status 1 when one is found.")
+    parser.add_argument("--min-rows", type=int, default=1000,
+                        help="Ignore scans of tables with fewer rows, the planner rightly prefers them there")
+    parser.add_argument("--no-analyze", action="store_true", help="Do not refresh the planner statistics first")
+    parser.add_argument("--output", help="Also write the findings to this JSON file")
+    args = parser.parse_args()
+
+    if not args.no_analyze:
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+
+    collector = StatementCollector()
+    event.listen(engine, "before_cursor_execute", collector.before_cursor_execute)
+    try:
+        run_workload(collector)
+    finally:
+        event.remove(engine, "before_cursor_execute", collector.before_cursor_execute)
+
+    findings = []
+    with engine.connect() as connection:
+        rows = table_rows(connection)
+        for statement, entry in collector.statements.items():
+            for scan in sequential_scans(connection, statement, entry["parameters"]):
+                if rows.get(scan["table"], 0) < args.min_rows:
+                    continue
+                findings.append({**scan, "table_rows": rows.get(scan["table"]), "functions": entry["functions"],
+                                 "statement": " ".join(statement.split())})
+
+    for finding in findings:
+        logger.warning("Sequential scan on %s (%s rows) from %s, filter %s: %s", finding["table"],
+                       finding["table_rows"], ", ".join(finding["functions"]), finding["filter"], finding["statement"])
+    logger.info("Explained %s statements, %s sequential scans on tables with %s rows or more.",
+                len(collector.statements), len(findings), args.min_rows)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(findings, file, indent=2)
+
+    sys.exit(1 if findings else 0)
+
+
+if __name__ == "__main__":
+    main()
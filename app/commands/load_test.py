@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+from app.config.config import settings
+from app.db.database import Base, engine
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_MIX = "login=1,dashboard=6,warehouses=3,transaction=2"
+RESULTS_DIR = "load_test_results"
+
+
+class Recorder:
+
+    # Latency samples per route template, the app runs in this process so they include the whole stack
+    # (routing, validation, repositories, pool and database) but no network
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, route: str, elapsed: float, status_code: int):
+        self.latencies.setdefault(route, []).append(elapsed)
+        statuses = self.statuses.setdefault(route, {})
+        statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+        if status_code >= 400:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+
+async def call(client: httpx.AsyncClient, recorder: Recorder, method: str, route: str, url: str, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    recorder.record(f"{method} {route}", time.perf_counter() - start, response.status_code)
+    return response
+
+
+async def setup(client: httpx.AsyncClient, products: int) -> dict:
+    # Every run works on its own admin, warehouse and products so it can be repeated on the same database
+    run_id = uuid.uuid4().hex[:8]
+    username, password = f"loadtest-{run_id}", "loadtest"
+    response = await client.post("/user/", json={"username": username, "password": password,
+                                                 "email": f"{username}@loadtest.com", "role": "Admin",
+                                                 "image_url": None, "admin_id": None})
+    response.raise_for_status()
+    user_id = response.json()["id"]
+
+    response = await client.post("/login/", data={"username": username, "password": password})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = await client.post("/warehouse/", json={"name": f"Load test {run_id}", "address": "Load test",
+                                                      "phone": "000000000", "user_id": user_id}, headers=headers)
+    response.raise_for_status()
+    warehouse_id = response.json()["id"]
+
+    response = await client.post("/product/bulk", json=[
+        {"name": f"Product {index}", "quantity": 1_000_000, "serial_number": f"LT-{run_id}-{index}",
+         "price": 10.0, "description": None, "category": "Load test", "kit_id": None, "image_url": None,
+         "warehouse_id": warehouse_id}
+        for index in range(products)
+    ], headers=headers)
+    response.raise_for_status()
+    product_ids = [result["id"] for result in response.json()["results"] if result["status"] == "created"]
+
+    return {"username": username, "password": password, "headers": headers, "user_id": user_id,
+            "warehouse_id": warehouse_id, "product_ids": product_ids}
+
+
+async def scenario_login(client, recorder, context, rng):
+    await call(client, recorder, "POST", "/login/", "/login/",
+               data={"username": context["username"], "password": context["password"]})
+
+
+async def scenario_dashboard(client, recorder, context, rng):
+    headers = context["headers"]
+    product_id = rng.choice(context["product_ids"])
+    await call(client, recorder, "GET", "/user/warehouses/{user_id}", f"/user/warehouses/{context['user_id']}",
+               headers=headers)
+    await call(client, recorder, "GET", "/warehouse/products/{warehouse_id}",
+               f"/warehouse/products/{context['warehouse_id']}", headers=headers)
+    await call(client, recorder, "GET", "/product/{product_id}", f"/product/{product_id}", headers=headers)
+    await call(client, recorder, "GET", "/warehouse/transactions/{warehouse_id}",
+               f"/warehouse/transactions/{context['warehouse_id']}", params={"limit": 20}, headers=headers)
+
+
+async def scenario_warehouses(client, recorder, context, rng):
+    # First page and the one after it through the cursor
+    response = await call(client, recorder, "GET", "/warehouse/", "/warehouse/", params={"limit": 50},
+                          headers=context["headers"])
+    next_cursor = response.headers.get("X-Next-Cursor")
+    if next_cursor:
+        await call(client, recorder, "GET", "/warehouse/", "/warehouse/", params={"limit": 50, "cursor": next_cursor},
+                   headers=context["headers"])
+
+
+async def scenario_transaction(client, recorder, context, rng):
+    lines = rng.sample(context["product_ids"], k=min(rng.randint(2, 5), len(context["product_ids"])))
+    await call(client, recorder, "POST", "/transaction/", "/transaction/", json={
+        "type": rng.choice(["in", "out"]), "warehouse_id": context["warehouse_id"], "client_id": None,
+        "products": [{"product_id": product_id, "quantity": rng.randint(1, 5)} for product_id in lines]
+    }, headers=context["headers"])
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "dashboard": scenario_dashboard,
+    "warehouses": scenario_warehouses,
+    "transaction": scenario_transaction,
+}
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for entry in mix.split(","):
+        name, _, weight = entry.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}', use one of: {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def worker(client, recorder, context, weights: dict, deadline: float, seed: int):
+    rng = random.Random(seed)
+    names, name_weights = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        await SCENARIOS[rng.choices(names, name_weights)[0]](client, recorder, context, rng)
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    # Nearest rank
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    routes = {}
+    for route, latencies in sorted(recorder.latencies.items()):
+        latencies = sorted(latencies)
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": recorder.errors.get(route, 0),
+            "statuses": recorder.statuses[route],
+            "rps": round(len(latencies) / elapsed, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+        }
+    return routes
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, weights: dict) -> dict:
+    from app.main import app
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        context = await setup(client, args.products)
+
+        if args.warmup > 0:
+            await asyncio.gather(*(worker(client, Recorder(), context, weights, time.perf_counter() + args.warmup,
+                                          args.seed + index) for index in range(args.concurrency)))
+
+        recorder = Recorder()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(worker(client, recorder, context, weights, deadline, args.seed + index)
+                               for index in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    routes = summarize(recorder, elapsed)
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "started_at": started_at,
+        "commit": git_commit(),
+        "database": engine.dialect.name,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "mix": weights,
+        "settings": {
+            "db_pool_size": settings.DB_POOL_SIZE,
+            "db_max_overflow": settings.DB_MAX_OVERFLOW,
+            "cache_backend": settings.CACHE_BACKEND,
+            "hash_workers": settings.HASH_WORKERS,
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+        },
+        "total": {"requests": total, "errors": sum(route["errors"] for route in routes.values()),
+                  "rps": round(total / elapsed, 2)},
+        "routes": routes,
+    }
+
+
+def log_report(report: dict, baseline: dict = None):
+    logger.info("%s requests in %ss (%s req/s), %s errors, concurrency %s on %s.", report["total"]["requests"],
+                report["duration_s"], report["total"]["rps"], report["total"]["errors"], report["concurrency"],
+                report["database"])
+    for route, stats in report["routes"].items():
+        change = ""
+        previous = (baseline or {}).get("routes", {}).get(route)
+        if previous and previous["p95_ms"]:
+            change = f" ({(stats['p95_ms'] - previous['p95_ms']) / previous['p95_ms']:+.1%} p95 vs baseline)"
+        logger.info("%-45s %6s req %8s req/s  p50 %8sms  p95 %8sms  p99 %8sms  errors %s%s", route,
+                    stats["requests"], stats["rps"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"],
+                    stats["errors"], change)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive the API in process through its ASGI interface and report latency percentiles per route. "
+                    "The database comes from the settings, DATABASE_URL=sqlite:///loadtest.db runs it on SQLite.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Simulated clients running at the same time")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds measured")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds run before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scenario weights, default {DEFAULT_MIX}")
+    parser.add_argument("--products", type=int, default=200, help="Products created for the run")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the scenario choices")
+    parser.add_argument("--create-schema", action="store_true",
+                        help="Create the missing tables first, always done on SQLite")
+    parser.add_argument("--output", help=f"JSON file of the results, default {RESULTS_DIR}/<timestamp>.json")
+    parser.add_argument("--baseline", help="Results of a previous run to compare the p95 latencies with")
+    parser.add_argument("--app-log-level", default="WARNING", help="Level of the API logs during the run")
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+
+    logging.getLogger("stockify").setLevel(args.app_log_level.upper())
+    logger.setLevel(logging.INFO)
+
+    if args.create_schema or engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine)
+
+    report = asyncio.run(run(args, weights))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    log_report(report, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    logger.info("Results written to %s", output)
+
+
+if __name__ == "__main__":
+    main()
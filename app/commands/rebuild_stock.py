@@ -0,0 +1,31 @@
+import argparse
+
+from app.db.database import SessionLocal
+from app.repository import stock_movement_repository
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the materialized product quantities from the stock ledger.")
+    parser.add_argument("--product-id", type=int, action="append", dest="product_ids",
+                        help="Only check this product, can be repeated")
+    parser.add_argument("--dry-run", action="store_true", help="Report the drifted products without fixing them")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        drifted = stock_movement_repository.rebuild_stock(db, product_ids=args.product_ids, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    for row in drifted:
+        logger.warning("Product %s: quantity %s, ledger %s", row['product_id'], row['quantity'], row['expected'])
+
+    action = "found" if args.dry_run else "fixed"
+    logger.info("Stock rebuild %s %s drifted products.", action, len(drifted))
+
+
+if __name__ == "__main__":
+    main()
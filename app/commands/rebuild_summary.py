@@ -0,0 +1,34 @@
+import argparse
+
+from app.db.database import SessionLocal
+from app.repository import inventory_summary_repository
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the inventory summary (units and value per warehouse and "
+                                                 "category) from the products.")
+    parser.add_argument("--warehouse-id", type=int, action="append", dest="warehouse_ids",
+                        help="Only check this warehouse, can be repeated")
+    parser.add_argument("--dry-run", action="store_true", help="Report the drifted rows without fixing them")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        drifted = inventory_summary_repository.rebuild_summaries(db, warehouse_ids=args.warehouse_ids,
+                                                                 dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    for row in drifted:
+        logger.warning("Warehouse %s, category %s: stored %s, expected %s (products, units, value)",
+                       row['warehouse_id'], row['category'], row['stored'], row['expected'])
+
+    action = "found" if args.dry_run else "fixed"
+    logger.info("Inventory summary rebuild %s %s drifted rows.", action, len(drifted))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import argparse
+import bisect
+import csv
+import io
+import itertools
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+
+from app.db.database import engine
+from app.models.client_model import Client
+from app.models.inventory_summary_model import InventorySummary
+from app.models.product_model import Product
+from app.models.product_movement_daily_model import ProductMovementDaily
+from app.models.stock_movement_model import StockMovement
+from app.models.transaction_counter_model import TransactionCounter
+from app.models.transaction_model import Transaction
+from app.models.transaction_products_midtable import TransactionProduct
+from app.models.user_model import User
+from app.models.warehouse_model import Warehouse
+from app.models.warehouse_movement_daily_model import WarehouseMovementDaily
+from app.repository.inventory_summary_repository import write_summaries
+from app.repository.movement_rollup_repository import write_movements
+from app.repository.stock_movement_repository import REASON_IN, REASON_OPENING, REASON_OUT
+from app.utils.hashing import Hash
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CATEGORIES = ["Electronics", "Hardware", "Tools", "Food", "Beverages", "Cleaning", "Office", "Textile", "Toys",
+              "Garden", "Automotive", "Health", "Beauty", "Sports", "Books", "Furniture", "Pets", "Lighting",
+              "Plumbing", "Packaging"]
+
+# Tables written by the seed, parents first
+SEEDED_TABLES = [User, Warehouse, Client, Product, StockMovement, Transaction, TransactionProduct]
+
+
+def zipf_weights(count: int, skew: float, rng: random.Random) -> list:
+    # Weight 1/rank^skew, ranks shuffled so the big owners are not always the first ids
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return [1 / rank ** skew for rank in ranks]
+
+
+def split(total: int, weights: list) -> list:
+    # Deterministic split of total proportionally to the weights (largest remainder)
+    weight_sum = sum(weights)
+    shares = [total * weight / weight_sum for weight in weights]
+    counts = [int(share) for share in shares]
+    remainders = sorted(range(len(weights)), key=lambda index: counts[index] - shares[index])
+    for index in remainders[:total - sum(counts)]:
+        counts[index] += 1
+    return counts
+
+
+class WeightedChoice:
+
+    # O(log n) sampling of an index with the given weights
+
+    def __init__(self, weights: list):
+        self.cumulative = list(itertools.accumulate(weights))
+        self.total = self.cumulative[-1]
+
+    def __call__(self, rng: random.Random) -> int:
+        return bisect.bisect_right(self.cumulative, rng.random() * self.total)
+
+
+class TableWriter:
+
+    # Streams rows into a table: COPY on PostgreSQL, multi-row INSERT elsewhere
+
+    def __init__(self, connection, model, columns: list, batch_size: int):
+        self.connection = connection
+        self.table = model.__table__
+        self.columns = columns
+        self.batch_size = batch_size
+        self.copy = connection.dialect.name == "postgresql"
+        self.rows = 0
+
+    def write(self, rows):
+        start = time.perf_counter()
+        for batch in iter(lambda: list(itertools.islice(rows, self.batch_size)), []):
+            if self.copy:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                preparer = self.connection.dialect.identifier_preparer
+                columns = ", ".join(preparer.quote(column) for column in self.columns)
+                cursor = self.connection.connection.cursor()
+                cursor.copy_expert(f"COPY {preparer.quote(self.table.name)} ({columns}) FROM STDIN WITH (FORMAT csv)",
+                                   buffer)
+            else:
+                self.connection.execute(insert(self.table), [dict(zip(self.columns, row)) for row in batch])
+            self.rows += len(batch)
+
+        elapsed = time.perf_counter() - start
+        logger.info("Seeded %s rows into %s in %.1fs (%.0f rows/s).", self.rows, self.table.name, elapsed,
+                    self.rows / elapsed if elapsed else 0)
+
+
+def next_id(connection, model) -> int:
+    return (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def reset_sequence(connection, model):
+    # The ids were given explicitly, the serial sequence has to continue after them
+    if connection.dialect.name == "postgresql":
+        table = connection.dialect.identifier_preparer.quote(model.__tablename__)
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+
+def truncate(connection):
+    tables = [model.__table__ for model in SEEDED_TABLES + [TransactionCounter, InventorySummary,
+                                                              ProductMovementDaily, WarehouseMovementDaily]]
+    if connection.dialect.name == "postgresql":
+        # CASCADE also empties the tables that reference them, such as alert
+        preparer = connection.dialect.identifier_preparer
+        connection.execute(text(f"TRUNCATE {', '.join(preparer.quote(table.name) for table in tables)} CASCADE"))
+    else:
+        for table in reversed(tables):
+            connection.execute(table.delete())
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    password = Hash.hash_password(args.password)
+    now = datetime.now().replace(microsecond=0)
+
+    with engine.begin() as connection:
+        if args.truncate:
+            truncate(connection)
+        first = {model: next_id(connection, model) for model in (User, Warehouse, Client, Product, Transaction)}
+
+    def writer(connection, model, columns):
+        return TableWriter(connection, model, columns, args.batch_size)
+
+    # Users: the first tenth are admins, the employees belong to them with skew
+    admins = max(args.users // 10, 1)
+    user_ids = range(first[User], first[User] + args.users)
+    admin_ids = user_ids[:admins]
+    pick_admin = WeightedChoice(zipf_weights(admins, args.skew, rng))
+
+    def users():
+        for index, user_id in enumerate(user_ids):
+            is_admin = index < admins
+            yield (user_id, f"seed{args.seed}-user{user_id}", password, f"seed{args.seed}-user{user_id}@stockify.com",
+                   "Admin" if is_admin else "Employee", False, User.default_image_url,
+                   None if is_admin else admin_ids[pick_admin(rng)])
+
+    with engine.begin() as connection:
+        writer(connection, User, ["id", "username", "password", "email", "role", "stripe_subscription_status",
+                                  "image_url", "admin_id"]).write(users())
+
+    # Warehouses and clients belong to the users with skew, a few users own most of them
+    pick_user = WeightedChoice(zipf_weights(args.users, args.skew, rng))
+    warehouse_ids = range(first[Warehouse], first[Warehouse] + args.warehouses)
+    client_ids = range(first[Client], first[Client] + args.clients)
+
+    def warehouses():
+        for warehouse_id in warehouse_ids:
+            yield (warehouse_id, f"Warehouse {warehouse_id}", f"Street {rng.randint(1, 999)}, {warehouse_id}",
+                   f"6{rng.randint(10000000, 99999999)}", user_ids[pick_user(rng)])
+
+    def clients():
+        for client_id in client_ids:
+            yield (client_id, f"CLI-{args.seed}-{client_id}", f"Client {client_id}", f"Contact {client_id}",
+                   f"9{rng.randint(10000000, 99999999)}", f"client{client_id}@example.com",
+                   f"Avenue {rng.randint(1, 999)}, {client_id}", user_ids[pick_user(rng)])
+
+    with engine.begin() as connection:
+        writer(connection, Warehouse, ["id", "name", "address", "phone", "user_id"]).write(warehouses())
+        writer(connection, Client, ["id", "identifier", "name", "contact", "phone", "email", "address",
+                                    "user_id"]).write(clients())
+
+    # Products: each warehouse gets a contiguous block of ids sized with skew. Inside a block some products
+    # are components of an earlier product of the same warehouse, which can itself be a component, so the
+    # kits form hierarchies several levels deep
+    warehouse_weights = zipf_weights(args.warehouses, args.skew, rng)
+    product_counts = split(args.products, warehouse_weights)
+    product_starts = list(itertools.accumulate([first[Product]] + product_counts[:-1]))
+    pick_category = WeightedChoice(zipf_weights(len(CATEGORIES), args.skew, rng))
+
+    # Transactions go to the warehouses in proportion to their products, busy warehouses have big catalogs.
+    # Dates grow with the id over the last `days` days and the identifiers continue the monthly counters
+    pick_warehouse = WeightedChoice(product_counts)
+    pick_client = WeightedChoice(zipf_weights(args.clients, args.skew, rng)) if args.clients else None
+    period_start = now - timedelta(days=args.days)
+    step = timedelta(days=args.days) / max(args.transactions, 1)
+    transaction_ids = range(first[Transaction], first[Transaction] + args.transactions)
+    # Warehouse position, stock direction and second of every transaction, what its lines need
+    line_plan = array("i")
+    line_signs = array("b")
+    line_seconds = array("b")
+
+    with engine.connect() as connection:
+        counters = dict(connection.execute(select(TransactionCounter.period, TransactionCounter.last_value)).all())
+
+    def transaction_date(index: int) -> datetime:
+        return period_start + step * index + timedelta(seconds=line_seconds[index])
+
+    def transactions():
+        for index, transaction_id in enumerate(transaction_ids):
+            line_seconds.append(rng.randint(0, 59))
+            date = transaction_date(index)
+            period = date.strftime("%Y/%m")
+            counters[period] = counters.get(period, 0) + 1
+            position = pick_warehouse(rng)
+            transaction_type = "out" if rng.random() < 0.6 else "in"
+            client_id = client_ids[pick_client(rng)] if pick_client and transaction_type == "out" else None
+            line_plan.append(position)
+            line_signs.append(-1 if transaction_type == "out" else 1)
+            yield (transaction_id, f"TRAN-{period}-{counters[period]:04d}", date, transaction_type,
+                   warehouse_ids[position], client_id)
+
+    with engine.begin() as connection:
+        writer(connection, Transaction, ["id", "identifier", "date", "type", "warehouse_id",
+                                         "client_id"]).write(transactions())
+
+    # The lines are drawn from their own generator, replayed from the same state for each pass over them
+    line_rng = random.Random(rng.getrandbits(64))
+    line_state = line_rng.getstate()
+
+    def lines():
+        # Between 1 and 2 * lines - 1 distinct products per transaction, the first products of a
+        # warehouse are the most popular ones
+        line_rng.setstate(line_state)
+        for index, (transaction_id, position) in enumerate(zip(transaction_ids, line_plan)):
+            start, count = product_starts[position], product_counts[position]
+            wanted = min(line_rng.randint(1, 2 * args.lines - 1), count)
+            if wanted * 2 > count:
+                chosen = set(line_rng.sample(range(start, start + count), wanted))
+            else:
+                chosen = set()
+                while len(chosen) < wanted:
+                    chosen.add(start + int(count * line_rng.random() ** args.popularity))
+            for product_id in chosen:
+                yield index, transaction_id, product_id, line_rng.randint(1, 20)
+
+    # First pass: the net stock change of every product and the lowest point it reaches, in id order.
+    # The opening balance covers that low point, so the stock never goes negative and the lines leave
+    # each product with its opening plus its net
+    net = array("i", [0]) * args.products
+    low = array("i", [0]) * args.products
+    for index, _, product_id, quantity in lines():
+        local = product_id - first[Product]
+        net[local] += line_signs[index] * quantity
+        low[local] = min(low[local], net[local])
+    openings_quantity = array("i")
+
+    def products():
+        for warehouse_id, start, count in zip(warehouse_ids, product_starts, product_counts):
+            for local in range(count):
+                product_id = start + local
+                kit_id = start + rng.randrange(local) if local and rng.random() < args.kit_ratio else None
+                index = product_id - first[Product]
+                opening = max(min(int(rng.paretovariate(1.5) * 10), 100_000), -low[index])
+                openings_quantity.append(opening)
+                yield (product_id, f"Product {product_id}", opening + net[index], f"SN-{product_id}",
+                       f"{rng.uniform(0.5, 500):.2f}", None, kit_id, CATEGORIES[pick_category(rng)],
+                       Product.default_image_url, warehouse_id)
+
+    def openings():
+        # The opening balance of the stock ledger, dated at the start of the seeded period
+        for warehouse_id, start, count in zip(warehouse_ids, product_starts, product_counts):
+            for product_id in range(start, start + count):
+                yield (product_id, warehouse_id, None, openings_quantity[product_id - first[Product]],
+                       REASON_OPENING, period_start)
+
+    def line_movements():
+        # One ledger entry per line like create_transaction writes, rebuild_stock finds no drift
+        for index, transaction_id, product_id, quantity in lines():
+            sign = line_signs[index]
+            yield (product_id, warehouse_ids[line_plan[index]], transaction_id, sign * quantity,
+                   REASON_OUT if sign < 0 else REASON_IN, transaction_date(index))
+
+    with engine.begin() as connection:
+        writer(connection, Product, ["id", "name", "quantity", "serial_number", "price", "description", "kit_id",
+                                     "category", "image_url", "warehouse_id"]).write(products())
+        writer(connection, StockMovement, ["product_id", "warehouse_id", "transaction_id", "delta", "reason",
+                                           "date"]).write(openings())
+        # The products hold the stock left by the seeded lines, the summary is final once they are written
+        write_summaries(connection)
+    del net, low, openings_quantity
+
+    with engine.begin() as connection:
+        writer(connection, TransactionProduct, ["transaction_id", "product_id", "quantity"]).write(
+            (transaction_id, product_id, quantity) for _, transaction_id, product_id, quantity in lines())
+        writer(connection, StockMovement, ["product_id", "warehouse_id", "transaction_id", "delta", "reason",
+                                           "date"]).write(line_movements())
+        # The daily movement buckets of the seeded days, grouped from the lines just written
+        write_movements(connection, period_start.date(), now.date() + timedelta(days=1))
+
+        for period, last_value in counters.items():
+            connection.execute(TransactionCounter.__table__.delete().where(TransactionCounter.period == period))
+            connection.execute(insert(TransactionCounter).values(period=period, last_value=last_value))
+
+        for model in (User, Warehouse, Client, Product, Transaction):
+            reset_sequence(connection, model)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fill the database with a deterministic, skewed dataset of users, warehouses, clients, "
+                    "products (with kit hierarchies) and transactions. The defaults write about 10^7 "
+                    "transaction lines.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed, the same seed gives the same data")
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--warehouses", type=int, default=20_000)
+    parser.add_argument("--clients", type=int, default=50_000)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--transactions", type=int, default=2_000_000)
+    parser.add_argument("--lines", type=int, default=5, help="Average products per transaction")
+    parser.add_argument("--days", type=int, default=730, help="Days of history covered by the transactions")
+    parser.add_argument("--kit-ratio", type=float, default=0.05, help="Share of products that are kit components")
+    parser.add_argument("--skew", type=float, default=1.1,
+                        help="Zipf exponent of the ownership and activity distributions")
+    parser.add_argument("--popularity", type=float, default=3.0,
+                        help="Concentration of the transaction lines on the popular products of a warehouse")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Rows sent per COPY or INSERT")
+    parser.add_argument("--password", default="stockify", help="Password of every seeded user")
+    parser.add_argument("--truncate", action="store_true", help="Delete every row of the seeded tables first")
+    args = parser.parse_args()
+
+    if args.users < 1 or args.warehouses < 1 or args.products < 1:
+        raise SystemExit("At least one user, one warehouse and one product are required")
+
+    start = time.perf_counter()
+    seed(args)
+    logger.info("Seed %s finished in %.1fs.", args.seed, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
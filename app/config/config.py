@@ -20,6 +20,65 @@ class Settings:
     POSTGRES_SERVER:str = os.getenv('POSTGRES_SERVER')
     POSTGRES_PORT:str = os.getenv('POSTGRES_PORT')
 
-    DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
+    # DATABASE_URL replaces the POSTGRES_* settings (e.g. sqlite:///stockify.db for the tests),
+    # the async engine uses the same database through its async driver
+    DATABASE_URL = os.getenv(
+        'DATABASE_URL',
+        f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
+    )
+    ASYNC_DATABASE_URL = os.getenv(
+        'ASYNC_DATABASE_URL',
+        DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1).replace("sqlite://", "sqlite+aiosqlite://", 1)
+    )
+
+    # Connection pool configuration, size it against the number of uvicorn workers
+    DB_POOL_SIZE:int = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW:int = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT:int = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE:int = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING:bool = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_ECHO:bool = os.getenv('DB_ECHO', 'false').lower() == 'true'
+
+    # Per request SQL statistics (X-DB-Queries and Server-Timing headers) and the number of executions
+    # of the same statement in one request that is logged as a possible N+1
+    SQL_STATS_ENABLED:bool = os.getenv('SQL_STATS_ENABLED', 'true').lower() == 'true'
+    SQL_N_PLUS_ONE_THRESHOLD:int = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 5))
+
+    # Prometheus /metrics endpoint with request, repository, pool, threadpool and cache metrics
+    METRICS_ENABLED:bool = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # Rows fetched per round trip by the server-side cursor of the streaming exports
+    EXPORT_BATCH_SIZE:int = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+    # Rows sent per multi-row INSERT by the bulk endpoints
+    BULK_INSERT_CHUNK_SIZE:int = int(os.getenv('BULK_INSERT_CHUNK_SIZE', 1000))
+
+    # Transaction identifier numbers reserved per round trip by each worker, 1 keeps them in creation order.
+    # SQLite reserves them in the transaction of the request, always one at a time
+    TRANSACTION_ID_BLOCK_SIZE:int = int(os.getenv('TRANSACTION_ID_BLOCK_SIZE', 1))
+
+    # Read cache: 'memory' (per worker LRU), 'redis' (shared by every worker) or 'none'
+    CACHE_BACKEND:str = os.getenv('CACHE_BACKEND', 'memory').lower()
+    CACHE_TTL_SECONDS:int = int(os.getenv('CACHE_TTL_SECONDS', 30))
+    CACHE_MAX_ENTRIES:int = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+    REDIS_URL:str = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+    # Verified JWT claims kept in memory by each worker until the token expires
+    TOKEN_CACHE_MAX_ENTRIES:int = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', 10000))
+
+    # Password hashing: bcrypt work factor, processes that run it (0 hashes in the request thread)
+    # and hashes accepted at once before answering 503. Users are rehashed on login when the rounds change
+    BCRYPT_ROUNDS:int = int(os.getenv('BCRYPT_ROUNDS', 12))
+    HASH_WORKERS:int = int(os.getenv('HASH_WORKERS', 2))
+    HASH_MAX_PENDING:int = int(os.getenv('HASH_MAX_PENDING', 64))
+
+    # Logging: level of the stockify loggers, per module levels ('repository=WARNING,routers=DEBUG'),
+    # INFO/DEBUG records kept per message and second (0 keeps all), records buffered for the writer thread
+    # and one log file per process when several uvicorn workers share the logs directory
+    LOG_LEVEL:str = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_LEVELS:str = os.getenv('LOG_LEVELS', '')
+    LOG_SAMPLE_PER_SECOND:int = int(os.getenv('LOG_SAMPLE_PER_SECOND', 0))
+    LOG_QUEUE_SIZE:int = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_FILE_PER_PROCESS:bool = os.getenv('LOG_FILE_PER_PROCESS', 'false').lower() == 'true'
 
 settings = Settings()
\ No newline at end of file
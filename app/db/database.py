@@ -1,11 +1,53 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config.config import settings
-from app.utils.logger import logger
+from app.db.pool_stats import InstrumentedQueuePool, InstrumentedAsyncQueuePool
+from app.db.query_stats import instrument_engine
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
-engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    echo=settings.DB_ECHO,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+# Async engine (asyncpg) used by the read-heavy endpoints, it has its own pool with the same settings
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    echo=settings.DB_ECHO,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores the foreign keys, and their ON DELETE CASCADE, unless each connection turns them on
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _enable_sqlite_foreign_keys)
+    event.listen(async_engine.sync_engine, "connect", _enable_sqlite_foreign_keys)
+
+if settings.SQL_STATS_ENABLED:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
 
 Base = declarative_base()
 Base.metadata.create_all(bind=engine)
@@ -14,10 +56,21 @@ try:
     with engine.connect() as connection:
         logger.info("Successful connection to the database!")
 except Exception as e:
-    logger.error(f"Error connecting to the database: {e}")
+    logger.error("Error connecting to the database: %s", e)
 
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+def get_pool_stats():
+    return engine.pool.stats.snapshot(engine.pool)
+
+
+def get_async_pool_stats():
+    pool = async_engine.sync_engine.pool
+    return pool.stats.snapshot(pool)
+
 
 def get_db():
     db = SessionLocal()
@@ -25,3 +78,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,8 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def upsert_insert(bind, table):
+    # INSERT construct of the bind dialect that supports ON CONFLICT and RETURNING
+    if bind.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
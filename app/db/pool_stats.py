@@ -0,0 +1,149 @@
+import threading
+import time
+
+from greenlet import getcurrent
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds (in milliseconds) of the checkout latency histogram buckets
+CHECKOUT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolStats:
+
+    # Cumulative checkout statistics of a connection pool, shared by the recreated pools
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        # Waits that got a connection, the ones that timed out are kept apart so they do not skew the average
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeout_wait_time_total = 0.0
+        # Time spent opening the new (overflow) connections, kept out of the waits
+        self.connects = 0
+        self.connect_time_total = 0.0
+        self.connect_time_max = 0.0
+        self.buckets = [0] * (len(CHECKOUT_BUCKETS_MS) + 1)
+
+    def start_wait(self):
+        with self._lock:
+            self.waiting += 1
+
+    def cancel_wait(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def record_checkout(self, elapsed: float, connect_time: float = None):
+        elapsed_ms = elapsed * 1000
+        index = len(CHECKOUT_BUCKETS_MS)
+        for position, bound in enumerate(CHECKOUT_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                index = position
+                break
+
+        with self._lock:
+            self.waiting -= 1
+            self.checkouts += 1
+            self.wait_time_total += elapsed_ms
+            self.wait_time_max = max(self.wait_time_max, elapsed_ms)
+            self.buckets[index] += 1
+            if connect_time is not None:
+                self.connects += 1
+                self.connect_time_total += connect_time * 1000
+                self.connect_time_max = max(self.connect_time_max, connect_time * 1000)
+
+    def record_timeout(self, elapsed: float):
+        with self._lock:
+            self.waiting -= 1
+            self.timeouts += 1
+            self.timeout_wait_time_total += elapsed * 1000
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            checkouts = self.checkouts
+            histogram = [
+                {"le_ms": bound, "count": count}
+                for bound, count in zip(CHECKOUT_BUCKETS_MS + (None,), self.buckets)
+            ]
+            data = {
+                "waiting": self.waiting,
+                "checkouts": checkouts,
+                "timeouts": self.timeouts,
+                "wait_time_total_ms": round(self.wait_time_total, 3),
+                "wait_time_max_ms": round(self.wait_time_max, 3),
+                "wait_time_avg_ms": round(self.wait_time_total / checkouts, 3) if checkouts else 0.0,
+                "timeout_wait_time_total_ms": round(self.timeout_wait_time_total, 3),
+                "connects": self.connects,
+                "connect_time_total_ms": round(self.connect_time_total, 3),
+                "connect_time_max_ms": round(self.connect_time_max, 3),
+                "checkout_latency_histogram": histogram,
+            }
+
+        data.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+        return data
+
+
+class InstrumentedPoolMixin:
+
+    # Times every checkout of the pool, including the time spent waiting for a free connection. Opening a new
+    # connection is timed apart, a checkout that connects records only the rest as its wait
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        # Connect time of the checkouts in progress, by greenlet: the async pool runs many of them on one thread
+        self._checkouts = {}
+
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool.stats = self.stats
+        return new_pool
+
+    def _do_get(self):
+        # QueuePool._do_get calls itself again on its overflow and retry paths, only the outermost call is recorded
+        checkout = getcurrent()
+        if checkout in self._checkouts:
+            return super()._do_get()
+
+        self._checkouts[checkout] = None
+        self.stats.start_wait()
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.perf_counter() - start)
+            raise
+        except Exception:
+            self.stats.cancel_wait()
+            raise
+        finally:
+            connect_time = self._checkouts.pop(checkout)
+        elapsed = time.perf_counter() - start
+        self.stats.record_checkout(elapsed - (connect_time or 0.0), connect_time)
+        return connection
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        connection = super()._create_connection()
+        checkout = getcurrent()
+        if checkout in self._checkouts:
+            self._checkouts[checkout] = time.perf_counter() - start
+        return connection
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
@@ -0,0 +1,28 @@
+from functools import lru_cache
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import Session
+
+
+@lru_cache(maxsize=None)
+def projection(model, schema) -> tuple:
+    # Mapped columns of the model named like the fields of the response schema, in the schema order.
+    # Selecting them instead of the entity returns plain Row tuples: nothing is hydrated into the
+    # identity map and the columns no response shows (password hashes, Stripe ids) stay in the database
+    mapped = inspect(model).column_attrs.keys()
+    return tuple(getattr(model, name) for name in schema.model_fields if name in mapped)
+
+
+def select_projection(model, schema, *extra):
+    return select(*projection(model, schema), *extra)
+
+
+def query_projection(db: Session, model, schema, *extra):
+    return db.query(*projection(model, schema), *extra)
+
+
+def row_dict(row, **extra) -> dict:
+    # Response dict of a projected row plus its nested collections
+    data = row._asdict()
+    data.update(extra)
+    return data
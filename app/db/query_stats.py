@@ -0,0 +1,57 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.config.config import settings
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueryStats:
+
+    # Statements executed and database time spent by one request. The middleware sets it in a context
+    # variable, the threadpool and the async driver copy the context so every query of the request lands here
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int):
+        # The same SQL run several times in one request usually is a lazy load or a query inside a loop
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start_time"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("query_start_time")
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    # Works for the async engine too through its sync_engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def report_repeated_statements(stats: QueryStats, method: str, path: str):
+    for statement, count in stats.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD):
+        logger.warning("Possible N+1 in %s %s: statement executed %s times: %s",
+                       method, path, count, " ".join(statement.split())[:300])
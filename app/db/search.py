@@ -0,0 +1,53 @@
+from sqlalchemy import DDL
+
+# Product search. Postgres matches with pg_trgm (GIN trigram indexes declared on the model), SQLite with an
+# FTS5 table using the trigram tokenizer, kept in sync with the product table by triggers
+
+SEARCH_COLUMNS = ("name", "serial_number", "category", "description")
+SEARCH_TABLE = "product_search"
+
+PG_TRGM_EXTENSION = DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+SQLITE_SEARCH_DDL = [
+    DDL(f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        f"{', '.join(SEARCH_COLUMNS)}, content='product', content_rowid='id', tokenize='trigram')"),
+    DDL(f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON product BEGIN "
+        f"INSERT INTO {SEARCH_TABLE}(rowid, {', '.join(SEARCH_COLUMNS)}) "
+        f"VALUES (new.id, {', '.join('new.' + column for column in SEARCH_COLUMNS)}); END"),
+    DDL(f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON product BEGIN "
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {', '.join(SEARCH_COLUMNS)}) "
+        f"VALUES ('delete', old.id, {', '.join('old.' + column for column in SEARCH_COLUMNS)}); END"),
+    DDL(f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF {', '.join(SEARCH_COLUMNS)} ON product BEGIN "
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {', '.join(SEARCH_COLUMNS)}) "
+        f"VALUES ('delete', old.id, {', '.join('old.' + column for column in SEARCH_COLUMNS)}); "
+        f"INSERT INTO {SEARCH_TABLE}(rowid, {', '.join(SEARCH_COLUMNS)}) "
+        f"VALUES (new.id, {', '.join('new.' + column for column in SEARCH_COLUMNS)}); END"),
+]
+SQLITE_SEARCH_REBUILD = DDL(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+SQLITE_SEARCH_DROP = DDL(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def like_pattern(query: str, prefix: bool = False) -> str:
+    # Substring (or prefix) pattern with the LIKE wildcards of the query escaped (escape character '\')
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%" if prefix else f"%{escaped}%"
+
+
+def fts_query(query: str, fuzzy: bool = True) -> str:
+    # FTS5 expression for the trigram tokenizer: the whole query as a substring, and when fuzzy OR any of
+    # its trigrams, so a misspelt query still matches and bm25 ranks the rows sharing more trigrams first
+    query = query.lower()
+    terms = [query] + ([query[i:i + 3] for i in range(len(query) - 2)] if fuzzy else [])
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in dict.fromkeys(terms))
+
+
+def include_object(dialect_name: str):
+    # Alembic autogenerate filter: the FTS5 table (and its shadow tables) only exists on SQLite and
+    # the trigram indexes only on Postgres
+    def include(obj, name, type_, reflected, compare_to):
+        if type_ == "table" and name.startswith(SEARCH_TABLE):
+            return False
+        if type_ == "index" and name.endswith("_trgm") and dialect_name != "postgresql":
+            return False
+        return True
+    return include
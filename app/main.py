@@ -1,18 +1,17 @@
-import logging
-
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import Response
 from starlette.middleware.cors import CORSMiddleware
 
+from app import repository
 from app.routers import user_router, login_router, warehouse_router, product_router, transaction_router, client_router, \
-    alert_router,payment_router
+    alert_router,payment_router, admin_router
+from app.config.config import settings
+from app.utils.logger import get_logger
+from app.utils.metrics import MetricsMiddleware, CONTENT_TYPE, instrument_repositories, render_metrics
+from app.utils.server_timing import ServerTimingMiddleware, DB_QUERIES_HEADER, SERVER_TIMING_HEADER
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("StockifyAPI.log"), logging.StreamHandler()],
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 app = FastAPI(title="Stockify.API")
 app.add_middleware(
@@ -21,8 +20,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", DB_QUERIES_HEADER, SERVER_TIMING_HEADER],
 )
 
+# Request counts and latencies for /metrics, it reads the query statistics so it goes inside ServerTimingMiddleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_repositories(repository)
+
+# Query count and database time of every request in the response headers
+if settings.SQL_STATS_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
 # Including routers to handle different endpoints
 app.include_router(user_router.router)
 app.include_router(warehouse_router.router)
@@ -32,6 +41,15 @@ app.include_router(client_router.router)
 app.include_router(alert_router.router)
 app.include_router(login_router.router)
 app.include_router(payment_router.router)
+app.include_router(admin_router.router)
+
+
+# Prometheus scrape endpoint, the counters belong to the worker process that answers
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
 
 # Running the FastAPI application with Uvicorn
 if __name__ == "__main__":
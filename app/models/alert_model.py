@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, CheckConstraint, DateTime, Boolean, func
+from sqlalchemy import Column, Integer, String, ForeignKey, CheckConstraint, DateTime, Boolean, Index, func, false
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
@@ -8,8 +8,10 @@ class Alert(Base):
     __tablename__ = 'alert'
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, index=True, nullable=False, server_default=func.now())
+    date = Column(DateTime, nullable=False, server_default=func.now())
     read = Column(Boolean, nullable=False, default=False)
+    # Whether the product quantity is currently past the threshold, kept by alert_repository.evaluate_alerts
+    triggered = Column(Boolean, nullable=False, default=False, server_default=false())
     min_quantity = Column(Integer)
     max_quantity = Column(Integer)
     max_message = Column(String(255))
@@ -30,4 +32,10 @@ class Alert(Base):
             "(min_quantity IS NULL AND max_quantity IS NOT NULL)",
             name="check_discount_or_offer"
         ),
+
+        # Indexes of the keyset pages (date, id), the alerts of a user (read or not) and the alerts of the
+        # products whose quantity changed
+        Index('ix_alert_date_id', 'date', 'id'),
+        Index('ix_alert_user_read_date', 'user_id', 'read', 'date'),
+        Index('ix_alert_product_id', 'product_id'),
     )
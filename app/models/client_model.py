@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
@@ -9,7 +9,7 @@ class Client(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     identifier = Column(String(100), index=True, nullable=False, unique=True)
-    name = Column(String(150), index=True, nullable=False)
+    name = Column(String(150), nullable=False)
     contact = Column(String(150))
     phone = Column(String(50))
     email = Column(String(150))
@@ -19,3 +19,9 @@ class Client(Base):
     # Relationship
     client_user = relationship("User", back_populates="user_clients")
     client_transactions = relationship("Transaction", back_populates="transaction_client")
+
+    # Indexes
+    __table_args__ = (
+        Index('ix_client_name_id', 'name', 'id'),
+        Index('ix_client_user_id', 'user_id'),
+    )
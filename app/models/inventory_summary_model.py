@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, BigInteger, Numeric
+
+from app.db.database import Base
+
+
+class InventorySummary(Base):
+    __tablename__ = 'inventory_summary'
+
+    # Products, units and value (quantity * price) per warehouse and category, kept current by every write
+    # that changes them. Products without category are summed under ''
+    warehouse_id = Column(Integer, ForeignKey("warehouse.id", ondelete="CASCADE"), primary_key=True)
+    category = Column(String(50), primary_key=True)
+    products = Column(Integer, nullable=False, default=0)
+    units = Column(BigInteger, nullable=False, default=0)
+    value = Column(Numeric(16, 2), nullable=False, default=0)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, CheckConstraint, Numeric, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, CheckConstraint, Numeric, UniqueConstraint, Index, event
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
+from app.db.search import SEARCH_COLUMNS, PG_TRGM_EXTENSION, SQLITE_SEARCH_DDL, SQLITE_SEARCH_DROP
 
 
 class Product(Base):
@@ -11,7 +12,7 @@ class Product(Base):
     default_image_url = "https://stockifystorage.s3.us-east-1.amazonaws.com/user_profiles/Flux_Dev_A_stylized_icon_for_a_modern_storage_company_featurin_1.jpeg"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(150), index=True, nullable=False)
+    name = Column(String(150), nullable=False)
     quantity = Column(Integer, index=True, nullable=False)
     serial_number = Column(String(30), index=True, nullable=False)
     price = Column(Numeric(10, 2), nullable=False)
@@ -33,6 +34,20 @@ class Product(Base):
         CheckConstraint('quantity >= 0', name='check_quantity_non_negative'),
 
         # Ensures that a serial number is not repeated within the same warehouse
-        UniqueConstraint('serial_number', 'warehouse_id', name='uq_serial_warehouse')
+        UniqueConstraint('serial_number', 'warehouse_id', name='uq_serial_warehouse'),
 
+        # Indexes of the keyset pages by name, of the products of a warehouse and of the components of a kit
+        Index('ix_product_name_id', 'name', 'id'),
+        Index('ix_product_warehouse_name', 'warehouse_id', 'name', 'id'),
+        Index('ix_product_kit_id', 'kit_id'),
+
+        # Trigram indexes of the product search (Postgres only, SQLite searches its FTS5 table)
+        *(Index(f'ix_product_{column}_trgm', column, postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'}).ddl_if(dialect='postgresql') for column in SEARCH_COLUMNS),
     )
+
+
+event.listen(Product.__table__, 'before_create', PG_TRGM_EXTENSION.execute_if(dialect='postgresql'))
+for search_ddl in SQLITE_SEARCH_DDL:
+    event.listen(Product.__table__, 'after_create', search_ddl.execute_if(dialect='sqlite'))
+event.listen(Product.__table__, 'after_drop', SQLITE_SEARCH_DROP.execute_if(dialect='sqlite'))
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, ForeignKey, BigInteger, Date
+
+from app.db.database import Base
+
+
+class ProductMovementDaily(Base):
+    __tablename__ = 'product_movement_daily'
+
+    # Units of a product in the 'in' and 'out' transactions of each day (UTC), kept current by every
+    # transaction written or deleted. The movement reports sum these buckets instead of the transaction lines
+    product_id = Column(Integer, ForeignKey("product.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    quantity_in = Column(BigInteger, nullable=False, default=0)
+    quantity_out = Column(BigInteger, nullable=False, default=0)
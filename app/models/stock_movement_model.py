@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, func
+from sqlalchemy.orm import relationship
+
+from app.db.database import Base
+
+
+class StockMovement(Base):
+    __tablename__ = 'stock_movement'
+
+    # Append-only ledger of stock changes, Product.quantity is the running sum of its deltas
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("product.id", ondelete="CASCADE"), nullable=False)
+    warehouse_id = Column(Integer, ForeignKey("warehouse.id", ondelete="CASCADE"), nullable=False)
+    transaction_id = Column(Integer, ForeignKey("transaction.id", ondelete="SET NULL"), nullable=True)
+    delta = Column(Integer, nullable=False)
+    reason = Column(String(20), nullable=False)
+    date = Column(DateTime, nullable=False, server_default=func.now())
+
+    # Relationship
+    movement_product = relationship("Product")
+    movement_transaction = relationship("Transaction")
+
+    # Indexes
+    __table_args__ = (
+        Index('ix_stock_movement_product_date', 'product_id', 'date', 'id'),
+        Index('ix_stock_movement_warehouse_date', 'warehouse_id', 'date'),
+        Index('ix_stock_movement_transaction_id', 'transaction_id'),
+    )
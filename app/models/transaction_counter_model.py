@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String
+
+from app.db.database import Base
+
+
+class TransactionCounter(Base):
+    __tablename__ = 'transaction_counter'
+
+    # One row per month ('YYYY/MM'), last_value is the last identifier number reserved for it
+    period = Column(String(7), primary_key=True)
+    last_value = Column(Integer, nullable=False, default=0)
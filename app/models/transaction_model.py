@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
@@ -9,7 +9,7 @@ class Transaction(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     identifier = Column(String(100), index=True, nullable=False, unique=True)
-    date = Column(DateTime, index=True, nullable=False, server_default=func.now())
+    date = Column(DateTime, nullable=False, server_default=func.now())
     type = Column(String(50), index=True, nullable=False)
     warehouse_id = Column(Integer, ForeignKey("warehouse.id", ondelete="CASCADE"), nullable=False)
     client_id = Column(Integer, ForeignKey("client.id"), nullable=True)
@@ -18,3 +18,10 @@ class Transaction(Base):
     transaction_products = relationship("TransactionProduct", back_populates="transaction", cascade="all, delete-orphan")
     transaction_warehouse = relationship("Warehouse", back_populates="warehouse_transactions")
     transaction_client = relationship("Client", back_populates="client_transactions")
+
+    # Indexes of the keyset pages, newest first, of all transactions and of those of a warehouse or client
+    __table_args__ = (
+        Index('ix_transaction_date_id', 'date', 'id'),
+        Index('ix_transaction_warehouse_date', 'warehouse_id', 'date', 'id'),
+        Index('ix_transaction_client_date', 'client_id', 'date', 'id'),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -12,3 +12,9 @@ class TransactionProduct(Base):
     # Relaciones ORM
     transaction = relationship("Transaction", back_populates="transaction_products")
     product = relationship("Product", back_populates="transaction_products")
+
+    # The primary key only serves lookups by transaction, this one the transactions of a product.
+    # On Postgres it carries the quantity too, so the lines are read from the index alone
+    __table_args__ = (
+        Index('ix_transaction_products_product', 'product_id', 'transaction_id', postgresql_include=['quantity']),
+    )
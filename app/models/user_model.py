@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
@@ -25,3 +25,8 @@ class User(Base):
     user_warehouses = relationship("Warehouse", back_populates="warehouse_user")
     user_clients = relationship("Client", back_populates="client_user")
     user_alerts = relationship("Alert", back_populates="alert_user")
+
+    # Indexes
+    __table_args__ = (
+        Index('ix_user_admin_id', 'admin_id'),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
@@ -8,7 +8,7 @@ class Warehouse(Base):
     __tablename__ = 'warehouse'
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(150), index=True, nullable=False)
+    name = Column(String(150), nullable=False)
     address = Column(String(200))
     phone = Column(String(50))
     user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
@@ -17,3 +17,9 @@ class Warehouse(Base):
     warehouse_user = relationship("User", back_populates="user_warehouses")
     warehouse_products = relationship("Product", back_populates="product_warehouse")
     warehouse_transactions = relationship("Transaction", back_populates="transaction_warehouse")
+
+    # Indexes
+    __table_args__ = (
+        Index('ix_warehouse_name_id', 'name', 'id'),
+        Index('ix_warehouse_user_id', 'user_id'),
+    )
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, ForeignKey, BigInteger, Date
+
+from app.db.database import Base
+
+
+class WarehouseMovementDaily(Base):
+    __tablename__ = 'warehouse_movement_daily'
+
+    # Units in the 'in' and 'out' transactions of a warehouse on each day (UTC), the same buckets as
+    # product_movement_daily summed per warehouse so its reports read one row per day
+    warehouse_id = Column(Integer, ForeignKey("warehouse.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    quantity_in = Column(BigInteger, nullable=False, default=0)
+    quantity_out = Column(BigInteger, nullable=False, default=0)
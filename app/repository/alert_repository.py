@@ -1,20 +1,51 @@
 from datetime import datetime, timezone
 
 from fastapi import HTTPException, status
+from sqlalchemy import and_, case, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.utils.logger import logger
+from app.db.projection import query_projection, select_projection
+from app.utils.logger import get_logger
 from app.models.alert_model import Alert
+from app.models.product_model import Product
+from app.schemas.alert_schema import AlertResponseSchema
+from app.utils.cache import invalidate
+from app.utils.pagination import PageParams, keyset, build_page
 
+logger = get_logger(__name__)
 
-def get_alerts(db: Session):
+
+def get_alerts(page: PageParams, db: Session):
     try:
-        logger.info("Fetching all alerts from the database.")
-        data = db.query(Alert).all()
-        logger.info(f"Found {len(data)} alerts.")
-        return data
+        logger.info("Fetching alerts page from the database.")
+        alerts_query = query_projection(db, Alert, AlertResponseSchema)
+        data = keyset(alerts_query, Alert.date, Alert.id, page, descending=True).all()
+        alerts_page = build_page(data, page, "date")
+        logger.info("Found %s alerts.", len(alerts_page.data))
+        return alerts_page
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching alerts: {e}")
+        logger.error("Error fetching alerts: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching alerts: {e}"
+        )
+
+
+async def get_alerts_async(page: PageParams, db: AsyncSession):
+    try:
+        logger.info("Fetching alerts page from the database.")
+        result = await db.execute(
+            keyset(select_projection(Alert, AlertResponseSchema), Alert.date, Alert.id, page, descending=True))
+        alerts_page = build_page(result.all(), page, "date")
+        logger.info("Found %s alerts.", len(alerts_page.data))
+        return alerts_page
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching alerts: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching alerts: {e}"
@@ -23,24 +54,86 @@ def get_alerts(db: Session):
 
 def get_alert_by_id(alert_id: int, db: Session):
     try:
-        logger.info(f"Fetching alert with ID {alert_id}.")
+        logger.info("Fetching alert with ID %s.", alert_id)
         alert = db.query(Alert).filter(Alert.id == alert_id).first()
         if not alert:
-            logger.warning(f"Alert with ID {alert_id} not found.")
+            logger.warning("Alert with ID %s not found.", alert_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Alert with ID {alert_id} does not exist"
             )
-        logger.info(f"Alert with ID {alert_id} found.")
+        logger.info("Alert with ID %s found.", alert_id)
         return alert
     except Exception as e:
-        logger.error(f"Error fetching alert with ID {alert_id}: {e}")
+        logger.error("Error fetching alert with ID %s: %s", alert_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching alert: {e}"
         )
 
 
+async def get_alert_by_id_async(alert_id: int, db: AsyncSession):
+    try:
+        logger.info("Fetching alert with ID %s.", alert_id)
+        alert = await db.get(Alert, alert_id)
+        if not alert:
+            logger.warning("Alert with ID %s not found.", alert_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Alert with ID {alert_id} does not exist"
+            )
+        logger.info("Alert with ID %s found.", alert_id)
+        return alert
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching alert with ID %s: %s", alert_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching alert: {e}"
+        )
+
+
+def evaluate_alerts(product_ids, db: Session):
+    # Compares the thresholds of every alert of the given products with their current quantity and flips the
+    # alerts that crossed one, all in a single UPDATE ... FROM product ... RETURNING. Alerts that start
+    # triggering are dated now and marked unread again. The caller owns the commit, and afterwards invalidates
+    # the "alerts" scope of the users in the returned rows.
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+
+    past_threshold = or_(
+        and_(Alert.min_quantity.isnot(None), Product.quantity <= Alert.min_quantity),
+        and_(Alert.max_quantity.isnot(None), Product.quantity >= Alert.max_quantity),
+    )
+
+    changed = db.execute(
+        update(Alert)
+        .where(Alert.product_id == Product.id)
+        .where(Product.id.in_(product_ids))
+        .where(Alert.triggered != past_threshold)
+        .values(triggered=past_threshold,
+                read=Alert.read & ~past_threshold,
+                date=case((past_threshold, datetime.now(timezone.utc)), else_=Alert.date))
+        .returning(Alert.id, Alert.product_id, Alert.user_id, Alert.triggered)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    raised = [row.id for row in changed if row.triggered]
+    if changed:
+        logger.info("Alert evaluation raised %s and cleared %s alerts: %s", len(raised), len(changed) - len(raised),
+                    raised)
+    return changed
+
+
+def alert_user_ids(product_condition, db: Session):
+    # Users with alerts on the products matching the condition, whose alerts go away with those products
+    return db.scalars(
+        select(Alert.user_id).join(Product, Alert.product_id == Product.id).where(product_condition).distinct()
+    ).all()
+
+
 def create_alert(alert, db: Session):
     alert = alert.dict()
     try:
@@ -63,13 +156,16 @@ def create_alert(alert, db: Session):
 
         try:
             db.add(new_alert)
+            db.flush()
+            changed = evaluate_alerts([new_alert.product_id], db)
             db.commit()
             db.refresh(new_alert)
-            logger.info(f"Alert with ID {new_alert.id} created successfully.")
+            invalidate("alerts", new_alert.user_id, *(row.user_id for row in changed))
+            logger.info("Alert with ID %s created successfully.", new_alert.id)
             return new_alert
         except Exception as e:
             db.rollback()
-            logger.error(f"Error creating alert: {str(e)}")
+            logger.error("Error creating alert: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error create alert: {str(e)}"
@@ -77,7 +173,7 @@ def create_alert(alert, db: Session):
 
     except Exception as e:
         db.rollback()
-        logger.error(f"Conflict creating alert: {e}")
+        logger.error("Conflict creating alert: %s", e)
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Create alert conflict {e}"
@@ -86,25 +182,28 @@ def create_alert(alert, db: Session):
 
 def update_alert(alert_id: int, alert_update, db: Session):
     try:
-        logger.info(f"Attempting to update alert with ID {alert_id}.")
+        logger.info("Attempting to update alert with ID %s.", alert_id)
         alert = db.query(Alert).filter(Alert.id == alert_id)
         alert_instance = alert.first()
 
         if not alert_instance:
-            logger.warning(f"Alert with ID {alert_id} not found.")
+            logger.warning("Alert with ID %s not found.", alert_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Alert with ID {alert_id} does not exist"
             )
 
+        old_user_id = alert_instance.user_id
         alert.update(alert_update.dict(exclude_unset=True))
+        changed = evaluate_alerts([alert_instance.product_id], db)
         db.commit()
         db.refresh(alert_instance)
-        logger.info(f"Alert with ID {alert_id} updated successfully.")
+        invalidate("alerts", old_user_id, alert_instance.user_id, *(row.user_id for row in changed))
+        logger.info("Alert with ID %s updated successfully.", alert_id)
         return alert_instance
     except Exception as e:
         db.rollback()
-        logger.error(f"Error updating alert with ID {alert_id}: {str(e)}")
+        logger.error("Error updating alert with ID %s: %s", alert_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating alert: {str(e)}"
@@ -113,21 +212,23 @@ def update_alert(alert_id: int, alert_update, db: Session):
 
 def delete_alert(alert_id: int, db: Session):
     try:
-        logger.info(f"Attempting to delete alert with ID {alert_id}.")
+        logger.info("Attempting to delete alert with ID %s.", alert_id)
         alert_exists = db.query(Alert).filter(Alert.id == alert_id).first()
         if not alert_exists:
-            logger.warning(f"Alert with ID {alert_id} not found.")
+            logger.warning("Alert with ID %s not found.", alert_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Alert with ID {alert_id} does not exist"
             )
 
+        user_id = alert_exists.user_id
         db.query(Alert).filter(Alert.id == alert_id).delete(synchronize_session=False)
         db.commit()
-        logger.info(f"Alert with ID {alert_id} deleted successfully.")
+        invalidate("alerts", user_id)
+        logger.info("Alert with ID %s deleted successfully.", alert_id)
     except Exception as e:
         db.rollback()
-        logger.error(f"Error deleting alert with ID {alert_id}: {str(e)}")
+        logger.error("Error deleting alert with ID %s: %s", alert_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting alert: {str(e)}"
@@ -1,34 +1,100 @@
 from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.utils.logger import logger
+from app.utils.logger import get_logger
 from app.models.user_model import User
 from app.utils.hashing import Hash
 from app.utils.token import create_access_token
 
+logger = get_logger(__name__)
+
 
 def auth_user(user, db: Session):
     try:
-        logger.info(f"Attempting to authenticate user with username: {user.username}")
+        logger.info("Attempting to authenticate user with username: %s", user.username)
         db_user = db.query(User).filter(User.username == user.username).first()
 
         if not db_user:
-            logger.warning(f"User with username {user.username} not found.")
+            logger.warning("User with username %s not found.", user.username)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"There is no user with the username {user.username}, login is not possible."
+            )
+
+        valid, new_hash = Hash.verify_and_update(user.password, db_user.password)
+        if not valid:
+            logger.warning("Incorrect password attempt for user: %s", user.username)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Incorrect password"
+            )
+
+        # The stored hash was made with another work factor, it is replaced while the password is at hand
+        if new_hash:
+            db_user.password = new_hash
+            db.commit()
+            logger.info("Password of user %s rehashed with the current work factor.", user.username)
+
+        access_token = create_access_token(
+            data={"sub": user.username, "role": db_user.role}
+        )
+        logger.info("User %s authenticated successfully.", user.username)
+
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "id": db_user.id,
+            "username": db_user.username,
+            "email": db_user.email,
+            "stripe_subscription_status": db_user.stripe_subscription_status,
+            "image_url": db_user.image_url,
+        }
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error("Unexpected error during authentication: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An internal error occurred during authentication"
+
+        )
+
+
+async def auth_user_async(user, db: AsyncSession):
+    try:
+        logger.info("Attempting to authenticate user with username: %s", user.username)
+        result = await db.execute(select(User).where(User.username == user.username))
+        db_user = result.scalars().first()
+
+        if not db_user:
+            logger.warning("User with username %s not found.", user.username)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"There is no user with the username {user.username}, login is not possible."
             )
 
-        if not Hash.verify_password(user.password, db_user.password):
-            logger.warning(f"Incorrect password attempt for user: {user.username}")
+        valid, new_hash = await Hash.verify_and_update_async(user.password, db_user.password)
+        if not valid:
+            logger.warning("Incorrect password attempt for user: %s", user.username)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Incorrect password"
             )
+
+        # The stored hash was made with another work factor, it is replaced while the password is at hand
+        if new_hash:
+            db_user.password = new_hash
+            await db.commit()
+            logger.info("Password of user %s rehashed with the current work factor.", user.username)
+
         access_token = create_access_token(
             data={"sub": user.username, "role": db_user.role}
         )
-        logger.info(f"User {user.username} authenticated successfully.")
+        logger.info("User %s authenticated successfully.", user.username)
 
         return {
             "access_token": access_token,
@@ -44,7 +110,7 @@ def auth_user(user, db: Session):
         raise
 
     except Exception as e:
-        logger.error(f"Unexpected error during authentication: {e}")
+        logger.error("Unexpected error during authentication: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An internal error occurred during authentication"
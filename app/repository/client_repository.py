@@ -1,85 +1,73 @@
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.utils.logger import logger
+from app.db.projection import query_projection, row_dict
+from app.utils.logger import get_logger
 from app.models.client_model import Client
 from app.models.transaction_model import Transaction
+from app.schemas.client_schema import ClientResponseSchema, ClientTransactionsResponseSchema, TransactionsBase
+from app.utils.pagination import PageParams, Page, keyset, build_page
 
+logger = get_logger(__name__)
 
-def get_clients(db: Session):
-    logger.info("Fetching all clients from the database.")
-    data = db.query(Client).all()
-    logger.info(f"Found {len(data)} clients.")
-    return data
+
+def get_clients(page: PageParams, db: Session):
+    logger.info("Fetching clients page from the database.")
+    data = keyset(query_projection(db, Client, ClientResponseSchema), Client.name, Client.id, page).all()
+    clients_page = build_page(data, page, "name")
+    logger.info("Found %s clients.", len(clients_page.data))
+    return clients_page
 
 
 def get_client_by_id(client_id: int, db: Session):
-    logger.info(f"Fetching client with ID {client_id}.")
+    logger.info("Fetching client with ID %s.", client_id)
     client = db.query(Client).filter(Client.id == client_id).first()
 
     if not client:
-        logger.warning(f"Client with ID {client_id} not found.")
+        logger.warning("Client with ID %s not found.", client_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Client with ID {client_id} does not exist"
         )
-    logger.info(f"Client with ID {client_id} found.")
+    logger.info("Client with ID %s found.", client_id)
     return client
 
 
-def get_transactions_by_client_id(client_id: int, db: Session):
-    logger.info(f"Fetching transactions for client with ID {client_id}.")
-    client = db.query(Client).filter(Client.id == client_id).first()
+def get_transactions_by_client_id(client_id: int, page: PageParams, db: Session):
+    logger.info("Fetching transactions for client with ID %s.", client_id)
+    client = query_projection(db, Client, ClientTransactionsResponseSchema).filter(Client.id == client_id).first()
 
     if not client:
-        logger.warning(f"Client with ID {client_id} not found.")
+        logger.warning("Client with ID %s not found.", client_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Client with ID {client_id} does not exist"
         )
 
-    transactions = db.query(Transaction).filter(Transaction.client_id == client.id).all()
+    transactions_query = query_projection(db, Transaction, TransactionsBase).filter(Transaction.client_id == client.id)
+    transactions_page = build_page(
+        keyset(transactions_query, Transaction.date, Transaction.id, page, descending=True).all(), page, "date")
+    transactions = transactions_page.data
 
-    if not transactions:
-        logger.warning(f"No transactions found for client with ID {client_id}.")
+    if not transactions and not page.cursor:
+        logger.warning("No transactions found for client with ID %s.", client_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No transactions found under client with ID {client_id}"
         )
 
-    transactions_list = [
-        {
-            "id": transaction.id,
-            "date": transaction.date,
-            "type": transaction.type,
-            "warehouse_id": transaction.warehouse_id,
-            "client_id": transaction.client_id
-        }
-        for transaction in transactions
-    ]
-
-    client_data = {
-        "id": client.id,
-        "identifier": client.identifier,
-        "name": client.name,
-        "contact": client.contact,
-        "phone": client.phone,
-        "email": client.email,
-        "address": client.address,
-        "user_id": client.user_id,
-        "transactions": transactions_list
-    }
-
-    logger.info(f"Returning transactions for client with ID {client_id}.")
-    return client_data
+    client_data = row_dict(client, transactions=[transaction._asdict() for transaction in transactions])
+
+    logger.info("Returning transactions for client with ID %s.", client_id)
+    return Page(data=client_data, next_cursor=transactions_page.next_cursor)
 
 
 def create_client(client, db: Session):
-    logger.info(f"Attempting to create a new client with identifier {client.identifier}.")
+    logger.info("Attempting to create a new client with identifier %s.", client.identifier)
     client = client.dict()
 
     if db.query(Client).filter(Client.identifier == client["identifier"]).first():
-        logger.error(f"Error creating Client: Identifier already registered")
+        logger.error("Error creating Client: Identifier already registered")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Identifier already registered"
@@ -106,11 +94,11 @@ def create_client(client, db: Session):
             db.add(new_client)
             db.commit()
             db.refresh(new_client)
-            logger.info(f"Client with identifier {new_client.identifier} created successfully.")
+            logger.info("Client with identifier %s created successfully.", new_client.identifier)
             return new_client
         except Exception as e:
             db.rollback()
-            logger.error(f"Error creating client: {e}")
+            logger.error("Error creating client: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error creating client: {str(e)}"
@@ -118,7 +106,7 @@ def create_client(client, db: Session):
 
     except Exception as e:
         db.rollback()
-        logger.error(f"Error in client creation: {str(e)}")
+        logger.error("Error in client creation: %s", e)
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Create client conflict {str(e)}"
@@ -126,12 +114,12 @@ def create_client(client, db: Session):
 
 
 def update_client(client_id: int, client_update, db: Session):
-    logger.info(f"Attempting to update client with ID {client_id}.")
+    logger.info("Attempting to update client with ID %s.", client_id)
     client = db.query(Client).filter(Client.id == client_id)
     client_instance = client.first()
 
     if not client_instance:
-        logger.warning(f"Client with ID {client_id} not found.")
+        logger.warning("Client with ID %s not found.", client_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Client with ID {client_id} does not exist"
@@ -143,7 +131,7 @@ def update_client(client_id: int, client_update, db: Session):
     ).first()
 
     if existing_client:
-        logger.error(f"Error creating Client: Identifier already registered")
+        logger.error("Error creating Client: Identifier already registered")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Identifier already registered"
@@ -153,10 +141,10 @@ def update_client(client_id: int, client_update, db: Session):
         client.update(client_update.dict(exclude_unset=True))
         db.commit()
         db.refresh(client_instance)
-        logger.info(f"Client with ID {client_id} updated successfully.")
+        logger.info("Client with ID %s updated successfully.", client_id)
     except Exception as e:
         db.rollback()
-        logger.error(f"Error updating client: {e}")
+        logger.error("Error updating client: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating client: {str(e)}"
@@ -166,10 +154,10 @@ def update_client(client_id: int, client_update, db: Session):
 
 
 def delete_client(client_id: int, db: Session):
-    logger.info(f"Attempting to delete client with ID {client_id}.")
+    logger.info("Attempting to delete client with ID %s.", client_id)
     client_exists = db.query(Client).filter(Client.id == client_id).first()
     if not client_exists:
-        logger.warning(f"Client with ID {client_id} not found.")
+        logger.warning("Client with ID %s not found.", client_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Client with ID {client_id} does not exist"
@@ -177,7 +165,7 @@ def delete_client(client_id: int, db: Session):
 
     has_transactions = db.query(Transaction).filter(Transaction.client_id == client_id).first()
     if has_transactions:
-        logger.warning(f"Client with ID {client_id} cannot be deleted because it has associated transactions.")
+        logger.warning("Client with ID %s cannot be deleted because it has associated transactions.", client_id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Client cannot be deleted because it has associated transactions."
@@ -186,10 +174,10 @@ def delete_client(client_id: int, db: Session):
     try:
         db.query(Client).filter(Client.id == client_id).delete(synchronize_session=False)
         db.commit()
-        logger.info(f"Client with ID {client_id} deleted successfully.")
+        logger.info("Client with ID %s deleted successfully.", client_id)
     except Exception as e:
         db.rollback()
-        logger.error(f"Error deleting client: {e}")
+        logger.error("Error deleting client: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting client: {str(e)}"
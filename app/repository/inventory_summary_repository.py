@@ -0,0 +1,169 @@
+from decimal import Decimal
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.db.dialect import upsert_insert
+from app.db.projection import query_projection, row_dict
+from app.models.inventory_summary_model import InventorySummary
+from app.models.product_model import Product
+from app.models.warehouse_model import Warehouse
+from app.schemas.warehouse_schema import WarehouseSummaryResponseSchema
+from app.utils.cache import cached, invalidate
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Category under which the products without one are summed
+UNCATEGORIZED = ""
+
+CENT = Decimal("0.01")
+
+
+def _money(value) -> Decimal:
+    # SQLite returns computed sums as float
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def delta(warehouse_id: int, category, products: int, units: int, value):
+    return {
+        "warehouse_id": warehouse_id,
+        "category": category or UNCATEGORIZED,
+        "products": products,
+        "units": units,
+        "value": _money(value),
+    }
+
+
+def product_delta(warehouse_id: int, category, quantity: int, price, sign: int = 1):
+    # A product entering (1) or leaving (-1) the summary with its whole stock
+    return delta(warehouse_id, category, sign, sign * quantity, sign * quantity * Decimal(str(price)))
+
+
+def stock_delta(warehouse_id: int, category, units: int, price):
+    # Units moved in (positive) or out (negative) of a product that stays
+    return delta(warehouse_id, category, 0, units, units * Decimal(str(price)))
+
+
+def apply_deltas(deltas, db: Session):
+    # Adds the deltas to their rows with one executemany upsert, the caller owns the commit. The rows are
+    # merged per key and written in key order, so two writers over the same categories cannot deadlock
+    merged = {}
+    for entry in deltas:
+        key = (entry["warehouse_id"], entry["category"])
+        if key in merged:
+            for name in ("products", "units", "value"):
+                merged[key][name] += entry[name]
+        else:
+            merged[key] = dict(entry)
+    rows = [merged[key] for key in sorted(merged)
+            if merged[key]["products"] or merged[key]["units"] or merged[key]["value"]]
+    if not rows:
+        return 0
+
+    table = InventorySummary.__table__
+    stmt = upsert_insert(db.get_bind(), table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.warehouse_id, table.c.category],
+        set_={
+            "products": table.c.products + stmt.excluded.products,
+            "units": table.c.units + stmt.excluded.units,
+            "value": table.c.value + stmt.excluded.value,
+        }
+    )
+    db.execute(stmt, rows)
+    logger.info("Applied %s inventory summary deltas", len(rows))
+    return len(rows)
+
+
+@cached("warehouse", "warehouse_id")
+def get_summary_by_warehouse_id(warehouse_id: int, db: Session):
+    logger.info("Fetching inventory summary of warehouse with ID %s", warehouse_id)
+    warehouse = query_projection(db, Warehouse, WarehouseSummaryResponseSchema) \
+        .filter(Warehouse.id == warehouse_id).first()
+    if not warehouse:
+        logger.error("Warehouse with ID %s not found", warehouse_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Warehouse with ID {warehouse_id} does not exist"
+        )
+
+    rows = db.execute(
+        select(InventorySummary.category, InventorySummary.products, InventorySummary.units, InventorySummary.value)
+        .where(InventorySummary.warehouse_id == warehouse_id, InventorySummary.products > 0)
+        .order_by(InventorySummary.category)
+    ).all()
+    categories = [
+        {"category": row.category or None, "products": row.products, "units": row.units,
+         "value": _money(row.value)}
+        for row in rows
+    ]
+
+    logger.info("Found %s categories in warehouse with ID %s", len(categories), warehouse_id)
+    return row_dict(
+        warehouse,
+        products=sum(row.products for row in rows),
+        units=sum(row.units for row in rows),
+        value=sum((_money(row.value) for row in rows), _money(0)),
+        categories=categories,
+    )
+
+
+def _computed_summaries(warehouse_ids=None):
+    # The summary rows as they should be, grouped from the products
+    category = func.coalesce(Product.category, UNCATEGORIZED)
+    stmt = (
+        select(
+            Product.warehouse_id,
+            category.label("category"),
+            func.count().label("products"),
+            func.coalesce(func.sum(Product.quantity), 0).label("units"),
+            func.coalesce(func.sum(Product.quantity * Product.price), 0).label("value"),
+        )
+        .group_by(Product.warehouse_id, category)
+    )
+    if warehouse_ids:
+        stmt = stmt.where(Product.warehouse_id.in_(warehouse_ids))
+    return stmt
+
+
+def write_summaries(db, warehouse_ids=None):
+    # Replaces the summary rows of the warehouses (all of them by default) with the ones grouped from the
+    # products in two statements, the caller owns the commit. db can also be a Connection
+    clear = delete(InventorySummary)
+    if warehouse_ids:
+        clear = clear.where(InventorySummary.warehouse_id.in_(warehouse_ids))
+    db.execute(clear)
+    computed = _computed_summaries(warehouse_ids).subquery()
+    db.execute(insert(InventorySummary).from_select(
+        ["warehouse_id", "category", "products", "units", "value"], select(computed)))
+
+
+def rebuild_summaries(db: Session, warehouse_ids=None, dry_run: bool = False):
+    # Compares the stored summary rows with the products and rewrites the warehouses that drifted
+    stored_query = select(InventorySummary.warehouse_id, InventorySummary.category, InventorySummary.products,
+                          InventorySummary.units, InventorySummary.value)
+    if warehouse_ids:
+        stored_query = stored_query.where(InventorySummary.warehouse_id.in_(warehouse_ids))
+    stored = {(row.warehouse_id, row.category): row for row in db.execute(stored_query)
+              if row.products or row.units or row.value}
+    expected = {(row.warehouse_id, row.category): row for row in db.execute(_computed_summaries(warehouse_ids))}
+
+    drifted = []
+    for key in sorted(stored.keys() | expected.keys()):
+        old, new = stored.get(key), expected.get(key)
+        old_values = (old.products, old.units, _money(old.value)) if old else (0, 0, _money(0))
+        new_values = (new.products, new.units, _money(new.value)) if new else (0, 0, _money(0))
+        if old_values != new_values:
+            drifted.append({"warehouse_id": key[0], "category": key[1] or None, "stored": old_values,
+                            "expected": new_values})
+
+    if drifted and not dry_run:
+        drifted_warehouses = sorted({row["warehouse_id"] for row in drifted})
+        write_summaries(db, drifted_warehouses)
+        db.commit()
+        invalidate("warehouse", *drifted_warehouses)
+        logger.info("Rebuilt the inventory summary of %s warehouses", len(drifted_warehouses))
+
+    return drifted
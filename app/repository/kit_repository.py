@@ -0,0 +1,116 @@
+from fastapi import HTTPException, status
+from sqlalchemy import literal, select
+from sqlalchemy.orm import Session
+
+from app.db.projection import query_projection, row_dict
+from app.models.product_model import Product
+from app.schemas.product_schema import ProductBomResponseSchema, ProductBuildableResponseSchema
+from app.utils.cache import cached
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Levels expanded at most below a kit, a guard against kit_id cycles written before they were rejected
+MAX_KIT_DEPTH = 32
+
+
+def _bom_rows(product_id: int, db: Session):
+    # Every component below the kit at any depth in one recursive query, parents before their components
+    columns = (Product.id, Product.name, Product.serial_number, Product.quantity, Product.category,
+               Product.warehouse_id, Product.kit_id)
+    tree = select(*columns, literal(1).label("depth")).where(Product.kit_id == product_id) \
+        .cte("kit_bom", recursive=True)
+    tree = tree.union_all(
+        select(*columns, (tree.c.depth + 1).label("depth"))
+        .join(tree, Product.kit_id == tree.c.id)
+        .where(tree.c.depth < MAX_KIT_DEPTH)
+    )
+    return db.execute(select(tree).order_by(tree.c.depth, tree.c.name, tree.c.id)).all()
+
+
+def _buildable(product_id: int, rows):
+    # Kits that can be assembled from the current stock, one unit of every component each. A component that
+    # is a kit itself counts its units in stock plus the ones its own components can still assemble
+    components = {}
+    for row in rows:
+        components.setdefault(row.kit_id, []).append(row)
+
+    buildable = {}
+    for row in reversed(rows):
+        if row.id in components:
+            buildable[row.id] = min(child.quantity + buildable.get(child.id, 0) for child in components[row.id])
+    top = components.get(product_id, [])
+    kits = min((child.quantity + buildable.get(child.id, 0) for child in top), default=0)
+    return kits, buildable, components
+
+
+def _components_not_found(product_id: int):
+    logger.warning("No products found under product with ID %s", product_id)
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"No products found under product with ID {product_id}"
+    )
+
+
+def _product_not_found(product_id: int):
+    logger.error("Product with ID %s not found", product_id)
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Product with ID {product_id} does not exist"
+    )
+
+
+def get_bom_by_product_id(product_id: int, db: Session):
+    logger.info("Fetching bill of materials of product ID: %s", product_id)
+    product = query_projection(db, Product, ProductBomResponseSchema).filter(Product.id == product_id).first()
+    if not product:
+        raise _product_not_found(product_id)
+
+    rows = _bom_rows(product_id, db)
+    if not rows:
+        raise _components_not_found(product_id)
+    kits, buildable, components = _buildable(product_id, rows)
+
+    # Depth first, every component right after the kit it belongs to
+    bom = []
+    pending = list(reversed(components[product_id]))
+    while pending:
+        row = pending.pop()
+        bom.append(row_dict(row, buildable=buildable.get(row.id)))
+        pending.extend(reversed(components.get(row.id, [])))
+
+    logger.info("Found %s components at %s levels under product ID %s", len(bom), rows[-1].depth, product_id)
+    return row_dict(product, buildable=kits, components=bom)
+
+
+@cached("product", "product_id")
+def get_buildable_by_product_id(product_id: int, db: Session):
+    # Cached in the scope of the kit, every write that changes the quantity or the place of a component
+    # invalidates the kits above it (kits_above)
+    logger.info("Computing buildable kits of product ID: %s", product_id)
+    product = query_projection(db, Product, ProductBuildableResponseSchema).filter(Product.id == product_id).first()
+    if not product:
+        raise _product_not_found(product_id)
+
+    rows = _bom_rows(product_id, db)
+    if not rows:
+        raise _components_not_found(product_id)
+    kits, _, _ = _buildable(product_id, rows)
+
+    logger.info("%s kits of product ID %s can be assembled", kits, product_id)
+    return row_dict(product, buildable=kits, components=len(rows))
+
+
+def kits_above(product_ids, db: Session):
+    # Ids of every kit the products are a component of, at any level, in one recursive query.
+    # UNION drops the repeated rows, so the walk ends even on a kit_id cycle
+    product_ids = [product_id for product_id in product_ids if product_id is not None]
+    if not product_ids:
+        return []
+    chain = select(Product.kit_id.label("id")) \
+        .where(Product.id.in_(product_ids), Product.kit_id.isnot(None)) \
+        .cte("kit_chain", recursive=True)
+    chain = chain.union(
+        select(Product.kit_id).join(chain, Product.id == chain.c.id).where(Product.kit_id.isnot(None))
+    )
+    return db.scalars(select(chain.c.id)).all()
@@ -0,0 +1,275 @@
+from datetime import date, datetime, time, timedelta, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.db.dialect import upsert_insert
+from app.db.projection import query_projection, row_dict
+from app.models.product_model import Product
+from app.models.product_movement_daily_model import ProductMovementDaily
+from app.models.transaction_model import Transaction
+from app.models.transaction_products_midtable import TransactionProduct
+from app.models.warehouse_model import Warehouse
+from app.models.warehouse_movement_daily_model import WarehouseMovementDaily
+from app.schemas.product_schema import ProductMovementsResponseSchema
+from app.schemas.warehouse_schema import WarehouseMovementsResponseSchema
+from app.utils.cache import cached
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Column of the daily buckets summed by each transaction type, the other types move no stock
+QUANTITY_COLUMNS = {"in": "quantity_in", "out": "quantity_out"}
+
+GRANULARITIES = ("day", "week", "month")
+
+# Days covered when no range is given, and buckets answered at most in one report
+DEFAULT_RANGE_DAYS = 30
+MAX_BUCKETS = 3660
+
+
+def _day(moment: datetime) -> date:
+    # Buckets are UTC days, naive datetimes are stored in UTC already
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def _upsert(model, keys, rows, db):
+    table = model.__table__
+    stmt = upsert_insert(db.get_bind(), table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[key] for key in keys],
+        set_={
+            "quantity_in": table.c.quantity_in + stmt.excluded.quantity_in,
+            "quantity_out": table.c.quantity_out + stmt.excluded.quantity_out,
+        }
+    )
+    db.execute(stmt, rows)
+
+
+def apply_transaction(transaction_type: str, warehouse_id: int, moment: datetime, quantities: dict, db: Session,
+                      sign: int = 1):
+    # Adds the lines of a transaction written (sign 1) or deleted (-1) to the buckets of its day, with one
+    # upsert per table in key order like the inventory summary. The caller owns the commit
+    column = QUANTITY_COLUMNS.get(transaction_type)
+    if not column or not quantities:
+        return 0
+    day = _day(moment)
+
+    def bucket(quantity):
+        values = {"day": day, "quantity_in": 0, "quantity_out": 0}
+        values[column] = sign * quantity
+        return values
+
+    _upsert(ProductMovementDaily, ("product_id", "day"),
+            [dict(bucket(quantities[product_id]), product_id=product_id) for product_id in sorted(quantities)], db)
+    _upsert(WarehouseMovementDaily, ("warehouse_id", "day"),
+            [dict(bucket(sum(quantities.values())), warehouse_id=warehouse_id)], db)
+    logger.info("Applied %s '%s' lines to the movements of %s", len(quantities), transaction_type, day)
+    return len(quantities)
+
+
+def remove_lines(condition, db: Session):
+    # Transaction lines about to go with a cascading delete (of products, of a warehouse and its transactions)
+    # leave the buckets they were counted in, grouped like a rebuild and in key order like apply_transaction.
+    # Returns the product and warehouse ids touched, the caller deletes and commits
+    touched = []
+    for model, key, group_column in ((ProductMovementDaily, "product_id", TransactionProduct.product_id),
+                                     (WarehouseMovementDaily, "warehouse_id", Transaction.warehouse_id)):
+        rows = db.execute(_computed_movements(group_column).where(condition)).all()
+        if rows:
+            # SQLite groups the day as text
+            _upsert(model, (key, "day"), sorted(
+                ({key: row[0], "day": date.fromisoformat(str(row.day)),
+                  "quantity_in": -row.quantity_in, "quantity_out": -row.quantity_out} for row in rows),
+                key=lambda values: (values[key], values["day"])
+            ), db)
+        touched.append(sorted({row[0] for row in rows}))
+    logger.info("Removed the movements of %s products from %s warehouses", len(touched[0]), len(touched[1]))
+    return touched
+
+
+def _period_start(day: date, granularity: str) -> date:
+    # Weeks start on Monday (ISO) and months on their first day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _bucket_count(date_from: date, date_to: date, granularity: str) -> int:
+    if granularity == "month":
+        return (date_to.year - date_from.year) * 12 + date_to.month - date_from.month + 1
+    days = (_period_start(date_to, granularity) - _period_start(date_from, granularity)).days
+    return days // (7 if granularity == "week" else 1) + 1
+
+
+def _date_range(date_from, date_to, granularity):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Granularity must be one of {', '.join(GRANULARITIES)}"
+        )
+    date_to = date_to or datetime.now(timezone.utc).date()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from must not be after date_to"
+        )
+    if _bucket_count(date_from, date_to, granularity) > MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The range spans more than {MAX_BUCKETS} buckets, use a coarser granularity"
+        )
+    return date_from, date_to
+
+
+def _buckets(rows, date_from: date, date_to: date, granularity: str):
+    # Sums the daily rows into their periods. Every period of the range is answered, the empty ones with zeros
+    totals = {}
+    for row in rows:
+        start = _period_start(row.day, granularity)
+        quantity_in, quantity_out = totals.get(start, (0, 0))
+        totals[start] = (quantity_in + row.quantity_in, quantity_out + row.quantity_out)
+
+    buckets = []
+    start = _period_start(date_from, granularity)
+    while start <= date_to:
+        quantity_in, quantity_out = totals.get(start, (0, 0))
+        buckets.append({"period": start, "quantity_in": quantity_in, "quantity_out": quantity_out,
+                        "net": quantity_in - quantity_out})
+        start = _next_period(start, granularity)
+    return buckets
+
+
+def _movements(entity, model, key_column, date_from, date_to, granularity, db: Session):
+    rows = db.execute(
+        select(model.day, model.quantity_in, model.quantity_out)
+        .where(key_column == entity.id, model.day >= date_from, model.day <= date_to)
+        .order_by(model.day)
+    ).all()
+    return row_dict(entity, granularity=granularity, date_from=date_from, date_to=date_to,
+                    buckets=_buckets(rows, date_from, date_to, granularity))
+
+
+@cached("product", "product_id")
+def get_movements_by_product_id(product_id: int, date_from, date_to, granularity: str, db: Session):
+    logger.info("Fetching %s movements of product with ID %s", granularity, product_id)
+    date_from, date_to = _date_range(date_from, date_to, granularity)
+    product = query_projection(db, Product, ProductMovementsResponseSchema).filter(Product.id == product_id).first()
+    if not product:
+        logger.error("Product with ID %s not found", product_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product with ID {product_id} does not exist"
+        )
+    return _movements(product, ProductMovementDaily, ProductMovementDaily.product_id, date_from, date_to,
+                      granularity, db)
+
+
+@cached("warehouse", "warehouse_id")
+def get_movements_by_warehouse_id(warehouse_id: int, date_from, date_to, granularity: str, db: Session):
+    logger.info("Fetching %s movements of warehouse with ID %s", granularity, warehouse_id)
+    date_from, date_to = _date_range(date_from, date_to, granularity)
+    warehouse = query_projection(db, Warehouse, WarehouseMovementsResponseSchema) \
+        .filter(Warehouse.id == warehouse_id).first()
+    if not warehouse:
+        logger.error("Warehouse with ID %s not found", warehouse_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Warehouse with ID {warehouse_id} does not exist"
+        )
+    return _movements(warehouse, WarehouseMovementDaily, WarehouseMovementDaily.warehouse_id, date_from, date_to,
+                      granularity, db)
+
+
+def _computed_movements(group_column, start: datetime = None, end: datetime = None):
+    # The daily buckets as they should be, grouped from the transaction lines dated in [start, end)
+    day = func.date(Transaction.date)
+    stmt = (
+        select(
+            group_column,
+            day.label("day"),
+            func.coalesce(func.sum(case((Transaction.type == "in", TransactionProduct.quantity), else_=0)), 0)
+            .label("quantity_in"),
+            func.coalesce(func.sum(case((Transaction.type == "out", TransactionProduct.quantity), else_=0)), 0)
+            .label("quantity_out"),
+        )
+        .select_from(Transaction)
+        .join(TransactionProduct, TransactionProduct.transaction_id == Transaction.id)
+        .where(Transaction.type.in_(list(QUANTITY_COLUMNS)))
+        .group_by(group_column, day)
+    )
+    if start is not None:
+        stmt = stmt.where(Transaction.date >= start)
+    if end is not None:
+        stmt = stmt.where(Transaction.date < end)
+    return stmt
+
+
+def write_movements(db, date_from: date = None, date_to: date = None):
+    # Replaces the buckets of the days in [date_from, date_to] (all of them by default) with the ones grouped
+    # from the transactions, two statements per table. The caller owns the commit, db can also be a Connection
+    start = datetime.combine(date_from, time.min) if date_from else None
+    end = datetime.combine(date_to + timedelta(days=1), time.min) if date_to else None
+    for model, group_column in ((ProductMovementDaily, TransactionProduct.product_id),
+                                (WarehouseMovementDaily, Transaction.warehouse_id)):
+        clear = delete(model)
+        if date_from:
+            clear = clear.where(model.day >= date_from)
+        if date_to:
+            clear = clear.where(model.day <= date_to)
+        db.execute(clear)
+        computed = _computed_movements(group_column, start, end).subquery()
+        db.execute(insert(model).from_select(
+            [group_column.key, "day", "quantity_in", "quantity_out"], select(computed)))
+
+
+def transaction_days(db: Session):
+    # First and last day with transactions, None when there are none
+    first, last = db.execute(select(func.min(Transaction.date), func.max(Transaction.date))).one()
+    if first is None:
+        return None, None
+    return _day(first), _day(last)
+
+
+def backfill_movements(db: Session, chunk_days: int, date_from: date = None, date_to: date = None):
+    # Rewrites the buckets chunk by chunk, oldest first, committing each one so a large history never holds
+    # a long transaction and an interrupted run can resume from the last chunk logged. Without a bound the
+    # range reaches the oldest or newest transaction and the buckets beyond it, left by deleted ones, go
+    first, last = transaction_days(db)
+    if date_from is None or date_to is None:
+        for model in (ProductMovementDaily, WarehouseMovementDaily):
+            if first is None:
+                db.execute(delete(model))
+                continue
+            if date_from is None:
+                db.execute(delete(model).where(model.day < first))
+            if date_to is None:
+                db.execute(delete(model).where(model.day > last))
+        db.commit()
+    date_from = date_from or first
+    date_to = date_to or last
+
+    chunks = 0
+    start = date_from
+    while start is not None and start <= date_to:
+        end = min(start + timedelta(days=chunk_days - 1), date_to)
+        write_movements(db, start, end)
+        db.commit()
+        chunks += 1
+        logger.info("Backfilled the movements from %s to %s", start, end)
+        start = end + timedelta(days=1)
+    return chunks
@@ -4,10 +4,12 @@ from http.client import HTTPException
 import stripe
 from sqlalchemy.orm import Session
 from starlette.responses import JSONResponse
-from app.utils.logger import logger
+from app.utils.logger import get_logger
 
 from app.models import User
 
+logger = get_logger(__name__)
+
 stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
 
 def process_webhook_event(payload, sig_header, secret, db: Session):
@@ -16,29 +18,29 @@ def process_webhook_event(payload, sig_header, secret, db: Session):
         event = stripe.Webhook.construct_event(
             payload, sig_header, secret
         )
-        logger.info(f"Received event type: {event['type']}")
+        logger.info("Received event type: %s", event['type'])
 
         if event["type"] == "invoice.payment_succeeded":
             invoice = event["data"]["object"]
             customer_id = invoice.get("customer")
-            logger.info(f"Payment succeeded for customer: {customer_id}")
+            logger.info("Payment succeeded for customer: %s", customer_id)
 
             user = db.query(User).filter(User.stripe_customer_id == customer_id).first()
 
             if user:
                 user.stripe_subscription_status = True
                 db.commit()
-                logger.info(f"Updated subscription status to True for user_id: {user.id}")
+                logger.info("Updated subscription status to True for user_id: %s", user.id)
                 return JSONResponse(status_code=200, content={"message": "Successfully payment"})
             else:
-                logger.warning(f"User with customer_id {customer_id} not found")
+                logger.warning("User with customer_id %s not found", customer_id)
                 return JSONResponse(status_code=404, content={"error": "User not found"})
 
         elif event["type"] == "customer.subscription.updated":
             subscription = event["data"]["object"]
             customer_id = subscription.get("customer")
             subscription_status = subscription.get("status")
-            logger.info(f"Subscription updated for customer: {customer_id}, new status: {subscription_status}")
+            logger.info("Subscription updated for customer: %s, new status: %s", customer_id, subscription_status)
 
             user = db.query(User).filter(User.stripe_customer_id == customer_id).first()
 
@@ -46,56 +48,56 @@ def process_webhook_event(payload, sig_header, secret, db: Session):
                 if subscription_status == "active":
                     user.stripe_subscription_id = subscription.get("id")
                     user.stripe_subscription_status = True
-                    logger.info(f"Set subscription active for user_id: {user.id}")
+                    logger.info("Set subscription active for user_id: %s", user.id)
                 elif subscription_status == "canceled":
                     user.stripe_subscription_status = False
-                    logger.info(f"Set subscription canceled for user_id: {user.id}")
+                    logger.info("Set subscription canceled for user_id: %s", user.id)
 
                 db.commit()
                 return JSONResponse(status_code=200, content={"message": "Payment subscription edited"})
             else:
-                logger.warning(f"User with customer_id {customer_id} not found")
+                logger.warning("User with customer_id %s not found", customer_id)
                 return JSONResponse(status_code=404, content={"error": "User not found"})
 
         elif event["type"] == "customer.subscription.deleted":
             subscription = event["data"]["object"]
             customer_id = subscription.get("customer")
-            logger.info(f"Subscription deleted for customer: {customer_id}")
+            logger.info("Subscription deleted for customer: %s", customer_id)
 
             user = db.query(User).filter(User.stripe_customer_id == customer_id).first()
             if user:
                 user.stripe_subscription_status = False
-                logger.info(f"Set subscription canceled for user_id: {user.id} (deleted event)")
+                logger.info("Set subscription canceled for user_id: %s (deleted event)", user.id)
                 db.commit()
             else:
-                logger.warning(f"No user found with stripe_customer_id={customer_id} on deleted event")
+                logger.warning("No user found with stripe_customer_id=%s on deleted event", customer_id)
         else:
-            logger.warning(f"Unrecognized event type: {event['type']}")
+            logger.warning("Unrecognized event type: %s", event['type'])
             return JSONResponse(status_code=400, content={"error": "Unrecognized event"})
 
     except Exception as e:
-        logger.error(f"Exception processing webhook event: {e}")
+        logger.error("Exception processing webhook event: %s", e)
         return JSONResponse(status_code=400, content={"error": "Webhook processing error"})
 
 
 def create_checkout_session(user_id, db):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
-        logger.warning(f"User with id {user_id} not found when creating checkout session")
+        logger.warning("User with id %s not found when creating checkout session", user_id)
         raise HTTPException(status_code=404, detail="User not found")
 
     if not user.stripe_customer_id:
-        logger.info(f"Creating new Stripe customer for user_id: {user.id}")
+        logger.info("Creating new Stripe customer for user_id: %s", user.id)
         customer = stripe.Customer.create(
             email=user.email,
             name=user.username
         )
         user.stripe_customer_id = customer.id
         db.commit()
-        logger.info(f"Stripe customer created with id: {customer.id}")
+        logger.info("Stripe customer created with id: %s", customer.id)
 
     try:
-        logger.info(f"Creating checkout session for user_id: {user.id}")
+        logger.info("Creating checkout session for user_id: %s", user.id)
         session = stripe.checkout.Session.create(
             payment_method_types=["card"],
             mode="subscription",
@@ -107,8 +109,8 @@ def create_checkout_session(user_id, db):
             cancel_url="http://107.22.235.180/?from=fail",
             customer=user.stripe_customer_id,
         )
-        logger.info(f"Checkout session created with id: {session.id}")
+        logger.info("Checkout session created with id: %s", session.id)
         return {"sessionId": session.id}
     except Exception as e:
-        logger.error(f"Error creating checkout session: {e}")
+        logger.error("Error creating checkout session: %s", e)
         return JSONResponse(status_code=400, content={"error": str(e)})
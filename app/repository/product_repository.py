@@ -1,193 +1,266 @@
 from fastapi import HTTPException, status
+from sqlalchemy import case, func, insert, literal_column, or_, select, table, column, tuple_
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.utils.logger import logger
+from app.config.config import settings
+from app.db.projection import projection, query_projection, select_projection, row_dict
+from app.db.search import SEARCH_COLUMNS, SEARCH_TABLE, fts_query, like_pattern
+from app.utils.logger import get_logger
 from app.models.alert_model import Alert
 from app.models.product_model import Product
 from app.models.transaction_model import Transaction
 from app.models.transaction_products_midtable import TransactionProduct
+from app.models.user_model import User
+from app.models.warehouse_model import Warehouse
+from app.repository import alert_repository, inventory_summary_repository, kit_repository, \
+    movement_rollup_repository, stock_movement_repository
+from app.schemas.product_schema import ProductResponseSchema, ProductProductsResponseSchema, ProductsBase, \
+    ProductTransactionsResponseSchema, TransactionsBase, ProductAlertsResponseSchema, AlertsBase, \
+    ProductSearchResponseSchema
+from app.utils.cache import cached, invalidate
+from app.utils.pagination import PageParams, Page, keyset, build_page
 
+logger = get_logger(__name__)
 
-def get_products(db: Session):
-    logger.info("Fetching all products")
-    data = db.query(Product).all()
-    logger.info(f"Found {len(data)} products")
-    return data
 
+def get_products(page: PageParams, db: Session):
+    logger.info("Fetching products page")
+    data = keyset(query_projection(db, Product, ProductResponseSchema), Product.name, Product.id, page).all()
+    products_page = build_page(data, page, "name")
+    logger.info("Found %s products", len(products_page.data))
+    return products_page
 
+
+async def get_products_async(page: PageParams, db: AsyncSession):
+    logger.info("Fetching products page")
+    result = await db.execute(
+        keyset(select_projection(Product, ProductResponseSchema), Product.name, Product.id, page))
+    products_page = build_page(result.all(), page, "name")
+    logger.info("Found %s products", len(products_page.data))
+    return products_page
+
+
+@cached("product", "product_id")
 def get_product_by_id(product_id: int, db: Session):
-    logger.info(f"Fetching product by ID: {product_id}")
+    logger.info("Fetching product by ID: %s", product_id)
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
-        logger.error(f"Product with ID {product_id} not found")
+        logger.error("Product with ID %s not found", product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with ID {product_id} does not exist"
         )
-    logger.info(f"Product found: {product.name}")
+    logger.info("Product found: %s", product.name)
+    return product
+
+
+@cached("product", "product_id")
+async def get_product_by_id_async(product_id: int, db: AsyncSession):
+    logger.info("Fetching product by ID: %s", product_id)
+    product = await db.get(Product, product_id)
+    if not product:
+        logger.error("Product with ID %s not found", product_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product with ID {product_id} does not exist"
+        )
+    logger.info("Product found: %s", product.name)
     return product
 
 
 def get_products_by_product_id(product_id: int, db: Session):
-    logger.info(f"Fetching products under product ID: {product_id}")
-    product = db.query(Product).filter(Product.id == product_id).first()
+    logger.info("Fetching products under product ID: %s", product_id)
+    product = query_projection(db, Product, ProductProductsResponseSchema).filter(Product.id == product_id).first()
     if not product:
-        logger.error(f"Product with ID {product_id} not found")
+        logger.error("Product with ID %s not found", product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with ID {product_id} does not exist"
         )
 
-    products = db.query(Product).filter(Product.kit_id == product_id).all()
+    products = query_projection(db, Product, ProductsBase).filter(Product.kit_id == product_id).all()
     if not products:
-        logger.warning(f"No products found under product with ID {product_id}")
+        logger.warning("No products found under product with ID %s", product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No products found under product with ID {product_id}"
         )
 
-    logger.info(f"Found {len(products)} products under product ID {product_id}")
-    products_list = [
-        {
-            "id": product.id,
-            "name": product.name,
-            "quantity": product.quantity,
-            "serial_number": product.serial_number,
-            "price": product.price,
-            "description": product.description,
-            "kit_id": product.kit_id,
-            "category": product.category,
-            "image_url": product.image_url,
-            "warehouse_id": product.warehouse_id
-        }
-        for product in products
-    ]
-
-    product_data = {
-        "id": product.id,
-        "name": product.name,
-        "quantity": product.quantity,
-        "serial_number": product.serial_number,
-        "price": product.price,
-        "description": product.description,
-        "category": product.category,
-        "image_url": product.image_url,
-        "warehouse_id": product.warehouse_id,
-        "kit_products": products_list
-    }
+    logger.info("Found %s products under product ID %s", len(products), product_id)
+    product_data = row_dict(product, products=[kit_product._asdict() for kit_product in products])
 
     return product_data
 
 
-def get_transactions_by_product_id(product_id: int, db: Session):
-    logger.info(f"Fetching transactions for product ID: {product_id}")
-    product = db.query(Product).filter(Product.id == product_id).first()
+def get_transactions_by_product_id(product_id: int, page: PageParams, db: Session):
+    logger.info("Fetching transactions for product ID: %s", product_id)
+    product = query_projection(db, Product, ProductTransactionsResponseSchema).filter(Product.id == product_id).first()
 
     if not product:
-        logger.error(f"Product with ID {product_id} not found")
+        logger.error("Product with ID %s not found", product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with ID {product_id} does not exist"
         )
 
-    transactions = (
-        db.query(Transaction)
+    transactions_query = (
+        query_projection(db, Transaction, TransactionsBase)
         .join(Transaction.transaction_products)
         .filter(TransactionProduct.product_id == product.id)
-        .all()
     )
-    if not transactions:
-        logger.warning(f"No transactions found for product ID {product_id}")
+    transactions_page = build_page(
+        keyset(transactions_query, Transaction.date, Transaction.id, page, descending=True).all(), page, "date")
+    transactions = transactions_page.data
+    if not transactions and not page.cursor:
+        logger.warning("No transactions found for product ID %s", product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No transactions found under product with ID {product_id}"
         )
 
-    logger.info(f"Found {len(transactions)} transactions for product ID {product_id}")
-    transactions_list = [
-        {
-            "id": transaction.id,
-            "date": transaction.date,
-            "type": transaction.type,
-            "warehouse_id": transaction.warehouse_id,
-            "client_id": transaction.client_id
-        }
-        for transaction in transactions
-    ]
+    logger.info("Found %s transactions for product ID %s", len(transactions), product_id)
+    product_data = row_dict(product, transactions=[transaction._asdict() for transaction in transactions])
 
-    product_data = {
-        "id": product.id,
-        "name": product.name,
-        "quantity": product.quantity,
-        "serial_number": product.serial_number,
-        "price": product.price,
-        "description": product.description,
-        "category": product.category,
-        "image_url": product.image_url,
-        "warehouse_id": product.warehouse_id,
-        "transactions": transactions_list
-    }
-
-    return product_data
+    return Page(data=product_data, next_cursor=transactions_page.next_cursor)
 
 
 def get_alerts_by_product_id(product_id: int, db: Session):
-    logger.info(f"Fetching alerts for product ID: {product_id}")
-    product = db.query(Product).filter(Product.id == product_id).first()
+    logger.info("Fetching alerts for product ID: %s", product_id)
+    product = query_projection(db, Product, ProductAlertsResponseSchema).filter(Product.id == product_id).first()
 
     if not product:
-        logger.error(f"Product with ID {product_id} not found")
+        logger.error("Product with ID %s not found", product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with ID {product_id} does not exist"
         )
 
-    alerts = db.query(Alert).filter(Alert.product_id == product.id).all()
+    alerts = query_projection(db, Alert, AlertsBase).filter(Alert.product_id == product.id).all()
 
     if not alerts:
-        logger.warning(f"No alerts found for product ID {product_id}")
+        logger.warning("No alerts found for product ID %s", product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No alerts found under product with ID {product_id}"
         )
 
-    logger.info(f"Found {len(alerts)} alerts for product ID {product_id}")
-    alerts_list = [
-        {
-            "id": alert.id,
-            "date": alert.date,
-            "read": alert.read,
-            "min_quantity": alert.min_quantity,
-            "max_quantity": alert.max_quantity,
-            "max_message": alert.min_quantity,
-            "min_message": alert.min_message,
-            "product_id": alert.product_id
-        }
-        for alert in alerts
-    ]
-
-    product_data = {
-        "id": product.id,
-        "name": product.name,
-        "quantity": product.quantity,
-        "serial_number": product.serial_number,
-        "price": product.price,
-        "description": product.description,
-        "category": product.category,
-        "image_url": product.image_url,
-        "warehouse_id": product.warehouse_id,
-        "alerts": alerts_list
-    }
+    logger.info("Found %s alerts for product ID %s", len(alerts), product_id)
+    product_data = row_dict(product, alerts=[alert._asdict() for alert in alerts])
 
     return product_data
 
 
+def _search_scope(query: str, warehouse_id, user_id):
+    # Existence check of the scope, its 404 detail and the condition on the products: one warehouse or
+    # every warehouse of a user
+    if not query.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The search query is empty")
+    if (warehouse_id is None) == (user_id is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Search in a warehouse (warehouse_id) or in the warehouses of a user (user_id)")
+    if warehouse_id is not None:
+        return (select(Warehouse.id).where(Warehouse.id == warehouse_id),
+                f"Warehouse with ID {warehouse_id} does not exist", Product.warehouse_id == warehouse_id)
+    return (select(User.id).where(User.id == user_id), f"User with ID {user_id} does not exist",
+            Product.warehouse_id.in_(select(Warehouse.id).where(Warehouse.user_id == user_id)))
+
+
+def _fts_stmt(expression: str, boost: float, scope, limit: int, exclude_ids):
+    # Products whose FTS5 row matches the expression. bm25 weights name and serial number over category and
+    # description, x / (1 + x) maps it to [0, 1) and the boost puts a stage above the next one
+    columns = projection(Product, ProductSearchResponseSchema)
+    search_table = table(SEARCH_TABLE, column("rowid"))
+    rank = -func.bm25(literal_column(SEARCH_TABLE), 4.0, 4.0, 2.0, 1.0)
+    score = (boost + rank / (rank + 1.0)).label("score")
+    stmt = (
+        select(*columns, score)
+        .select_from(search_table)
+        .join(Product, Product.id == search_table.c.rowid)
+        .where(literal_column(SEARCH_TABLE).op("MATCH")(expression), scope)
+    )
+    if exclude_ids:
+        stmt = stmt.where(Product.id.not_in(exclude_ids))
+    return stmt.order_by(score.desc(), Product.id).limit(limit)
+
+
+def _like_stmt(dialect_name: str, query: str, scope, limit: int, exclude_ids):
+    # Substring matches, plus misspelt names and categories on Postgres, scored in [0, 2]
+    columns = projection(Product, ProductSearchResponseSchema)
+    pattern = like_pattern(query)
+    prefix = like_pattern(query, prefix=True)
+    matches = [getattr(Product, name).ilike(pattern, escape="\\") for name in SEARCH_COLUMNS]
+    if dialect_name == "postgresql":
+        # ILIKE and the word similarity operator both use the trigram indexes
+        matches += [Product.name.op("%>")(query), Product.category.op("%>")(query)]
+        score = func.greatest(
+            func.word_similarity(query, Product.name),
+            func.word_similarity(query, Product.serial_number),
+            func.word_similarity(query, Product.category) * 0.8,
+            func.word_similarity(query, Product.description) * 0.5,
+        ) + case((func.lower(Product.serial_number) == query.lower(), 1.0),
+                 (Product.name.ilike(prefix, escape="\\"), 0.5), else_=0.0)
+    else:
+        # Queries shorter than a trigram only match as substrings
+        score = case((Product.name.ilike(prefix, escape="\\"), 1.5), (matches[0], 1.25), else_=1.0)
+    score = score.label("score")
+    stmt = select(*columns, score).where(or_(*matches), scope)
+    if exclude_ids:
+        stmt = stmt.where(Product.id.not_in(exclude_ids))
+    return stmt.order_by(score.desc(), Product.name, Product.id).limit(limit)
+
+
+def _search_stages(dialect_name: str, query: str, scope):
+    # Statements run in order, each one with the room left and the ids already found, until the limit
+    # is reached. On SQLite the substring matches come first and the fuzzy ones (any shared trigram) only
+    # fill what is left: reading the trigram lists of every row is the slow part of the search
+    query = query.strip()
+    if dialect_name == "sqlite" and len(query) >= 3:
+        return [
+            lambda limit, exclude_ids: _fts_stmt(fts_query(query, fuzzy=False), 1.0, scope, limit, exclude_ids),
+            lambda limit, exclude_ids: _fts_stmt(fts_query(query), 0.0, scope, limit, exclude_ids),
+        ]
+    return [lambda limit, exclude_ids: _like_stmt(dialect_name, query, scope, limit, exclude_ids)]
+
+
+def search_products(query: str, warehouse_id, user_id, limit: int, db: Session):
+    logger.info("Searching products matching %r", query)
+    exists_stmt, not_found, scope = _search_scope(query, warehouse_id, user_id)
+    if db.scalar(exists_stmt) is None:
+        logger.error(not_found)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found)
+    products = []
+    for stage in _search_stages(db.get_bind().dialect.name, query, scope):
+        products += db.execute(stage(limit - len(products), [product.id for product in products])).all()
+        if len(products) >= limit:
+            break
+    logger.info("Found %s products matching %r", len(products), query)
+    return products
+
+
+async def search_products_async(query: str, warehouse_id, user_id, limit: int, db: AsyncSession):
+    logger.info("Searching products matching %r", query)
+    exists_stmt, not_found, scope = _search_scope(query, warehouse_id, user_id)
+    if await db.scalar(exists_stmt) is None:
+        logger.error(not_found)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found)
+    products = []
+    for stage in _search_stages(db.bind.dialect.name, query, scope):
+        result = await db.execute(stage(limit - len(products), [product.id for product in products]))
+        products += result.all()
+        if len(products) >= limit:
+            break
+    logger.info("Found %s products matching %r", len(products), query)
+    return products
+
+
 def create_product(product, db: Session):
-    logger.info(f"Creating new product: {product.name}")
+    logger.info("Creating new product: %s", product.name)
     product = product.dict()
 
     if db.query(Product).filter(Product.serial_number == product["serial_number"]).first():
-        logger.error(f"Error creating Product: Serial Number already registered")
+        logger.error("Error creating Product: Serial Number already registered")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Serial Number already registered"
@@ -213,14 +286,25 @@ def create_product(product, db: Session):
 
         try:
             db.add(new_product)
+            db.flush()
+            stock_movement_repository.add_movements([stock_movement_repository.movement(
+                new_product.id, new_product.warehouse_id, new_product.quantity, stock_movement_repository.REASON_OPENING
+            )], db)
+            inventory_summary_repository.apply_deltas([inventory_summary_repository.product_delta(
+                new_product.warehouse_id, new_product.category, new_product.quantity, new_product.price
+            )], db)
+            # A new component changes how many of its kits can be assembled
+            kits = kit_repository.kits_above([new_product.id], db) if new_product.kit_id else []
             db.commit()
             db.refresh(new_product)
-            logger.info(f"Product {new_product.name} created successfully")
+            invalidate("warehouse", new_product.warehouse_id)
+            invalidate("product", *kits)
+            logger.info("Product %s created successfully", new_product.name)
             return new_product
 
         except Exception as e:
             db.rollback()
-            logger.error(f"Error creating product: {str(e)}")
+            logger.error("Error creating product: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error create product: {str(e)}"
@@ -228,20 +312,152 @@ def create_product(product, db: Session):
 
     except Exception as e:
         db.rollback()
-        logger.error(f"Create product conflict: {e}")
+        logger.error("Create product conflict: %s", e)
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Create product conflict {e}"
         )
 
 
+def _bulk_product_row(product: dict):
+    return {
+        "name": product["name"],
+        "quantity": product["quantity"],
+        "serial_number": product["serial_number"],
+        "price": product["price"],
+        "description": product.get("description", None),
+        "kit_id": product.get("kit_id", None),
+        "category": product.get("category", None),
+        "image_url": product.get("image_url", None) or Product.default_image_url,
+        "warehouse_id": product["warehouse_id"],
+    }
+
+
+def _bulk_product_result(index: int, row: dict, product_id=None, detail=None):
+    return {
+        "index": index,
+        "status": "created" if product_id is not None else "rejected",
+        "id": product_id,
+        "serial_number": row["serial_number"],
+        "warehouse_id": row["warehouse_id"],
+        "detail": detail,
+    }
+
+
+def _opening_movements(indexes, rows, new_ids):
+    return [
+        stock_movement_repository.movement(new_id, rows[index]["warehouse_id"], rows[index]["quantity"],
+                                           stock_movement_repository.REASON_OPENING)
+        for index, new_id in zip(indexes, new_ids)
+    ]
+
+
+def _summary_deltas(indexes, rows):
+    return [
+        inventory_summary_repository.product_delta(rows[index]["warehouse_id"], rows[index]["category"],
+                                                   rows[index]["quantity"], rows[index]["price"])
+        for index in indexes
+    ]
+
+
+def _insert_products_chunk(indexes, rows, results, db: Session):
+    stmt = insert(Product).returning(Product.id, sort_by_parameter_order=True)
+
+    try:
+        with db.begin_nested():
+            new_ids = db.scalars(stmt, [rows[index] for index in indexes]).all()
+            stock_movement_repository.add_movements(_opening_movements(indexes, rows, new_ids), db)
+            inventory_summary_repository.apply_deltas(_summary_deltas(indexes, rows), db)
+    except DBAPIError:
+        # A row of the chunk broke a constraint (invalid kit_id, concurrent insert...),
+        # the chunk is retried row by row so only the offending rows are rejected
+        logger.warning("Bulk product chunk of %s rows failed, retrying row by row", len(indexes))
+        for index in indexes:
+            try:
+                with db.begin_nested():
+                    new_id = db.scalars(stmt, [rows[index]]).one()
+                    stock_movement_repository.add_movements(_opening_movements([index], rows, [new_id]), db)
+                    inventory_summary_repository.apply_deltas(_summary_deltas([index], rows), db)
+                results[index] = _bulk_product_result(index, rows[index], product_id=new_id)
+            except DBAPIError as e:
+                results[index] = _bulk_product_result(index, rows[index], detail=str(e.orig).strip())
+        return
+
+    for index, new_id in zip(indexes, new_ids):
+        results[index] = _bulk_product_result(index, rows[index], product_id=new_id)
+
+
+def create_products_bulk(products, db: Session):
+    logger.info("Bulk creating %s products", len(products))
+
+    if not products:
+        logger.error("Error creating products: empty request")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No products provided"
+        )
+
+    rows = [_bulk_product_row(product.dict()) for product in products]
+    results = [None] * len(rows)
+
+    # Warehouses and serial numbers are checked with one query each instead of one per row
+    warehouse_ids = {row["warehouse_id"] for row in rows}
+    existing_warehouses = {warehouse_id for (warehouse_id,) in
+                           db.query(Warehouse.id).filter(Warehouse.id.in_(warehouse_ids))}
+    keys = {(row["serial_number"], row["warehouse_id"]) for row in rows}
+    registered_keys = {
+        (serial_number, warehouse_id) for serial_number, warehouse_id in
+        db.query(Product.serial_number, Product.warehouse_id)
+        .filter(tuple_(Product.serial_number, Product.warehouse_id).in_(keys))
+    }
+
+    pending = []
+    first_index = {}
+    for index, row in enumerate(rows):
+        key = (row["serial_number"], row["warehouse_id"])
+        if row["warehouse_id"] not in existing_warehouses:
+            results[index] = _bulk_product_result(
+                index, row, detail=f"Warehouse with ID {row['warehouse_id']} does not exist")
+        elif key in registered_keys:
+            results[index] = _bulk_product_result(index, row, detail="Serial Number already registered")
+        elif key in first_index:
+            results[index] = _bulk_product_result(
+                index, row, detail=f"Serial Number repeated in the request at index {first_index[key]}")
+        else:
+            first_index[key] = index
+            pending.append(index)
+
+    try:
+        chunk_size = settings.BULK_INSERT_CHUNK_SIZE
+        for start in range(0, len(pending), chunk_size):
+            _insert_products_chunk(pending[start:start + chunk_size], rows, results, db)
+        db.commit()
+        invalidate("warehouse", *(rows[index]["warehouse_id"] for index in pending))
+        kit_ids = {rows[index]["kit_id"] for index in pending if results[index]["status"] == "created"} - {None}
+        if kit_ids:
+            invalidate("product", *kit_ids, *kit_repository.kits_above(kit_ids, db))
+    except Exception as e:
+        db.rollback()
+        logger.error("Error bulk creating products: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error bulk creating products: {str(e)}"
+        )
+
+    created = sum(1 for result in results if result["status"] == "created")
+    logger.info("Bulk created %s of %s products", created, len(rows))
+    return {"created": created, "failed": len(rows) - created, "results": results}
+
+
 def update_product(product_id: int, product_update, db: Session):
-    logger.info(f"Updating product with ID {product_id}")
+    logger.info("Updating product with ID %s", product_id)
     product = db.query(Product).filter(Product.id == product_id)
-    product_instance = product.first()
+    # The row is locked like in create_transaction, so the ledger adjustment below is computed from the
+    # quantity no concurrent transaction can change before this update commits
+    product_instance = product.with_for_update().populate_existing().first()
 
     if not product_instance:
-        logger.error(f"Product with ID {product_id} not found")
+        logger.error("Product with ID %s not found", product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with ID {product_id} does not exist"
@@ -253,20 +469,55 @@ def update_product(product_id: int, product_update, db: Session):
     ).first()
 
     if existing_product:
-        logger.error(f"Error creating Product: Serial Number already registered")
+        logger.error("Error creating Product: Serial Number already registered")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Serial Number already registered"
         )
 
+    changes = product_update.dict(exclude_unset=True)
+    new_kit_id = changes.get("kit_id")
+    if new_kit_id is not None and (new_kit_id == product_id or
+                                   product_id in kit_repository.kits_above([new_kit_id], db)):
+        logger.error("Product with ID %s cannot be a component of kit %s", product_id, new_kit_id)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A product cannot be a component of itself or of its own components"
+        )
+
     try:
-        product.update(product_update.dict(exclude_unset=True))
+        # The kits above the product before and after the change, their buildable count depends on it
+        kits = []
+        if "quantity" in changes or "kit_id" in changes:
+            kits = kit_repository.kits_above([product_id], db)
+        old_quantity, old_warehouse_id = product_instance.quantity, product_instance.warehouse_id
+        old_category, old_price = product_instance.category, product_instance.price
+        product.update(changes)
+
+        # Manual stock corrections go through the ledger too, so it always adds up to the quantity
+        stock_movement_repository.add_movements(stock_movement_repository.adjustment_movements(
+            product_id, old_warehouse_id, old_quantity,
+            changes.get("warehouse_id", old_warehouse_id), changes.get("quantity", old_quantity)
+        ), db)
+        # The old state leaves the summary and the new one enters it, unchanged keys cancel out
+        inventory_summary_repository.apply_deltas([
+            inventory_summary_repository.product_delta(old_warehouse_id, old_category, old_quantity, old_price, -1),
+            inventory_summary_repository.product_delta(
+                changes.get("warehouse_id", old_warehouse_id), changes.get("category", old_category),
+                changes.get("quantity", old_quantity), changes.get("price", old_price)),
+        ], db)
+        alerted = alert_repository.evaluate_alerts([product_id], db) if "quantity" in changes else []
+        if "kit_id" in changes:
+            kits += kit_repository.kits_above([product_id], db)
         db.commit()
         db.refresh(product_instance)
-        logger.info(f"Product {product_instance.name} updated successfully")
+        invalidate("product", product_id, *kits)
+        invalidate("warehouse", old_warehouse_id, product_instance.warehouse_id)
+        invalidate("alerts", *(row.user_id for row in alerted))
+        logger.info("Product %s updated successfully", product_instance.name)
     except Exception as e:
         db.rollback()
-        logger.error(f"Error updating product: {str(e)}")
+        logger.error("Error updating product: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating product: {str(e)}"
@@ -275,22 +526,49 @@ def update_product(product_id: int, product_update, db: Session):
     return product_instance
 
 
+def _kit_tree(product_id: int, db: Session):
+    # The product and every product below it in the kit hierarchy, locked in id order like the lines of a
+    # transaction, so no concurrent stock change lands between these values and the summary deltas
+    tree = select(Product.id).where(Product.id == product_id).cte("kit_tree", recursive=True)
+    tree = tree.union_all(select(Product.id).join(tree, Product.kit_id == tree.c.id))
+    return db.execute(
+        select(Product.id, Product.warehouse_id, Product.category, Product.quantity, Product.price)
+        .where(Product.id.in_(select(tree.c.id)))
+        .order_by(Product.id)
+        .with_for_update()
+    ).all()
+
+
 def delete_product(product_id: int, db: Session):
-    logger.info(f"Deleting product with ID {product_id}")
+    logger.info("Deleting product with ID %s", product_id)
     product_exists = db.query(Product).filter(Product.id == product_id).first()
     if not product_exists:
-        logger.error(f"Product with ID {product_id} not found")
+        logger.error("Product with ID %s not found", product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with ID {product_id} does not exist"
         )
     try:
+        # The components of a kit go away with it (ON DELETE CASCADE), at any depth, and leave the summary too
+        removed = _kit_tree(product_id, db)
+        kits = kit_repository.kits_above([product_id], db) if product_exists.kit_id else []
+        alert_users = alert_repository.alert_user_ids(Product.id.in_([row.id for row in removed]), db)
+        inventory_summary_repository.apply_deltas([
+            inventory_summary_repository.product_delta(row.warehouse_id, row.category, row.quantity, row.price, -1)
+            for row in removed
+        ], db)
+        # Their transaction lines cascade too and leave the daily movements they were counted in
+        _, moved = movement_rollup_repository.remove_lines(
+            TransactionProduct.product_id.in_([row.id for row in removed]), db)
         db.query(Product).filter(Product.id == product_id).delete(synchronize_session=False)
         db.commit()
-        logger.info(f"Product with ID {product_id} deleted successfully")
+        invalidate("product", *(row.id for row in removed), *kits)
+        invalidate("warehouse", *(row.warehouse_id for row in removed), *moved)
+        invalidate("alerts", *alert_users)
+        logger.info("Product with ID %s deleted successfully", product_id)
     except Exception as e:
         db.rollback()
-        logger.error(f"Error deleting product: {str(e)}")
+        logger.error("Error deleting product: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting product: {str(e)}"
@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.db.projection import query_projection, row_dict
+from app.utils.logger import get_logger
+from app.models.product_model import Product
+from app.models.stock_movement_model import StockMovement
+from app.repository import inventory_summary_repository, kit_repository
+from app.schemas.product_schema import ProductLedgerResponseSchema, StockMovementBase
+from app.utils.cache import invalidate
+from app.utils.pagination import PageParams, Page, keyset, build_page
+
+logger = get_logger(__name__)
+
+# Reasons of the ledger entries
+REASON_OPENING = "opening"
+REASON_IN = "in"
+REASON_OUT = "out"
+REASON_ADJUSTMENT = "adjustment"
+REASON_TRANSFER_OUT = "transfer_out"
+REASON_TRANSFER_IN = "transfer_in"
+
+
+def movement(product_id: int, warehouse_id: int, delta: int, reason: str, transaction_id=None, date=None):
+    return {
+        "product_id": product_id,
+        "warehouse_id": warehouse_id,
+        "transaction_id": transaction_id,
+        "delta": delta,
+        "reason": reason,
+        "date": date or datetime.now(timezone.utc),
+    }
+
+
+def adjustment_movements(product_id: int, old_warehouse_id: int, old_quantity: int, new_warehouse_id: int,
+                         new_quantity: int):
+    # A product moved to another warehouse leaves the old one with its whole stock and enters the new one
+    if new_warehouse_id != old_warehouse_id:
+        return [
+            movement(product_id, old_warehouse_id, -old_quantity, REASON_TRANSFER_OUT),
+            movement(product_id, new_warehouse_id, new_quantity, REASON_TRANSFER_IN),
+        ]
+    return [movement(product_id, old_warehouse_id, new_quantity - old_quantity, REASON_ADJUSTMENT)]
+
+
+def add_movements(movements, db: Session):
+    # Appends the entries with one executemany INSERT, the caller owns the commit
+    movements = [entry for entry in movements if entry["delta"]]
+    if movements:
+        db.execute(insert(StockMovement), movements)
+        logger.info("Appended %s stock movements", len(movements))
+    return len(movements)
+
+
+def get_movements_by_product_id(product_id: int, page: PageParams, db: Session):
+    logger.info("Fetching stock ledger for product ID: %s", product_id)
+    product = query_projection(db, Product, ProductLedgerResponseSchema).filter(Product.id == product_id).first()
+
+    if not product:
+        logger.error("Product with ID %s not found", product_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product with ID {product_id} does not exist"
+        )
+
+    movements_query = query_projection(db, StockMovement, StockMovementBase) \
+        .filter(StockMovement.product_id == product.id)
+    movements_page = build_page(
+        keyset(movements_query, StockMovement.date, StockMovement.id, page, descending=True).all(), page, "date")
+
+    logger.info("Found %s stock movements for product ID %s", len(movements_page.data), product_id)
+    product_data = row_dict(product, movements=[movement._asdict() for movement in movements_page.data])
+
+    return Page(data=product_data, next_cursor=movements_page.next_cursor)
+
+
+def rebuild_stock(db: Session, product_ids=None, dry_run: bool = False):
+    # Recomputes the materialized Product.quantity from the ledger and returns the products that drifted
+    ledger = (
+        select(StockMovement.product_id, func.sum(StockMovement.delta).label("total"))
+        .group_by(StockMovement.product_id)
+        .subquery()
+    )
+    expected = func.coalesce(ledger.c.total, 0)
+
+    drift_query = (
+        select(Product.id, Product.quantity, Product.warehouse_id, expected.label("expected"))
+        .outerjoin(ledger, ledger.c.product_id == Product.id)
+        .where(Product.quantity != expected)
+        .order_by(Product.id)
+    )
+    if product_ids:
+        drift_query = drift_query.where(Product.id.in_(product_ids))
+
+    drifted = [
+        {"product_id": row.id, "warehouse_id": row.warehouse_id, "quantity": row.quantity, "expected": row.expected}
+        for row in db.execute(drift_query)
+    ]
+
+    if drifted and not dry_run:
+        corrected = select(expected).select_from(ledger).where(ledger.c.product_id == Product.id).scalar_subquery()
+        db.execute(
+            update(Product)
+            .where(Product.id.in_([row["product_id"] for row in drifted]))
+            .values(quantity=func.coalesce(corrected, 0))
+            .execution_options(synchronize_session=False)
+        )
+        # The corrected quantities change the valuation of their warehouses
+        inventory_summary_repository.write_summaries(db, sorted({row["warehouse_id"] for row in drifted}))
+        kits = kit_repository.kits_above([row["product_id"] for row in drifted], db)
+        db.commit()
+        invalidate("product", *(row["product_id"] for row in drifted), *kits)
+        invalidate("warehouse", *(row["warehouse_id"] for row in drifted))
+        logger.info("Rebuilt the stock of %s products from the ledger", len(drifted))
+
+    return drifted
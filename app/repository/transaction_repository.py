@@ -1,23 +1,54 @@
 from datetime import datetime, timezone
 
 from fastapi import HTTPException, status
-from sqlalchemy import insert
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.utils.logger import logger
+from app.db.projection import query_projection, select_projection, row_dict
+from app.utils.logger import get_logger
 from app.models.product_model import Product
 from app.models.transaction_model import Transaction
 from app.models.transaction_products_midtable import TransactionProduct
+from app.schemas.transaction_schema import TransactionResponseSchema, TransactionProductsResponseSchema, \
+    ProductTransaction
+from app.repository import alert_repository, inventory_summary_repository, kit_repository, \
+    movement_rollup_repository, stock_movement_repository
+from app.utils.cache import invalidate
 from app.utils.identifier import generate_identifier
+from app.utils.pagination import PageParams, keyset, build_page
 
+logger = get_logger(__name__)
 
-def get_transactions(db: Session):
+
+def get_transactions(page: PageParams, db: Session):
+    try:
+        transactions_query = query_projection(db, Transaction, TransactionResponseSchema)
+        data = keyset(transactions_query, Transaction.date, Transaction.id, page, descending=True).all()
+        transactions_page = build_page(data, page, "date")
+        logger.info("Fetched %s transactions from the database", len(transactions_page.data))
+        return transactions_page
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching transactions: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching transactions: {str(e)}"
+        )
+
+
+async def get_transactions_async(page: PageParams, db: AsyncSession):
     try:
-        data = db.query(Transaction).all()
-        logger.info(f"Fetched {len(data)} transactions from the database")
-        return data
+        result = await db.execute(keyset(select_projection(Transaction, TransactionResponseSchema),
+                                         Transaction.date, Transaction.id, page, descending=True))
+        transactions_page = build_page(result.all(), page, "date")
+        logger.info("Fetched %s transactions from the database", len(transactions_page.data))
+        return transactions_page
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching transactions: {str(e)}")
+        logger.error("Error fetching transactions: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching transactions: {str(e)}"
@@ -28,63 +59,108 @@ def get_transaction_by_id(transaction_id: int, db: Session):
     try:
         transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
         if not transaction:
-            logger.warning(f"Transaction with ID {transaction_id} not found")
+            logger.warning("Transaction with ID %s not found", transaction_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Transaction with ID {transaction_id} does not exist"
             )
-        logger.info(f"Transaction with ID {transaction_id} fetched successfully")
+        logger.info("Transaction with ID %s fetched successfully", transaction_id)
         return transaction
     except Exception as e:
-        logger.error(f"Error fetching transaction with ID {transaction_id}: {str(e)}")
+        logger.error("Error fetching transaction with ID %s: %s", transaction_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching transaction: {str(e)}"
         )
 
 
+async def get_transaction_by_id_async(transaction_id: int, db: AsyncSession):
+    try:
+        transaction = await db.get(Transaction, transaction_id)
+        if not transaction:
+            logger.warning("Transaction with ID %s not found", transaction_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Transaction with ID {transaction_id} does not exist"
+            )
+        logger.info("Transaction with ID %s fetched successfully", transaction_id)
+        return transaction
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching transaction with ID %s: %s", transaction_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching transaction: {str(e)}"
+        )
+
+
+def _transaction_products_data(transaction, transaction_products):
+    return row_dict(transaction, products=[line._asdict() for line in transaction_products])
+
+
 def get_products_by_transaction_id(transaction_id: int, db: Session):
     try:
-        transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+        transaction = query_projection(db, Transaction, TransactionProductsResponseSchema) \
+            .filter(Transaction.id == transaction_id).first()
         if not transaction:
-            logger.warning(f"Transaction with ID {transaction_id} not found")
+            logger.warning("Transaction with ID %s not found", transaction_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Transaction with ID {transaction_id} does not exist"
             )
 
-        products = db.query(Product).join(transaction.transaction_products).filter(
-            transaction.transaction_products.c.transaction_id == transaction_id).all()
-        if not products:
-            logger.warning(f"No products found for transaction ID {transaction_id}")
+        transaction_products = query_projection(db, TransactionProduct, ProductTransaction).filter(
+            TransactionProduct.transaction_id == transaction_id).all()
+        if not transaction_products:
+            logger.warning("No products found for transaction ID %s", transaction_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No products found under transaction with ID {transaction_id}"
             )
 
-        products_list = [
-            {
-                "product_id": product.id,
-                "quantity": product.quantity
-            }
-            for product in products
-        ]
+        logger.info("Fetched products for transaction ID %s", transaction_id)
+        return _transaction_products_data(transaction, transaction_products)
 
-        transaction_data = {
-            "id": transaction.id,
-            "identifier": transaction.identifier,
-            "date": transaction.date,
-            "type": transaction.type,
-            "warehouse_id": transaction.warehouse_id,
-            "client_id": transaction.client_id,
-            "products_list": products_list
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching products for transaction ID %s: %s", transaction_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching products for transaction: {str(e)}"
+        )
 
-        logger.info(f"Fetched products for transaction ID {transaction_id}")
-        return transaction_data
 
+async def get_products_by_transaction_id_async(transaction_id: int, db: AsyncSession):
+    try:
+        result = await db.execute(select_projection(Transaction, TransactionProductsResponseSchema)
+                                  .where(Transaction.id == transaction_id))
+        transaction = result.first()
+        if not transaction:
+            logger.warning("Transaction with ID %s not found", transaction_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Transaction with ID {transaction_id} does not exist"
+            )
+
+        result = await db.execute(select_projection(TransactionProduct, ProductTransaction)
+                                  .where(TransactionProduct.transaction_id == transaction_id))
+        transaction_products = result.all()
+        if not transaction_products:
+            logger.warning("No products found for transaction ID %s", transaction_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No products found under transaction with ID {transaction_id}"
+            )
+
+        logger.info("Fetched products for transaction ID %s", transaction_id)
+        return _transaction_products_data(transaction, transaction_products)
+
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching products for transaction ID {transaction_id}: {str(e)}")
+        logger.error("Error fetching products for transaction ID %s: %s", transaction_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching products for transaction: {str(e)}"
@@ -94,6 +170,75 @@ def get_products_by_transaction_id(transaction_id: int, db: Session):
 def create_transaction(transaction_data, db: Session):
     try:
         logger.info("Creating new transaction")
+
+        # Lines of the same product are merged, the midtable allows one line per product
+        quantities = {}
+        for product in transaction_data.products:
+            quantities[product.product_id] = quantities.get(product.product_id, 0) + product.quantity
+        product_ids = sorted(quantities)
+
+        # All the products are read and locked in one query, always in id order so two
+        # concurrent movements over the same products cannot deadlock or lose stock
+        stock = {}
+        warehouses = {}
+        valuations = {}
+        components = []
+        kits = []
+        alerted = []
+        if product_ids:
+            for row in db.execute(
+                select(Product.id, Product.quantity, Product.warehouse_id, Product.category, Product.price,
+                       Product.kit_id)
+                .where(Product.id.in_(product_ids))
+                .order_by(Product.id)
+                .with_for_update()
+            ):
+                stock[row.id] = row.quantity
+                warehouses[row.id] = row.warehouse_id
+                valuations[row.id] = (row.category, row.price)
+                if row.kit_id is not None:
+                    components.append(row.id)
+
+        missing = [product_id for product_id in product_ids if product_id not in stock]
+        if missing:
+            logger.warning("Products %s not found", missing)
+            raise HTTPException(status_code=404, detail="Product not found")
+
+        sign = {'in': 1, 'out': -1}.get(transaction_data.type, 0)
+
+        if sign < 0:
+            insufficient = [product_id for product_id in product_ids if stock[product_id] < quantities[product_id]]
+            if insufficient:
+                product_id = insufficient[0]
+                logger.error(
+                    "Insufficient stock for product %s: available %s, required %s",
+                    product_id, stock[product_id], quantities[product_id])
+                raise HTTPException(status_code=400, detail=f"Insufficient stock for product {product_id}")
+
+        if sign and product_ids:
+            # One UPDATE for every line, the new quantity is computed by the database from the locked row
+            delta = case({product_id: sign * quantity for product_id, quantity in quantities.items()}, value=Product.id)
+            db.execute(
+                update(Product)
+                .where(Product.id.in_(product_ids))
+                .values(quantity=Product.quantity + delta)
+                .execution_options(synchronize_session=False)
+            )
+            logger.info("Stock of %s products updated by a '%s' transaction", len(product_ids), transaction_data.type)
+
+            # Thresholds of the touched products are checked against the new quantities in one statement
+            alerted = alert_repository.evaluate_alerts(product_ids, db)
+
+            inventory_summary_repository.apply_deltas([
+                inventory_summary_repository.stock_delta(
+                    warehouses[product_id], valuations[product_id][0], sign * quantities[product_id],
+                    valuations[product_id][1])
+                for product_id in product_ids
+            ], db)
+
+            # Kits built from the moved products can now be assembled more or fewer times
+            kits = kit_repository.kits_above(components, db)
+
         new_transaction = Transaction(
             identifier=generate_identifier(db),
             type=transaction_data.type,
@@ -103,54 +248,34 @@ def create_transaction(transaction_data, db: Session):
         )
 
         db.add(new_transaction)
-        db.commit()
-        db.refresh(new_transaction)
+        db.flush()
 
-        logger.info(f"Transaction created with ID {new_transaction.id}, type: {transaction_data.type}")
-
-        product_entries = []
-        for product in transaction_data.products:
-
-            product_in_db = db.query(Product).filter(Product.id == product.product_id).first()
-
-            if not product_in_db:
-                logger.warning(f"Product {product.product_id} not found")
-                raise HTTPException(status_code=404, detail="Product not found")
-
-            if transaction_data.type == 'out':
-                logger.info(
-                    f"Trying to remove {product.quantity} units from product {product.product_id} (current stock: {product_in_db.quantity})")
-                if product_in_db.quantity < product.quantity:
-                    logger.error(
-                        f"Insufficient stock for product {product.product_id}: available {product_in_db.quantity}, required {product.quantity}")
-                    raise HTTPException(status_code=400, detail=f"Insufficient stock for product {product.product_id}")
-                product_in_db.quantity -= product.quantity
-                logger.info(
-                    f"New stock for product {product.product_id} after outgoing transaction: {product_in_db.quantity}")
-
-            elif transaction_data.type == 'in':
-                logger.info(
-                    f"Adding {product.quantity} units to product {product.product_id} (current stock: {product_in_db.quantity})")
-                product_in_db.quantity += product.quantity
-                logger.info(
-                    f"New stock for product {product.product_id} after incoming transaction: {product_in_db.quantity}")
-
-            db.add(product_in_db)
-
-            product_entries.append({
+        product_entries = [
+            {
                 "transaction_id": new_transaction.id,
-                "product_id": product.product_id,
-                "quantity": product.quantity
-            })
+                "product_id": product_id,
+                "quantity": quantities[product_id]
+            }
+            for product_id in product_ids
+        ]
 
         if product_entries:
-            stmt = insert(TransactionProduct).values(product_entries)
-            db.execute(stmt)
-
-        db.commit()
-        logger.info(f"Transaction completed with {len(product_entries)} products")
-
-        return {
+            db.execute(insert(TransactionProduct), product_entries)
+
+        # The ledger gets one entry per line, the product quantity above is its materialized sum
+        if sign:
+            stock_movement_repository.add_movements([
+                stock_movement_repository.movement(
+                    product_id, warehouses[product_id], sign * quantities[product_id], transaction_data.type,
+                    transaction_id=new_transaction.id, date=new_transaction.date)
+                for product_id in product_ids
+            ], db)
+
+        # The daily movement buckets of the products and the warehouse of the transaction
+        movement_rollup_repository.apply_transaction(
+            new_transaction.type, new_transaction.warehouse_id, new_transaction.date, quantities, db)
+
+        transaction_response = {
             "id": new_transaction.id,
             "identifier": new_transaction.identifier,
             "date": new_transaction.date.isoformat(),
@@ -160,8 +285,21 @@ def create_transaction(transaction_data, db: Session):
             "products": product_entries
         }
 
+        # Header, lines and stock changes are committed together
+        db.commit()
+        if sign:
+            invalidate("product", *product_ids, *kits)
+            invalidate("warehouse", new_transaction.warehouse_id, *warehouses.values())
+            invalidate("alerts", *(row.user_id for row in alerted))
+        logger.info("Transaction created with ID %s and %s products", transaction_response['id'], len(product_entries))
+
+        return transaction_response
+
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
-        logger.error(f"Error creating transaction: {str(e)}")
+        logger.error("Error creating transaction: %s", e)
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -171,20 +309,32 @@ def create_transaction(transaction_data, db: Session):
 
 def delete_transaction(transaction_id: int, db: Session):
     try:
-        logger.info(f"Deleting transaction with ID {transaction_id}")
+        logger.info("Deleting transaction with ID %s", transaction_id)
         transaction_exists = db.query(Transaction).filter(Transaction.id == transaction_id).first()
         if not transaction_exists:
-            logger.warning(f"Transaction with ID {transaction_id} not found")
+            logger.warning("Transaction with ID %s not found", transaction_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Transaction with ID {transaction_id} does not exist"
             )
 
+        # Its lines leave the daily movement buckets together with the transaction
+        quantities = dict(db.execute(
+            select(TransactionProduct.product_id, TransactionProduct.quantity)
+            .where(TransactionProduct.transaction_id == transaction_id)
+        ).all())
+        transaction_type, warehouse_id = transaction_exists.type, transaction_exists.warehouse_id
+        moved = movement_rollup_repository.apply_transaction(
+            transaction_type, warehouse_id, transaction_exists.date, quantities, db, sign=-1)
+
         db.query(Transaction).filter(Transaction.id == transaction_id).delete(synchronize_session=False)
         db.commit()
-        logger.info(f"Transaction with ID {transaction_id} deleted successfully")
+        if moved:
+            invalidate("product", *quantities)
+            invalidate("warehouse", warehouse_id)
+        logger.info("Transaction with ID %s deleted successfully", transaction_id)
     except Exception as e:
-        logger.error(f"Error deleting transaction with ID {transaction_id}: {str(e)}")
+        logger.error("Error deleting transaction with ID %s: %s", transaction_id, e)
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,21 +1,35 @@
 from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.utils.logger import logger
+from app.db.projection import query_projection, row_dict
+from app.utils.logger import get_logger
 from app.models.alert_model import Alert
 from app.models.client_model import Client
 from app.models.user_model import User
 from app.models.warehouse_model import Warehouse
+from app.schemas.user_schema import UserResponseSchema, UserEmployeesResponseSchema, EmployeesBase, \
+    UserWarehousesResponseSchema, WarehousesBase, UserClientsResponseSchema, ClientsBase, UserAlertsResponseSchema, \
+    AlertsBase
 from app.utils.hashing import Hash
+from app.utils.cache import cached, invalidate
+from app.utils.pagination import PageParams, keyset, build_page
 
+logger = get_logger(__name__)
 
-def get_users(db: Session):
+
+def get_users(page: PageParams, db: Session):
     try:
-        data = db.query(User).all()
-        logger.info(f"Fetched {len(data)} users from the database")
-        return data
+        # username is nullable, so users are paginated by id only
+        data = keyset(query_projection(db, User, UserResponseSchema), User.id, User.id, page).all()
+        users_page = build_page(data, page, "id")
+        logger.info("Fetched %s users from the database", len(users_page.data))
+        return users_page
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching users: {str(e)}")
+        logger.error("Error fetching users: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching users: {str(e)}"
@@ -26,15 +40,15 @@ def get_user_by_id(user_id: int, db: Session):
     try:
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
-            logger.warning(f"User with ID {user_id} not found")
+            logger.warning("User with ID %s not found", user_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"User with ID {user_id} does not exist"
             )
-        logger.info(f"User with ID {user_id} fetched successfully")
+        logger.info("User with ID %s fetched successfully", user_id)
         return user
     except Exception as e:
-        logger.error(f"Error fetching user with ID {user_id}: {str(e)}")
+        logger.error("Error fetching user with ID %s: %s", user_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching user: {str(e)}"
@@ -43,39 +57,22 @@ def get_user_by_id(user_id: int, db: Session):
 
 def get_users_by_user_id(user_id: int, db: Session):
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = query_projection(db, User, UserEmployeesResponseSchema).filter(User.id == user_id).first()
 
         if not user:
-            logger.warning(f"User with ID {user_id} not found")
+            logger.warning("User with ID %s not found", user_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"User with ID {user_id} does not exist"
             )
 
-        users = db.query(User).filter(User.admin_id == user_id).all()
-
-        users_list = [
-            {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "role": user.role
-            }
-            for user in users
-        ]
-
-        user_data = {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "role": user.role,
-            "users": users_list
-        }
-
-        logger.info(f"Fetched users under admin with ID {user_id}")
+        users = query_projection(db, User, EmployeesBase).filter(User.admin_id == user_id).all()
+        user_data = row_dict(user, users=[employee._asdict() for employee in users])
+
+        logger.info("Fetched users under admin with ID %s", user_id)
         return user_data
     except Exception as e:
-        logger.error(f"Error fetching users under admin with ID {user_id}: {str(e)}")
+        logger.error("Error fetching users under admin with ID %s: %s", user_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching users: {str(e)}"
@@ -84,87 +81,51 @@ def get_users_by_user_id(user_id: int, db: Session):
 
 def get_clients_by_user_id(user_id: int, db: Session):
     try:
-        logger.info(f"Fetching user with ID {user_id}")
-        user = db.query(User).filter(User.id == user_id).first()
+        logger.info("Fetching user with ID %s", user_id)
+        user = query_projection(db, User, UserClientsResponseSchema).filter(User.id == user_id).first()
 
         if not user:
-            logger.warning(f"User with ID {user_id} not found")
+            logger.warning("User with ID %s not found", user_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"User with ID {user_id} does not exist"
             )
 
-        logger.info(f"User with ID {user_id} found. Fetching clients...")
-        clients = db.query(Client).filter(Client.user_id == user.id).all()
-
-        clients_list = [
-            {
-                "id": client.id,
-                "identifier": client.identifier,
-                "name": client.name,
-                "contact": client.contact,
-                "phone": client.phone,
-                "email": client.email,
-                "address": client.address,
-                "user_id": client.user_id,
-            }
-            for client in clients
-        ]
-
-        logger.info(f"Fetched {len(clients_list)} clients for user ID {user_id}")
-
-        user_data = {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "role": user.role,
-            "clients": clients_list
-        }
+        logger.info("User with ID %s found. Fetching clients...", user_id)
+        clients = query_projection(db, Client, ClientsBase).filter(Client.user_id == user.id).all()
+
+        logger.info("Fetched %s clients for user ID %s", len(clients), user_id)
+
+        user_data = row_dict(user, clients=[client._asdict() for client in clients])
 
         return user_data
     except Exception as e:
-        logger.error(f"Error fetching clients for user ID {user_id}: {str(e)}")
+        logger.error("Error fetching clients for user ID %s: %s", user_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching clients: {str(e)}"
         )
 
 
+@cached("user", "user_id")
 def get_warehouses_by_user_id(user_id: int, db: Session):
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = query_projection(db, User, UserWarehousesResponseSchema).filter(User.id == user_id).first()
 
         if not user:
-            logger.warning(f"User with ID {user_id} not found")
+            logger.warning("User with ID %s not found", user_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"User with ID {user_id} does not exist"
             )
 
-        warehouses = db.query(Warehouse).filter(Warehouse.user_id == user.id).all()
-
-        warehouses_list = [
-            {
-                "id": warehouse.id,
-                "name": warehouse.name,
-                "address": warehouse.address,
-                "phone": warehouse.phone
-            }
-            for warehouse in warehouses
-        ]
-
-        user_data = {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "role": user.role,
-            "warehouses": warehouses_list
-        }
-
-        logger.info(f"Fetched warehouses under user with ID {user_id}")
+        warehouses = query_projection(db, Warehouse, WarehousesBase).filter(Warehouse.user_id == user.id).all()
+        user_data = row_dict(user, warehouses=[warehouse._asdict() for warehouse in warehouses])
+
+        logger.info("Fetched warehouses under user with ID %s", user_id)
         return user_data
     except Exception as e:
-        logger.error(f"Error fetching warehouses under user with ID {user_id}: {str(e)}")
+        logger.error("Error fetching warehouses under user with ID %s: %s", user_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching warehouses: {str(e)}"
@@ -173,50 +134,30 @@ def get_warehouses_by_user_id(user_id: int, db: Session):
 
 def get_alerts_by_user_id(user_id: int, db: Session):
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = query_projection(db, User, UserAlertsResponseSchema).filter(User.id == user_id).first()
 
         if not user:
-            logger.warning(f"User with ID {user_id} not found")
+            logger.warning("User with ID %s not found", user_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"User with ID {user_id} does not exist"
             )
 
-        alerts = db.query(Alert).filter(Alert.user_id == user.id).all()
+        alerts = query_projection(db, Alert, AlertsBase).filter(Alert.user_id == user.id).all()
 
         if not alerts:
-            logger.warning(f"No alerts found under user with ID {user_id}")
+            logger.warning("No alerts found under user with ID %s", user_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No alerts found under user with ID {user_id}"
             )
 
-        alerts_list = [
-            {
-                "id": alert.id,
-                "date": alert.date,
-                "read": alert.read,
-                "min_quantity": alert.min_quantity,
-                "max_quantity": alert.max_quantity,
-                "max_message": alert.max_message,
-                "min_message": alert.min_message,
-                "product_id": alert.product_id
-            }
-            for alert in alerts
-        ]
-
-        user_data = {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "role": user.role,
-            "alerts": alerts_list
-        }
-
-        logger.info(f"Fetched alerts under user with ID {user_id}")
+        user_data = row_dict(user, alerts=[alert._asdict() for alert in alerts])
+
+        logger.info("Fetched alerts under user with ID %s", user_id)
         return user_data
     except Exception as e:
-        logger.error(f"Error fetching alerts under user with ID {user_id}: {str(e)}")
+        logger.error("Error fetching alerts under user with ID %s: %s", user_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching alerts: {str(e)}"
@@ -227,14 +168,14 @@ def create_user(user, db: Session):
     user = user.dict()
 
     if db.query(User).filter(User.email == user["email"]).first():
-        logger.error(f"Error creating user: Email already registered")
+        logger.error("Error creating user: Email already registered")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
 
     if db.query(User).filter(User.username == user["username"]).first():
-        logger.error(f"Error creating user: Username already registered")
+        logger.error("Error creating user: Username already registered")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
@@ -258,10 +199,12 @@ def create_user(user, db: Session):
         db.add(new_user)
         db.commit()
         db.refresh(new_user)
-        logger.info(f"User created with ID {new_user.id}")
+        logger.info("User created with ID %s", new_user.id)
         return new_user
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error creating user: {str(e)}")
+        logger.error("Error creating user: %s", e)
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -274,7 +217,7 @@ def update_user(user_id: int, user_update, db: Session):
     user_instance = user.first()
 
     if not user_instance:
-        logger.warning(f"User with ID {user_id} not found")
+        logger.warning("User with ID %s not found", user_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with ID {user_id} does not exist"
@@ -286,7 +229,7 @@ def update_user(user_id: int, user_update, db: Session):
     ).first()
 
     if existing_username:
-        logger.error(f"Error creating User: Username already registered")
+        logger.error("Error creating User: Username already registered")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
@@ -298,7 +241,7 @@ def update_user(user_id: int, user_update, db: Session):
     ).first()
 
     if existing_user_email:
-        logger.error(f"Error creating User: Email already registered")
+        logger.error("Error creating User: Email already registered")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -314,10 +257,13 @@ def update_user(user_id: int, user_update, db: Session):
         user.update(user_data)
         db.commit()
         db.refresh(user_instance)
-        logger.info(f"User with ID {user_id} updated successfully")
+        invalidate("user", user_id)
+        logger.info("User with ID %s updated successfully", user_id)
         return user_instance
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error updating user with ID {user_id}: {str(e)}")
+        logger.error("Error updating user with ID %s: %s", user_id, e)
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -325,11 +271,108 @@ def update_user(user_id: int, user_update, db: Session):
         )
 
 
+async def create_user_async(user, db: AsyncSession):
+    # Same checks as create_user, the password is hashed in the hash pool while the event loop keeps serving
+    user = user.dict()
+
+    if (await db.execute(select(User.id).where(User.email == user["email"]))).first():
+        logger.error("Error creating user: Email already registered")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+
+    if (await db.execute(select(User.id).where(User.username == user["username"]))).first():
+        logger.error("Error creating user: Username already registered")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already registered"
+        )
+
+    try:
+        logger.info("Creating new user")
+
+        new_user = User(
+            username=user["username"],
+            password=await Hash.hash_password_async(user["password"]),
+            email=user["email"],
+            role=user["role"],
+            image_url=user.get("image_url", None),
+            admin_id=user.get("admin_id", None),
+        )
+
+        db.add(new_user)
+        await db.commit()
+        await db.refresh(new_user)
+        logger.info("User created with ID %s", new_user.id)
+        return new_user
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error creating user: %s", e)
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating user: {str(e)}"
+        )
+
+
+async def update_user_async(user_id: int, user_update, db: AsyncSession):
+    user_instance = await db.get(User, user_id)
+
+    if not user_instance:
+        logger.warning("User with ID %s not found", user_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {user_id} does not exist"
+        )
+
+    if (await db.execute(
+            select(User.id).where(User.username == user_update.username, User.id != user_id))).first():
+        logger.error("Error creating User: Username already registered")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already registered"
+        )
+
+    if (await db.execute(select(User.id).where(User.email == user_update.email, User.id != user_id))).first():
+        logger.error("Error creating User: Email already registered")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+
+    try:
+
+        user_data = user_update.dict(exclude_unset=True)
+
+        if "password" in user_data:
+            user_data["password"] = await Hash.hash_password_async(user_data["password"])
+
+        if user_data:
+            await db.execute(update(User).where(User.id == user_id).values(**user_data)
+                             .execution_options(synchronize_session=False))
+        await db.commit()
+        await db.refresh(user_instance)
+        invalidate("user", user_id)
+        logger.info("User with ID %s updated successfully", user_id)
+        return user_instance
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error updating user with ID %s: %s", user_id, e)
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error updating user: {str(e)}"
+        )
+
+
 def delete_user(user_id: int, db: Session):
     try:
         user_exists = db.query(User).filter(User.id == user_id).first()
         if not user_exists:
-            logger.warning(f"User with ID {user_id} not found")
+            logger.warning("User with ID %s not found", user_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"User with ID {user_id} does not exist"
@@ -337,9 +380,10 @@ def delete_user(user_id: int, db: Session):
 
         db.query(User).filter(User.id == user_id).delete(synchronize_session=False)
         db.commit()
-        logger.info(f"User with ID {user_id} deleted successfully")
+        invalidate("user", user_id)
+        logger.info("User with ID %s deleted successfully", user_id)
     except Exception as e:
-        logger.error(f"Error deleting user with ID {user_id}: {str(e)}")
+        logger.error("Error deleting user with ID %s: %s", user_id, e)
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,137 +1,306 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from itertools import groupby
+
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from app.config.config import settings
+from app.db.database import SessionLocal
+from app.db.projection import projection, query_projection, select_projection, row_dict
 from app.models.product_model import Product
 from app.models.transaction_model import Transaction
 from app.models.transaction_products_midtable import TransactionProduct
 from app.models.warehouse_model import Warehouse
-from app.utils.logger import logger
+from app.repository import alert_repository, movement_rollup_repository
+from app.schemas.warehouse_schema import WarehouseResponseSchema, WarehouseProductsResponseSchema, ProductsBase, \
+    WarehouseTransactionsResponseSchema, TransactionsBase, ProductBase
+from app.utils.logger import get_logger
+from app.utils.cache import cached, invalidate
+from app.utils.pagination import PageParams, Page, keyset, build_page
+
+logger = get_logger(__name__)
+
 
+def get_warehouses(page: PageParams, db: Session):
+    logger.info("Fetching warehouses page from the database.")
+    data = keyset(query_projection(db, Warehouse, WarehouseResponseSchema), Warehouse.name, Warehouse.id, page).all()
+    warehouses_page = build_page(data, page, "name")
+    logger.info("Retrieved %s warehouses.", len(warehouses_page.data))
+    return warehouses_page
 
-def get_warehouses(db: Session):
-    logger.info("Fetching all warehouses from the database.")
-    data = db.query(Warehouse).all()
-    logger.info(f"Retrieved {len(data)} warehouses.")
-    return data
 
+async def get_warehouses_async(page: PageParams, db: AsyncSession):
+    logger.info("Fetching warehouses page from the database.")
+    result = await db.execute(
+        keyset(select_projection(Warehouse, WarehouseResponseSchema), Warehouse.name, Warehouse.id, page))
+    warehouses_page = build_page(result.all(), page, "name")
+    logger.info("Retrieved %s warehouses.", len(warehouses_page.data))
+    return warehouses_page
 
+
+@cached("warehouse", "warehouse_id")
 def get_warehouse_by_id(warehouse_id: int, db: Session):
-    logger.info(f"Fetching warehouse with ID {warehouse_id} from the database.")
+    logger.info("Fetching warehouse with ID %s from the database.", warehouse_id)
     warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
     if not warehouse:
-        logger.error(f"Warehouse with ID {warehouse_id} does not exist.")
+        logger.error("Warehouse with ID %s does not exist.", warehouse_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Warehouse with ID {warehouse_id} does not exist"
         )
-    logger.info(f"Warehouse with ID {warehouse_id} found.")
+    logger.info("Warehouse with ID %s found.", warehouse_id)
     return warehouse
 
-def get_products_by_warehouse_id(warehouse_id: int, db: Session):
-    warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
 
+@cached("warehouse", "warehouse_id")
+async def get_warehouse_by_id_async(warehouse_id: int, db: AsyncSession):
+    logger.info("Fetching warehouse with ID %s from the database.", warehouse_id)
+    warehouse = await db.get(Warehouse, warehouse_id)
     if not warehouse:
+        logger.error("Warehouse with ID %s does not exist.", warehouse_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Warehouse with ID {warehouse_id} does not exist"
         )
+    logger.info("Warehouse with ID %s found.", warehouse_id)
+    return warehouse
+
+
+def _warehouse_products_data(warehouse, products):
+    return row_dict(warehouse, products=[product._asdict() for product in products])
+
 
-    products = db.query(Product).filter(Product.warehouse_id == warehouse.id).all()
+@cached("warehouse", "warehouse_id")
+def get_products_by_warehouse_id(warehouse_id: int, page: PageParams, db: Session):
+    warehouse = query_projection(db, Warehouse, WarehouseProductsResponseSchema) \
+        .filter(Warehouse.id == warehouse_id).first()
 
-    if not products:
+    if not warehouse:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Warehouse with ID {warehouse_id} does not exist"
+        )
+
+    products_query = query_projection(db, Product, ProductsBase).filter(Product.warehouse_id == warehouse.id)
+    products_page = build_page(keyset(products_query, Product.name, Product.id, page).all(), page, "name")
+    products = products_page.data
+
+    if not products and not page.cursor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No products found under warehouse with ID {warehouse_id}"
         )
 
-    products = [
-        {
-            "id": product.id,
-            "name": product.name,
-            "quantity": product.quantity,
-            "serial_number": product.serial_number,
-            "price": product.price,
-            "description": product.description,
-            "category": product.category,
-            "image_url": product.image_url,
-            "kit_id": product.kit_id,
-            "warehouse_id": product.warehouse_id,
-        }
-        for product in products
-    ]
+    return Page(data=_warehouse_products_data(warehouse, products), next_cursor=products_page.next_cursor)
 
-    warehouse_data = {
-        "id": warehouse.id,
-        "name": warehouse.name,
-        "address": warehouse.address,
-        "phone": warehouse.phone,
-        "user_id": warehouse.user_id,
-        "products": products
-    }
 
-    return warehouse_data
+@cached("warehouse", "warehouse_id")
+async def get_products_by_warehouse_id_async(warehouse_id: int, page: PageParams, db: AsyncSession):
+    result = await db.execute(
+        select_projection(Warehouse, WarehouseProductsResponseSchema).where(Warehouse.id == warehouse_id))
+    warehouse = result.first()
+
+    if not warehouse:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Warehouse with ID {warehouse_id} does not exist"
+        )
 
+    products_query = select_projection(Product, ProductsBase).where(Product.warehouse_id == warehouse.id)
+    result = await db.execute(keyset(products_query, Product.name, Product.id, page))
+    products_page = build_page(result.all(), page, "name")
+    products = products_page.data
 
+    if not products and not page.cursor:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No products found under warehouse with ID {warehouse_id}"
+        )
 
+    return Page(data=_warehouse_products_data(warehouse, products), next_cursor=products_page.next_cursor)
 
-def get_transactions_by_warehouse_id(warehouse_id: int, db: Session):
-    logger.info(f"Fetching transactions for warehouse with ID {warehouse_id}.")
-    warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
+
+def _transaction_lines_stmt(transaction_ids):
+    # Lines of a page of transactions with the product columns of the response, in one query
+    return (
+        select(
+            TransactionProduct.transaction_id.label("line_transaction_id"),
+            TransactionProduct.quantity.label("line_quantity"),
+            *[column.label(f"product_{column.key}") for column in projection(Product, ProductBase)],
+        )
+        .join(Product, Product.id == TransactionProduct.product_id)
+        .where(TransactionProduct.transaction_id.in_(transaction_ids))
+    )
+
+
+def _warehouse_transactions_data(warehouse, transactions, lines):
+    products_by_transaction = {}
+    product_fields = [column.key for column in projection(Product, ProductBase)]
+    for line in lines:
+        products_by_transaction.setdefault(line.line_transaction_id, []).append({
+            "quantity": line.line_quantity,
+            "product": {field: getattr(line, f"product_{field}") for field in product_fields},
+        })
+
+    return row_dict(warehouse, transactions=[
+        row_dict(transaction, products=products_by_transaction.get(transaction.id, []))
+        for transaction in transactions
+    ])
+
+
+def get_transactions_by_warehouse_id(warehouse_id: int, page: PageParams, db: Session):
+    logger.info("Fetching transactions for warehouse with ID %s.", warehouse_id)
+    warehouse = query_projection(db, Warehouse, WarehouseTransactionsResponseSchema) \
+        .filter(Warehouse.id == warehouse_id).first()
 
     if not warehouse:
-        logger.error(f"Warehouse with ID {warehouse_id} does not exist.")
+        logger.error("Warehouse with ID %s does not exist.", warehouse_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Warehouse with ID {warehouse_id} does not exist"
         )
 
-    transactions = db.query(Transaction) \
-        .filter(Transaction.warehouse_id == warehouse.id) \
-        .options(joinedload(Transaction.transaction_products).joinedload(TransactionProduct.product)) \
-        .all()
-
-    logger.info(f"Found {len(transactions)} transactions for warehouse ID {warehouse_id}.")
-
-    transactions_list = []
-    for transaction in transactions:
-        products_list = []
-        for tp in transaction.transaction_products:
-            products_list.append({
-                "quantity": tp.quantity,
-                "product": {
-                    "id": tp.product.id,
-                    "name": tp.product.name,
-                    "quantity": tp.product.quantity,
-                    "serial_number": tp.product.serial_number,
-                    "price": tp.product.price,
-                    "description": tp.product.description,
-                    "category": tp.product.category,
-                    "image_url": tp.product.image_url,
-                    "kit_id": tp.product.kit_id,
-                    "warehouse_id": tp.product.warehouse_id,
-                }
-            })
-
-        transactions_list.append({
-            "id": transaction.id,
-            "identifier": transaction.identifier,
-            "date": transaction.date,
-            "type": transaction.type,
-            "warehouse_id": transaction.warehouse_id,
-            "client_id": transaction.client_id,
-            "products": products_list
-        })
+    # The lines are loaded with a separate IN query so the LIMIT applies to transactions, not joined rows
+    transactions_query = query_projection(db, Transaction, TransactionsBase) \
+        .filter(Transaction.warehouse_id == warehouse.id)
+    transactions_page = build_page(
+        keyset(transactions_query, Transaction.date, Transaction.id, page, descending=True).all(), page, "date")
+    transactions = transactions_page.data
+    lines = []
+    if transactions:
+        lines = db.execute(_transaction_lines_stmt([transaction.id for transaction in transactions])).all()
+
+    logger.info("Found %s transactions for warehouse ID %s.", len(transactions), warehouse_id)
+
+    return Page(data=_warehouse_transactions_data(warehouse, transactions, lines),
+                next_cursor=transactions_page.next_cursor)
+
+
+async def get_transactions_by_warehouse_id_async(warehouse_id: int, page: PageParams, db: AsyncSession):
+    logger.info("Fetching transactions for warehouse with ID %s.", warehouse_id)
+    result = await db.execute(
+        select_projection(Warehouse, WarehouseTransactionsResponseSchema).where(Warehouse.id == warehouse_id))
+    warehouse = result.first()
+
+    if not warehouse:
+        logger.error("Warehouse with ID %s does not exist.", warehouse_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Warehouse with ID {warehouse_id} does not exist"
+        )
+
+    result = await db.execute(keyset(
+        select_projection(Transaction, TransactionsBase).where(Transaction.warehouse_id == warehouse.id),
+        Transaction.date, Transaction.id, page, descending=True
+    ))
+    transactions_page = build_page(result.all(), page, "date")
+    transactions = transactions_page.data
+    lines = []
+    if transactions:
+        result = await db.execute(_transaction_lines_stmt([transaction.id for transaction in transactions]))
+        lines = result.all()
 
-    warehouse_data = {
-        "id": warehouse.id,
-        "name": warehouse.name,
-        "address": warehouse.address,
-        "phone": warehouse.phone,
-        "user_id": warehouse.user_id,
-        "transactions": transactions_list,
+    logger.info("Found %s transactions for warehouse ID %s.", len(transactions), warehouse_id)
+
+    return Page(data=_warehouse_transactions_data(warehouse, transactions, lines),
+                next_cursor=transactions_page.next_cursor)
+
+
+# Product columns of the export rows, labelled so they do not clash with the transaction columns
+EXPORT_PRODUCT_FIELDS = ("id", "name", "quantity", "serial_number", "price", "description", "category", "image_url",
+                         "kit_id", "warehouse_id")
+
+# Size of the chunks written to the response, small transactions are buffered until it is reached
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _export_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _export_transaction(rows):
+    rows = list(rows)
+    first = rows[0]
+    products_list = [
+        {
+            "quantity": row.line_quantity,
+            "product": {field: getattr(row, f"product_{field}") for field in EXPORT_PRODUCT_FIELDS},
+        }
+        for row in rows if row.product_id is not None
+    ]
+
+    return {
+        "id": first.id,
+        "identifier": first.identifier,
+        "date": first.date,
+        "type": first.type,
+        "warehouse_id": first.warehouse_id,
+        "client_id": first.client_id,
+        "products": products_list
     }
 
-    return warehouse_data
+
+def stream_transactions_by_warehouse_id(warehouse_id: int, export_format: str = "ndjson"):
+    # Walks the flat transaction/line rows with a server-side cursor, EXPORT_BATCH_SIZE rows per round trip, and
+    # writes every transaction as soon as its last line is read, so memory stays bounded by one batch.
+    # It opens its own session because the request session is closed before the response body is sent.
+    logger.info("Streaming transactions of warehouse with ID %s as %s.", warehouse_id, export_format)
+    stmt = (
+        select(
+            Transaction.id,
+            Transaction.identifier,
+            Transaction.date,
+            Transaction.type,
+            Transaction.warehouse_id,
+            Transaction.client_id,
+            TransactionProduct.quantity.label("line_quantity"),
+            *[getattr(Product, field).label(f"product_{field}") for field in EXPORT_PRODUCT_FIELDS],
+        )
+        .outerjoin(TransactionProduct, TransactionProduct.transaction_id == Transaction.id)
+        .outerjoin(Product, Product.id == TransactionProduct.product_id)
+        .where(Transaction.warehouse_id == warehouse_id)
+        .order_by(Transaction.date.desc(), Transaction.id.desc())
+        .execution_options(stream_results=True, yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+
+    separator = "\n" if export_format == "ndjson" else ","
+    buffer = [] if export_format == "ndjson" else ["["]
+    buffered = 0
+    count = 0
+
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt)
+        for _, rows in groupby(result, key=lambda row: row.id):
+            item = json.dumps(_export_transaction(rows), default=_export_default)
+            if export_format == "ndjson":
+                buffer.append(item + separator)
+            else:
+                buffer.append(item if count == 0 else separator + item)
+            buffered += len(item) + 1
+            count += 1
+
+            if buffered >= EXPORT_CHUNK_SIZE:
+                yield "".join(buffer)
+                buffer = []
+                buffered = 0
+
+        if export_format == "json":
+            buffer.append("]")
+        if buffer:
+            yield "".join(buffer)
+        logger.info("Streamed %s transactions of warehouse with ID %s.", count, warehouse_id)
+    finally:
+        db.close()
+
 
 def create_warehouse(warehouse, db: Session):
     logger.info("Creating a new warehouse.")
@@ -152,12 +321,13 @@ def create_warehouse(warehouse, db: Session):
         db.add(new_warehouse)
         db.commit()
         db.refresh(new_warehouse)
-        logger.info(f"Warehouse with ID {new_warehouse.id} created successfully.")
+        invalidate("user", new_warehouse.user_id)
+        logger.info("Warehouse with ID %s created successfully.", new_warehouse.id)
         return new_warehouse
 
     except Exception as e:
         db.rollback()
-        logger.error(f"Error creating warehouse: {str(e)}")
+        logger.error("Error creating warehouse: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error create warehouse: {str(e)}"
@@ -170,25 +340,28 @@ def create_warehouse(warehouse, db: Session):
         )
 
 def update_warehouse(warehouse_id: int, warehouse_update, db: Session):
-    logger.info(f"Updating warehouse with ID {warehouse_id}.")
+    logger.info("Updating warehouse with ID %s.", warehouse_id)
     warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id)
     warehouse_instance = warehouse.first()
 
     if not warehouse_instance:
-        logger.error(f"Warehouse with ID {warehouse_id} does not exist.")
+        logger.error("Warehouse with ID %s does not exist.", warehouse_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Warehouse with ID {warehouse_id} does not exist"
         )
 
     try:
+        old_user_id = warehouse_instance.user_id
         warehouse.update(warehouse_update.dict(exclude_unset=True))
         db.commit()
         db.refresh(warehouse_instance)
-        logger.info(f"Warehouse with ID {warehouse_id} updated successfully.")
+        invalidate("warehouse", warehouse_id)
+        invalidate("user", old_user_id, warehouse_instance.user_id)
+        logger.info("Warehouse with ID %s updated successfully.", warehouse_id)
     except Exception as e:
         db.rollback()
-        logger.error(f"Error updating warehouse: {str(e)}")
+        logger.error("Error updating warehouse: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating warehouse: {str(e)}"
@@ -197,22 +370,34 @@ def update_warehouse(warehouse_id: int, warehouse_update, db: Session):
     return warehouse_instance
 
 def delete_warehouse(warehouse_id: int, db: Session):
-    logger.info(f"Deleting warehouse with ID {warehouse_id}.")
+    logger.info("Deleting warehouse with ID %s.", warehouse_id)
     warehouse_exists = db.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
     if not warehouse_exists:
-        logger.error(f"Warehouse with ID {warehouse_id} does not exist.")
+        logger.error("Warehouse with ID %s does not exist.", warehouse_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Warehouse with ID {warehouse_id} does not exist"
         )
 
     try:
+        # The products go away with the warehouse (ON DELETE CASCADE), their cached reads too
+        user_id = warehouse_exists.user_id
+        product_ids = [product_id for (product_id,) in
+                       db.query(Product.id).filter(Product.warehouse_id == warehouse_id)]
+        alert_users = alert_repository.alert_user_ids(Product.warehouse_id == warehouse_id, db)
+        # So do its transactions, with their lines and the lines of its products in other warehouses
+        moved_products, moved_warehouses = movement_rollup_repository.remove_lines(
+            or_(Transaction.warehouse_id == warehouse_id, TransactionProduct.product_id.in_(product_ids)), db)
         db.query(Warehouse).filter(Warehouse.id == warehouse_id).delete(synchronize_session=False)
         db.commit()
-        logger.info(f"Warehouse with ID {warehouse_id} deleted successfully.")
+        invalidate("warehouse", warehouse_id, *moved_warehouses)
+        invalidate("user", user_id)
+        invalidate("product", *product_ids, *moved_products)
+        invalidate("alerts", *alert_users)
+        logger.info("Warehouse with ID %s deleted successfully.", warehouse_id)
     except Exception as e:
         db.rollback()
-        logger.error(f"Error deleting warehouse: {str(e)}")
+        logger.error("Error deleting warehouse: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting warehouse: {str(e)}"
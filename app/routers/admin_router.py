@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends, status
+
+from app.db.database import get_pool_stats, get_async_pool_stats
+from app.schemas.admin_schema import PoolStatsResponseSchema, CacheStatsResponseSchema, HashPoolStatsResponseSchema
+from app.schemas.token_schema import TokenData
+from app.utils.cache import cache_stats
+from app.utils.token import token_cache_stats
+from app.utils.error_response import get_error_response
+from app.utils.hashing import hash_pool
+from app.utils.logger import get_logger
+from app.utils.oauth import role_required
+
+logger = get_logger(__name__)
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"]
+)
+
+
+@router.get('/pool', response_model=PoolStatsResponseSchema, status_code=status.HTTP_200_OK,
+            description="This endpoint returns live statistics of the database connection pool.",
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error"), })
+def get_pool_statistics(current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching connection pool statistics.")
+    pool_stats = get_pool_stats()
+    logger.info("[ROUTER] Pool has %s connections checked out.", pool_stats['checked_out'])
+    return pool_stats
+
+
+@router.get('/pool/async', response_model=PoolStatsResponseSchema, status_code=status.HTTP_200_OK,
+            description="This endpoint returns live statistics of the async database connection pool.",
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error"), })
+def get_async_pool_statistics(current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching async connection pool statistics.")
+    pool_stats = get_async_pool_stats()
+    logger.info("[ROUTER] Async pool has %s connections checked out.", pool_stats['checked_out'])
+    return pool_stats
+
+
+@router.get('/cache', response_model=CacheStatsResponseSchema, status_code=status.HTTP_200_OK,
+            description="This endpoint returns the hit and miss counters of the read cache of this worker.",
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error"), })
+def get_cache_statistics(current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching read cache statistics.")
+    statistics = cache_stats()
+    logger.info("[ROUTER] Read cache backend is %s.", statistics['backend'])
+    return statistics
+
+
+@router.get('/cache/tokens', response_model=CacheStatsResponseSchema, status_code=status.HTTP_200_OK,
+            description="This endpoint returns the hit and miss counters of the verified token cache of this worker.",
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error"), })
+def get_token_cache_statistics(current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching verified token cache statistics.")
+    statistics = token_cache_stats()
+    logger.info("[ROUTER] Verified token cache holds %s tokens.", statistics['entries'])
+    return statistics
+
+
+@router.get('/hashing', response_model=HashPoolStatsResponseSchema, status_code=status.HTTP_200_OK,
+            description="This endpoint returns the queue statistics of the password hashing pool of this worker.",
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error"), })
+def get_hash_pool_statistics(current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching password hashing pool statistics.")
+    statistics = hash_pool.stats()
+    logger.info("[ROUTER] Password hashing pool has %s operations pending.", statistics['pending'])
+    return statistics
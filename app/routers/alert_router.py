@@ -1,15 +1,20 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
 from app.repository import alert_repository
 from app.schemas.alert_schema import UpdateAlertSchema, CreateAlertSchema, AlertResponseSchema
 from app.schemas.token_schema import TokenData
 from app.utils.error_response import get_error_response
-from app.utils.logger import logger
+from app.utils.logger import get_logger
 from app.utils.oauth import role_required
+from app.utils.pagination import PageParams, page_params, set_next_cursor
+from app.utils.serialization import rows_response
+
+logger = get_logger(__name__)
 
 router = APIRouter(
     prefix="/alert",
@@ -26,12 +31,15 @@ router = APIRouter(
                                                               "You do not have access to this resource."),
                 status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                           "Internal Server Error"), })
-def get_alerts(db: Session = Depends(get_db),
-               current_alert: TokenData = Depends(role_required(['Admin']))):
+async def get_alerts(response: Response, page: PageParams = Depends(page_params),
+                     db: AsyncSession = Depends(get_async_db),
+                     current_alert: TokenData = Depends(role_required(['Admin']))):
     logger.info("[ROUTER] Fetching all alerts.")
-    alerts_data = alert_repository.get_alerts(db)
-    logger.info(f"[ROUTER] Fetched {len(alerts_data)} alerts.")
-    return alerts_data
+    alerts_data_page = await alert_repository.get_alerts_async(page, db)
+    set_next_cursor(response, alerts_data_page.next_cursor)
+    alerts_data = alerts_data_page.data
+    logger.info("[ROUTER] Fetched %s alerts.", len(alerts_data))
+    return rows_response(alerts_data, AlertResponseSchema, response)
 
 
 @router.get('/{alert_id}', response_model=AlertResponseSchema, status_code=status.HTTP_200_OK, responses={
@@ -40,10 +48,10 @@ def get_alerts(db: Session = Depends(get_db),
     status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN", "You do not have access to this resource."),
     status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND", "Alert with ID {alert_id} does not exist"),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
-def get_alert_by_id(alert_id: int, db: Session = Depends(get_db)):
-    logger.info(f"[ROUTER] Fetching alert with ID {alert_id}.")
-    alert = alert_repository.get_alert_by_id(alert_id, db)
-    logger.info(f"[ROUTER] Found alert: {alert} with ID {alert_id}.")
+async def get_alert_by_id(alert_id: int, db: AsyncSession = Depends(get_async_db)):
+    logger.info("[ROUTER] Fetching alert with ID %s.", alert_id)
+    alert = await alert_repository.get_alert_by_id_async(alert_id, db)
+    logger.info("[ROUTER] Found alert with ID %s.", alert_id)
     return alert
 
 
@@ -57,7 +65,7 @@ def get_alert_by_id(alert_id: int, db: Session = Depends(get_db)):
 def create_alert(alert: CreateAlertSchema, db: Session = Depends(get_db)):
     logger.info("[ROUTER] Creating new alert.")
     created_alert = alert_repository.create_alert(alert, db)
-    logger.info(f"[ROUTER] Alert created: {created_alert}")
+    logger.info("[ROUTER] Alert created with ID %s.", created_alert.id)
     return created_alert
 
 
@@ -70,9 +78,9 @@ def create_alert(alert: CreateAlertSchema, db: Session = Depends(get_db)):
     status.HTTP_422_UNPROCESSABLE_ENTITY: get_error_response("ERROR: UNPROCESSABLE ENTITY", "Expecting value"),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def update_alert(alert_id: int, alert: UpdateAlertSchema, db: Session = Depends(get_db)):
-    logger.info(f"[ROUTER] Updating alert with ID {alert_id}.")
+    logger.info("[ROUTER] Updating alert with ID %s.", alert_id)
     edited_alert = alert_repository.update_alert(alert_id, alert, db)
-    logger.info(f"[ROUTER] Alert with ID {alert_id} updated: {edited_alert}.")
+    logger.info("[ROUTER] Alert with ID %s updated.", alert_id)
     return edited_alert
 
 
@@ -85,7 +93,7 @@ def update_alert(alert_id: int, alert: UpdateAlertSchema, db: Session = Depends(
     status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND", "Alert with ID {alert_id} does not exist"),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def delete_alert(alert_id: int, db: Session = Depends(get_db)):
-    logger.info(f"[ROUTER] Deleting alert with ID {alert_id}.")
+    logger.info("[ROUTER] Deleting alert with ID %s.", alert_id)
     alert_repository.delete_alert(alert_id, db)
-    logger.info(f"[ROUTER] Alert with ID {alert_id} deleted.")
+    logger.info("[ROUTER] Alert with ID %s deleted.", alert_id)
     return None
@@ -1,6 +1,6 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Response, status
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
@@ -9,8 +9,12 @@ from app.schemas.client_schema import UpdateClientSchema, CreateClientSchema, Cl
     ClientTransactionsResponseSchema
 from app.schemas.token_schema import TokenData
 from app.utils.error_response import get_error_response
-from app.utils.logger import logger
+from app.utils.logger import get_logger
 from app.utils.oauth import role_required
+from app.utils.pagination import PageParams, page_params, set_next_cursor
+from app.utils.serialization import rows_response
+
+logger = get_logger(__name__)
 
 router = APIRouter(
     prefix="/client",
@@ -27,12 +31,15 @@ router = APIRouter(
                                                               "You do not have access to this resource."),
                 status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                           "Internal Server Error"), })
-def get_clients(db: Session = Depends(get_db),
+def get_clients(response: Response, page: PageParams = Depends(page_params),
+                db: Session = Depends(get_db),
                 current_client: TokenData = Depends(role_required(['Admin']))):
     logger.info("[ROUTER] Fetching all clients.")
-    client_data = client_repository.get_clients(db)
-    logger.info(f"[ROUTER] Fetched {len(client_data)} clients.")
-    return client_data
+    client_data_page = client_repository.get_clients(page, db)
+    set_next_cursor(response, client_data_page.next_cursor)
+    client_data = client_data_page.data
+    logger.info("[ROUTER] Fetched %s clients.", len(client_data))
+    return rows_response(client_data, ClientResponseSchema, response)
 
 
 @router.get('/{client_id}', response_model=ClientResponseSchema, status_code=status.HTTP_200_OK, responses={
@@ -43,9 +50,9 @@ def get_clients(db: Session = Depends(get_db),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def get_client_by_id(client_id: int, db: Session = Depends(get_db),
                      current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching client with ID {client_id}.")
+    logger.info("[ROUTER] Fetching client with ID %s.", client_id)
     client = client_repository.get_client_by_id(client_id, db)
-    logger.info(f"[ROUTER] Found client: {client} with ID {client_id}.")
+    logger.info("[ROUTER] Found client with ID %s.", client_id)
     return client
 
 
@@ -57,11 +64,14 @@ def get_client_by_id(client_id: int, db: Session = Depends(get_db),
         status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND", "Client with ID {client_id} does not exist"),
         status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                   "Internal Server Error")})
-def get_transactions_by_client_id(client_id: int, db: Session = Depends(get_db),
+def get_transactions_by_client_id(client_id: int, response: Response, page: PageParams = Depends(page_params),
+                                  db: Session = Depends(get_db),
                                   current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching transactions for client ID {client_id}.")
-    transactions_client = client_repository.get_transactions_by_client_id(client_id, db)
-    logger.info(f"[ROUTER] Found {len(transactions_client)} transactions for client ID {client_id}.")
+    logger.info("[ROUTER] Fetching transactions for client ID %s.", client_id)
+    transactions_client_page = client_repository.get_transactions_by_client_id(client_id, page, db)
+    set_next_cursor(response, transactions_client_page.next_cursor)
+    transactions_client = transactions_client_page.data
+    logger.info("[ROUTER] Found %s transactions for client ID %s.", len(transactions_client), client_id)
     return transactions_client
 
 
@@ -75,7 +85,7 @@ def create_client(client: CreateClientSchema, db: Session = Depends(get_db),
                   current_user: TokenData = Depends(role_required(['Admin']))):
     logger.info("[ROUTER] Creating new client.")
     created_client = client_repository.create_client(client, db)
-    logger.info(f"[ROUTER] Client created: {created_client}")
+    logger.info("[ROUTER] Client created with ID %s.", created_client.id)
     return created_client
 
 
@@ -88,9 +98,9 @@ def create_client(client: CreateClientSchema, db: Session = Depends(get_db),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def update_client(client_id: int, client: UpdateClientSchema, db: Session = Depends(get_db),
                   current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Updating client with ID {client_id}.")
+    logger.info("[ROUTER] Updating client with ID %s.", client_id)
     edited_client = client_repository.update_client(client_id, client, db)
-    logger.info(f"[ROUTER] Client with ID {client_id} updated: {edited_client}.")
+    logger.info("[ROUTER] Client with ID %s updated.", client_id)
     return edited_client
 
 
@@ -102,7 +112,7 @@ def update_client(client_id: int, client: UpdateClientSchema, db: Session = Depe
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def delete_client(client_id: int, db: Session = Depends(get_db),
                   current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Deleting client with ID {client_id}.")
+    logger.info("[ROUTER] Deleting client with ID %s.", client_id)
     client_repository.delete_client(client_id, db)
-    logger.info(f"[ROUTER] Client with ID {client_id} deleted.")
+    logger.info("[ROUTER] Client with ID %s deleted.", client_id)
     return None
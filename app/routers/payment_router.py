@@ -3,13 +3,16 @@ import os
 from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 
 from app.db.database import get_db
 from app.repository import payment_repository
 from app.repository.payment_repository import process_webhook_event
 from app.schemas.payment_schema import CheckoutSessionResponse
 from app.utils.error_response import get_error_response
-from app.utils.logger import logger
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 webhook_key = os.getenv('STRIPE_SECRET_WEBHOOK_KEY')
 
@@ -28,10 +31,10 @@ router = APIRouter(
                                                                "You do not have access to this resource."),
                  status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                            "Internal Server Error"), })
-async def create_checkout_session(user_id: int, db: Session = Depends(get_db)):
-    logger.info(f"[ROUTER] Start create checkout session")
+def create_checkout_session(user_id: int, db: Session = Depends(get_db)):
+    logger.info("[ROUTER] Start create checkout session")
     session = payment_repository.create_checkout_session(user_id, db)
-    logger.info(f"[ROUTER] Create checkout session end.")
+    logger.info("[ROUTER] Create checkout session end.")
     return session
 
 
@@ -46,9 +49,10 @@ async def create_checkout_session(user_id: int, db: Session = Depends(get_db)):
                                                                            "Internal Server Error"),
              })
 async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
-    logger.info(f"[ROUTER] Start get stripe webhook")
+    logger.info("[ROUTER] Start get stripe webhook")
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
-    process_webhook_event(payload, sig_header, webhook_key, db)
-    logger.info(f"[ROUTER] Stripe webhook end.")
+    # Stripe and database calls are blocking, keep them off the event loop
+    await run_in_threadpool(process_webhook_event, payload, sig_header, webhook_key, db)
+    logger.info("[ROUTER] Stripe webhook end.")
     return None
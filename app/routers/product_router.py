@@ -1,16 +1,25 @@
-from typing import List
+from datetime import date
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
-from app.repository import product_repository
+from app.db.database import get_db, get_async_db
+from app.repository import kit_repository, movement_rollup_repository, product_repository, stock_movement_repository
 from app.schemas.product_schema import UpdateProductSchema, CreateProductSchema, ProductResponseSchema, \
-    ProductProductsResponseSchema, ProductTransactionsResponseSchema, ProductAlertsResponseSchema
+    ProductProductsResponseSchema, ProductTransactionsResponseSchema, ProductAlertsResponseSchema, \
+    BulkProductResponseSchema, ProductLedgerResponseSchema, ProductSearchResponseSchema, \
+    ProductMovementsResponseSchema, ProductBomResponseSchema, ProductBuildableResponseSchema
 from app.schemas.token_schema import TokenData
+from app.utils.conditional import entity_tag_async, not_modified, set_etag
 from app.utils.error_response import get_error_response
-from app.utils.logger import logger
+from app.utils.logger import get_logger
 from app.utils.oauth import role_required
+from app.utils.pagination import PageParams, page_params, set_next_cursor
+from app.utils.serialization import rows_response
+
+logger = get_logger(__name__)
 
 router = APIRouter(
     prefix="/product",
@@ -27,25 +36,63 @@ router = APIRouter(
                                                               "You do not have access to this resource."),
                 status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                           "Internal Server Error"), })
-def get_products(db: Session = Depends(get_db),
-                 current_user: TokenData = Depends(role_required(['Admin']))):
+async def get_products(response: Response, page: PageParams = Depends(page_params),
+                       db: AsyncSession = Depends(get_async_db),
+                       current_user: TokenData = Depends(role_required(['Admin']))):
     logger.info("[ROUTER] Fetching all products.")
-    product_data = product_repository.get_products(db)
-    logger.info(f"[ROUTER] Fetched {len(product_data)} products.")
-    return product_data
+    product_data_page = await product_repository.get_products_async(page, db)
+    set_next_cursor(response, product_data_page.next_cursor)
+    product_data = product_data_page.data
+    logger.info("[ROUTER] Fetched %s products.", len(product_data))
+    return rows_response(product_data, ProductResponseSchema, response)
 
 
-@router.get('/{product_id}', response_model=ProductResponseSchema, status_code=status.HTTP_200_OK, responses={
+@router.get('/search', response_model=List[ProductSearchResponseSchema], status_code=status.HTTP_200_OK,
+            description="Best matches of the query in the name, serial number, category and description of the "
+                        "products of a warehouse or of every warehouse of a user. Substrings and misspellings match, "
+                        "the best score comes first.",
+            responses={
+                status.HTTP_400_BAD_REQUEST: get_error_response("ERROR: BAD REQUEST",
+                                                                "Search in a warehouse (warehouse_id) or in the "
+                                                                "warehouses of a user (user_id)"),
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
+                                                              "Warehouse with ID {warehouse_id} does not exist"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error")})
+async def search_products(q: str = Query(..., min_length=1, max_length=100, description="Text to search for"),
+                          warehouse_id: Optional[int] = Query(None), user_id: Optional[int] = Query(None),
+                          limit: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(get_async_db),
+                          current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Searching products matching %r.", q)
+    products = await product_repository.search_products_async(q, warehouse_id, user_id, limit, db)
+    logger.info("[ROUTER] Found %s products matching %r.", len(products), q)
+    return rows_response(products, ProductSearchResponseSchema)
+
+
+@router.get('/{product_id}', response_model=ProductResponseSchema, status_code=status.HTTP_200_OK,
+            description="Answers 304 without a body when If-None-Match holds the current ETag.", responses={
+    status.HTTP_304_NOT_MODIFIED: {"description": "NOT_MODIFIED"},
     status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
                                                      "Not authenticated or invalid role provided"),
     status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN", "You do not have access to this resource."),
     status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND", "Product with ID {product_id} does not exist"),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
-def get_product_by_id(product_id: int, db: Session = Depends(get_db),
-                      current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching product with ID {product_id}.")
-    product = product_repository.get_product_by_id(product_id, db)
-    logger.info(f"[ROUTER] Found product: {product} with ID {product_id}.")
+async def get_product_by_id(product_id: int, request: Request, response: Response,
+                            db: AsyncSession = Depends(get_async_db),
+                            current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching product with ID %s.", product_id)
+    tag = await entity_tag_async(request, ("product", product_id))
+    unchanged = not_modified(request, tag)
+    if unchanged:
+        logger.info("[ROUTER] Product with ID %s not modified.", product_id)
+        return unchanged
+    product = await product_repository.get_product_by_id_async(product_id, db)
+    set_etag(response, tag)
+    logger.info("[ROUTER] Found product with ID %s.", product_id)
     return product
 
 
@@ -61,12 +108,52 @@ def get_product_by_id(product_id: int, db: Session = Depends(get_db),
                                                                           "Internal Server Error")})
 def get_products_by_product_id(product_id: int, db: Session = Depends(get_db),
                                current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching products for client ID {product_id}.")
+    logger.info("[ROUTER] Fetching products for client ID %s.", product_id)
     products_product = product_repository.get_products_by_product_id(product_id, db)
-    logger.info(f"[ROUTER] Found {len(products_product)} products for client ID {product_id}.")
+    logger.info("[ROUTER] Found %s products for client ID %s.", len(products_product), product_id)
     return products_product
 
 
+@router.get('/bom/{product_id}', response_model=ProductBomResponseSchema, status_code=status.HTTP_200_OK,
+            description="Every component of the kit at any depth, each one right after the kit it belongs to, and "
+                        "how many kits (and sub-kits) the current stock can assemble with one unit of each component.",
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
+                                                              "Product with ID {product_id} does not exist"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error")})
+def get_bom_by_product_id(product_id: int, db: Session = Depends(get_db),
+                          current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching bill of materials for product ID %s.", product_id)
+    bom_product = kit_repository.get_bom_by_product_id(product_id, db)
+    logger.info("[ROUTER] Found %s components for product ID %s.", len(bom_product['components']), product_id)
+    return bom_product
+
+
+@router.get('/buildable/{product_id}', response_model=ProductBuildableResponseSchema, status_code=status.HTTP_200_OK,
+            description="How many kits the current stock can assemble with one unit of each component, sub-kits "
+                        "in stock or assembled from their own components included.",
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
+                                                              "Product with ID {product_id} does not exist"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error")})
+def get_buildable_by_product_id(product_id: int, db: Session = Depends(get_db),
+                                current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Computing buildable kits for product ID %s.", product_id)
+    buildable_product = kit_repository.get_buildable_by_product_id(product_id, db)
+    logger.info("[ROUTER] %s kits buildable for product ID %s.", buildable_product['buildable'], product_id)
+    return buildable_product
+
+
 @router.get('/transactions/{product_id}', response_model=ProductTransactionsResponseSchema,
             status_code=status.HTTP_200_OK, responses={
         status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
@@ -76,14 +163,66 @@ def get_products_by_product_id(product_id: int, db: Session = Depends(get_db),
                                                       "Product with ID {product_id} does not exist"),
         status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                   "Internal Server Error")})
-def get_transactions_by_product_id(product_id: int, db: Session = Depends(get_db),
+def get_transactions_by_product_id(product_id: int, response: Response, page: PageParams = Depends(page_params),
+                                   db: Session = Depends(get_db),
                                    current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching transactions for product ID {product_id}.")
-    transactions_product = product_repository.get_transactions_by_product_id(product_id, db)
-    logger.info(f"[ROUTER] Found {len(transactions_product)} transactions for product ID {product_id}.")
+    logger.info("[ROUTER] Fetching transactions for product ID %s.", product_id)
+    transactions_product_page = product_repository.get_transactions_by_product_id(product_id, page, db)
+    set_next_cursor(response, transactions_product_page.next_cursor)
+    transactions_product = transactions_product_page.data
+    logger.info("[ROUTER] Found %s transactions for product ID %s.", len(transactions_product), product_id)
     return transactions_product
 
 
+@router.get('/ledger/{product_id}', response_model=ProductLedgerResponseSchema, status_code=status.HTTP_200_OK,
+            description="Stock movements of the product, newest first. The quantity is the sum of all of them.",
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
+                                                              "Product with ID {product_id} does not exist"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error")})
+def get_ledger_by_product_id(product_id: int, response: Response, page: PageParams = Depends(page_params),
+                             db: Session = Depends(get_db),
+                             current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching stock ledger for product ID %s.", product_id)
+    ledger_product_page = stock_movement_repository.get_movements_by_product_id(product_id, page, db)
+    set_next_cursor(response, ledger_product_page.next_cursor)
+    ledger_product = ledger_product_page.data
+    logger.info("[ROUTER] Found %s stock movements for product ID %s.", len(ledger_product['movements']), product_id)
+    return ledger_product
+
+
+@router.get('/movements/{product_id}', response_model=ProductMovementsResponseSchema,
+            status_code=status.HTTP_200_OK,
+            description="Units in and out of the product per day, week (from Monday) or month in the range, both "
+                        "days included. The last 30 days by default, the periods without movements are zero.",
+            responses={
+                status.HTTP_400_BAD_REQUEST: get_error_response("ERROR: BAD REQUEST",
+                                                                "date_from must not be after date_to"),
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
+                                                              "Product with ID {product_id} does not exist"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error")})
+def get_movements_by_product_id(product_id: int, date_from: Optional[date] = Query(None),
+                                date_to: Optional[date] = Query(None),
+                                granularity: Literal['day', 'week', 'month'] = Query('day'),
+                                db: Session = Depends(get_db),
+                                current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching %s movements for product ID %s.", granularity, product_id)
+    movements_product = movement_rollup_repository.get_movements_by_product_id(product_id, date_from, date_to,
+                                                                                granularity, db)
+    logger.info("[ROUTER] Found %s periods for product ID %s.", len(movements_product['buckets']), product_id)
+    return movements_product
+
+
 @router.get('/alerts/{product_id}', response_model=ProductAlertsResponseSchema, status_code=status.HTTP_200_OK,
             responses={
                 status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
@@ -96,9 +235,9 @@ def get_transactions_by_product_id(product_id: int, db: Session = Depends(get_db
                                                                           "Internal Server Error")})
 def get_alerts_by_product_id(product_id: int, db: Session = Depends(get_db),
                              current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching alerts for product ID {product_id}.")
+    logger.info("[ROUTER] Fetching alerts for product ID %s.", product_id)
     alerts_product = product_repository.get_alerts_by_product_id(product_id, db)
-    logger.info(f"[ROUTER] Found {len(alerts_product)} alerts for product ID {product_id}.")
+    logger.info("[ROUTER] Found %s alerts for product ID %s.", len(alerts_product), product_id)
     return alerts_product
 
 
@@ -112,11 +251,34 @@ def create_product(product: CreateProductSchema, db: Session = Depends(get_db),
                    current_user: TokenData = Depends(role_required(['Admin']))):
     logger.info("[ROUTER] Creating new product.")
     created_product = product_repository.create_product(product, db)
-    logger.info(f"[ROUTER] Products created: {created_product}")
+    logger.info("[ROUTER] Product created with ID %s.", created_product.id)
     return created_product
 
 
+@router.post('/bulk', response_model=BulkProductResponseSchema, status_code=status.HTTP_201_CREATED,
+             description="Creates many products in one request. Every row gets its own result, "
+                         "rows with a duplicated serial number or an unknown warehouse are rejected.",
+             responses={
+                 status.HTTP_400_BAD_REQUEST: get_error_response("ERROR: BAD REQUEST", "No products provided"),
+                 status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED", "Not authenticated"),
+                 status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                               "You do not have access to this resource."),
+                 status.HTTP_422_UNPROCESSABLE_ENTITY: get_error_response("ERROR: UNPROCESSABLE ENTITY",
+                                                                          "Expecting value"),
+                 status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                           "Internal Server Error")})
+def create_products_bulk(products: List[CreateProductSchema], db: Session = Depends(get_db),
+                         current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Bulk creating %s products.", len(products))
+    bulk_result = product_repository.create_products_bulk(products, db)
+    logger.info("[ROUTER] Bulk created %s products, %s rejected.", bulk_result['created'], bulk_result['failed'])
+    return bulk_result
+
+
 @router.put('/{product_id}', response_model=ProductResponseSchema, status_code=status.HTTP_200_OK, responses={
+    status.HTTP_400_BAD_REQUEST: get_error_response("ERROR: BAD REQUEST",
+                                                    "A product cannot be a component of itself or of its own "
+                                                    "components"),
     status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED", "Not authenticated"),
     status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN", "You do not have access to this resource."),
     status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND", "Product with ID {product_id} does not exist"),
@@ -125,9 +287,9 @@ def create_product(product: CreateProductSchema, db: Session = Depends(get_db),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def update_product(product_id: int, product: UpdateProductSchema, db: Session = Depends(get_db),
                    current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Updating product with ID {product_id}.")
+    logger.info("[ROUTER] Updating product with ID %s.", product_id)
     edited_product = product_repository.update_product(product_id, product, db)
-    logger.info(f"[ROUTER] Product with ID {product_id} updated: {edited_product}.")
+    logger.info("[ROUTER] Product with ID %s updated.", product_id)
     return edited_product
 
 
@@ -140,7 +302,7 @@ def update_product(product_id: int, product: UpdateProductSchema, db: Session =
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def delete_product(product_id: int, db: Session = Depends(get_db),
                    current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Deleting product with ID {product_id}.")
+    logger.info("[ROUTER] Deleting product with ID %s.", product_id)
     product_repository.delete_product(product_id, db)
-    logger.info(f"[ROUTER] Product with ID {product_id} deleted.")
+    logger.info("[ROUTER] Product with ID %s deleted.", product_id)
     return None
@@ -1,16 +1,21 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
 from app.repository import transaction_repository
 from app.schemas.token_schema import TokenData
 from app.schemas.transaction_schema import CreateTransactionSchema, TransactionResponseSchema, \
     TransactionProductsResponseSchema
 from app.utils.error_response import get_error_response
-from app.utils.logger import logger
+from app.utils.logger import get_logger
 from app.utils.oauth import role_required
+from app.utils.pagination import PageParams, page_params, set_next_cursor
+from app.utils.serialization import rows_response
+
+logger = get_logger(__name__)
 
 router = APIRouter(
     prefix="/transaction",
@@ -26,10 +31,13 @@ router = APIRouter(
                                                               "You do not have access to this resource."),
                 status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                           "Internal Server Error"), })
-def get_transactions(db: Session = Depends(get_db),
-                     current_transaction: TokenData = Depends(role_required(['Admin']))):
-    transaction_data = transaction_repository.get_transactions(db)
-    return transaction_data
+async def get_transactions(response: Response, page: PageParams = Depends(page_params),
+                           db: AsyncSession = Depends(get_async_db),
+                           current_transaction: TokenData = Depends(role_required(['Admin']))):
+    transaction_data_page = await transaction_repository.get_transactions_async(page, db)
+    set_next_cursor(response, transaction_data_page.next_cursor)
+    transaction_data = transaction_data_page.data
+    return rows_response(transaction_data, TransactionResponseSchema, response)
 
 
 @router.post('/', response_model=TransactionProductsResponseSchema, status_code=status.HTTP_201_CREATED, responses={
@@ -42,7 +50,7 @@ def create_transaction(transaction: CreateTransactionSchema, db: Session = Depen
                        current_user: TokenData = Depends(role_required(['Admin']))):
     logger.info("[ROUTER] Fetching all transactions.")
     created_transaction = transaction_repository.create_transaction(transaction, db)
-    logger.info(f"[ROUTER] Fetched {len(created_transaction)} transactions.")
+    logger.info("[ROUTER] Fetched %s transactions.", len(created_transaction))
     return created_transaction
 
 
@@ -53,11 +61,11 @@ def create_transaction(transaction: CreateTransactionSchema, db: Session = Depen
     status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
                                                   "Transaction with ID {transaction_id} does not exist"),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
-def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_db),
-                          current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching transactions with ID {transaction_id}.")
-    transaction = transaction_repository.get_transaction_by_id(transaction_id, db)
-    logger.info(f"[ROUTER] Found transactions: {transaction} with ID {transaction_id}.")
+async def get_transaction_by_id(transaction_id: int, db: AsyncSession = Depends(get_async_db),
+                                current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching transactions with ID %s.", transaction_id)
+    transaction = await transaction_repository.get_transaction_by_id_async(transaction_id, db)
+    logger.info("[ROUTER] Found transaction with ID %s.", transaction_id)
     return transaction
 
 
@@ -70,11 +78,11 @@ def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_db),
                                                       "Transaction with ID {transaction_id} does not exist"),
         status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                   "Internal Server Error")})
-def get_products_by_transaction_id(transaction_id: int, db: Session = Depends(get_db),
-                                   current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching products for transaction ID {transaction_id}.")
-    products_transaction = transaction_repository.get_products_by_transaction_id(transaction_id, db)
-    logger.info(f"[ROUTER] Found {len(products_transaction)} transactions for transaction ID {transaction_id}.")
+async def get_products_by_transaction_id(transaction_id: int, db: AsyncSession = Depends(get_async_db),
+                                         current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching products for transaction ID %s.", transaction_id)
+    products_transaction = await transaction_repository.get_products_by_transaction_id_async(transaction_id, db)
+    logger.info("[ROUTER] Found %s transactions for transaction ID %s.", len(products_transaction), transaction_id)
     return products_transaction
 
 
@@ -89,7 +97,7 @@ def get_products_by_transaction_id(transaction_id: int, db: Session = Depends(ge
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def delete_transaction(transaction_id: int, db: Session = Depends(get_db),
                        current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Deleting transaction with ID {transaction_id}.")
+    logger.info("[ROUTER] Deleting transaction with ID %s.", transaction_id)
     transaction_repository.delete_transaction(transaction_id, db)
-    logger.info(f"[ROUTER] Transaction with ID {transaction_id} deleted.")
+    logger.info("[ROUTER] Transaction with ID %s deleted.", transaction_id)
     return None
@@ -1,16 +1,22 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
 from app.repository import user_repository
 from app.schemas.token_schema import TokenData
 from app.schemas.user_schema import UpdateUserSchema, CreateUserSchema, UserResponseSchema, UserEmployeesResponseSchema, \
     UserWarehousesResponseSchema, UserAlertsResponseSchema, UserClientsResponseSchema
+from app.utils.conditional import entity_tag, not_modified, set_etag
 from app.utils.error_response import get_error_response
-from app.utils.logger import logger
+from app.utils.logger import get_logger
 from app.utils.oauth import role_required
+from app.utils.pagination import PageParams, page_params, set_next_cursor
+from app.utils.serialization import rows_response
+
+logger = get_logger(__name__)
 
 router = APIRouter(
     prefix="/user",
@@ -27,12 +33,15 @@ router = APIRouter(
                                                               "You do not have access to this resource."),
                 status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                           "Internal Server Error"), })
-def get_users(db: Session = Depends(get_db),
+def get_users(response: Response, page: PageParams = Depends(page_params),
+              db: Session = Depends(get_db),
               current_user: TokenData = Depends(role_required(['Admin']))):
     logger.info("[ROUTER] Fetching all users.")
-    users_data = user_repository.get_users(db)
-    logger.info(f"[ROUTER] Fetched {len(users_data)} users.")
-    return users_data
+    users_data_page = user_repository.get_users(page, db)
+    set_next_cursor(response, users_data_page.next_cursor)
+    users_data = users_data_page.data
+    logger.info("[ROUTER] Fetched %s users.", len(users_data))
+    return rows_response(users_data, UserResponseSchema, response)
 
 
 @router.get('/{user_id}', response_model=UserResponseSchema, status_code=status.HTTP_200_OK, responses={
@@ -43,9 +52,9 @@ def get_users(db: Session = Depends(get_db),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def get_user_by_id(user_id: int, db: Session = Depends(get_db),
                    current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching user with ID {user_id}.")
+    logger.info("[ROUTER] Fetching user with ID %s.", user_id)
     user = user_repository.get_user_by_id(user_id, db)
-    logger.info(f"[ROUTER] Found user: {user} with ID {user_id}.")
+    logger.info("[ROUTER] Found user with ID %s.", user_id)
     return user
 
 
@@ -57,9 +66,9 @@ def get_user_by_id(user_id: int, db: Session = Depends(get_db),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def get_users_by_user_id(user_id: int, db: Session = Depends(get_db),
                          current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching users for user ID {user_id}.")
+    logger.info("[ROUTER] Fetching users for user ID %s.", user_id)
     users_user = user_repository.get_users_by_user_id(user_id, db)
-    logger.info(f"[ROUTER] Found {len(users_user)} users for user ID {user_id}.")
+    logger.info("[ROUTER] Found %s users for user ID %s.", len(users_user), user_id)
     return users_user
 
 
@@ -75,9 +84,9 @@ def get_users_by_user_id(user_id: int, db: Session = Depends(get_db),
                                                                           "Internal Server Error")})
 def get_warehouses_by_user_id(user_id: int, db: Session = Depends(get_db),
                               current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching warehouses for user ID {user_id}.")
+    logger.info("[ROUTER] Fetching warehouses for user ID %s.", user_id)
     warehouses_user = user_repository.get_warehouses_by_user_id(user_id, db)
-    logger.info(f"[ROUTER] Found {len(warehouses_user)} warehouses for user ID {user_id}.")
+    logger.info("[ROUTER] Found %s warehouses for user ID %s.", len(warehouses_user), user_id)
     return warehouses_user
 
 
@@ -93,22 +102,32 @@ def get_warehouses_by_user_id(user_id: int, db: Session = Depends(get_db),
                                                                           "Internal Server Error")})
 def get_clients_by_user_id(user_id: int, db: Session = Depends(get_db),
                            current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching clients for user ID {user_id}.")
+    logger.info("[ROUTER] Fetching clients for user ID %s.", user_id)
     clients_user = user_repository.get_clients_by_user_id(user_id, db)
-    logger.info(f"[ROUTER] Found {len(clients_user)} clients for user ID {user_id}.")
+    logger.info("[ROUTER] Found %s clients for user ID %s.", len(clients_user), user_id)
     return clients_user
 
 
-@router.get('/alerts/{user_id}', response_model=UserAlertsResponseSchema, status_code=status.HTTP_200_OK, responses={
+@router.get('/alerts/{user_id}', response_model=UserAlertsResponseSchema, status_code=status.HTTP_200_OK,
+            description="Answers 304 without a body when If-None-Match holds the current ETag.", responses={
+    status.HTTP_304_NOT_MODIFIED: {"description": "NOT_MODIFIED"},
     status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
                                                      "Not authenticated or invalid role provided"),
     status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN", "You do not have access to this resource."),
     status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND", "User with ID {user_id} does not exist"),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
-def get_alerts_by_user_id(user_id: int, db: Session = Depends(get_db),current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching alerts for user ID {user_id}.")
+def get_alerts_by_user_id(user_id: int, request: Request, response: Response, db: Session = Depends(get_db),
+                          current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching alerts for user ID %s.", user_id)
+    # The user fields and the alerts have their own scopes
+    tag = entity_tag(request, ("user", user_id), ("alerts", user_id))
+    unchanged = not_modified(request, tag)
+    if unchanged:
+        logger.info("[ROUTER] Alerts of user ID %s not modified.", user_id)
+        return unchanged
     alerts_user = user_repository.get_alerts_by_user_id(user_id, db)
-    logger.info(f"[ROUTER] Found {len(alerts_user)} alerts for user ID {user_id}.")
+    set_etag(response, tag)
+    logger.info("[ROUTER] Found %s alerts for user ID %s.", len(alerts_user), user_id)
     return alerts_user
 
 
@@ -118,11 +137,13 @@ def get_alerts_by_user_id(user_id: int, db: Session = Depends(get_db),current_us
     status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN", "You do not have access to this resource."),
     status.HTTP_409_CONFLICT: get_error_response("ERROR: CONFLICT", "Create user error {e}"),
     status.HTTP_422_UNPROCESSABLE_ENTITY: get_error_response("ERROR: UNPROCESSABLE ENTITY", "Expecting value"),
-    status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
-def create_user(user: CreateUserSchema, db: Session = Depends(get_db),):
+    status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error"),
+    status.HTTP_503_SERVICE_UNAVAILABLE: get_error_response(
+        "ERROR: SERVICE UNAVAILABLE", "Too many password operations in progress, try again later")})
+async def create_user(user: CreateUserSchema, db: AsyncSession = Depends(get_async_db),):
     logger.info("[ROUTER] Creating new user.")
-    created_user = user_repository.create_user(user, db)
-    logger.info(f"[ROUTER] User created: {created_user}")
+    created_user = await user_repository.create_user_async(user, db)
+    logger.info("[ROUTER] User created with ID %s.", created_user.id)
     return created_user
 
 
@@ -133,12 +154,14 @@ def create_user(user: CreateUserSchema, db: Session = Depends(get_db),):
     status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND", "User with ID {user_id} does not exist"),
     status.HTTP_409_CONFLICT: get_error_response("ERROR: CONFLICT", "Update user error {e}"),
     status.HTTP_422_UNPROCESSABLE_ENTITY: get_error_response("ERROR: UNPROCESSABLE ENTITY", "Expecting value"),
-    status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
-def update_user(user_id: int, user: UpdateUserSchema, db: Session = Depends(get_db),
-                current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Updating user with ID {user_id}.")
-    edited_user = user_repository.update_user(user_id, user, db)
-    logger.info(f"[ROUTER] User with ID {user_id} updated: {edited_user}.")
+    status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error"),
+    status.HTTP_503_SERVICE_UNAVAILABLE: get_error_response(
+        "ERROR: SERVICE UNAVAILABLE", "Too many password operations in progress, try again later")})
+async def update_user(user_id: int, user: UpdateUserSchema, db: AsyncSession = Depends(get_async_db),
+                      current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Updating user with ID %s.", user_id)
+    edited_user = await user_repository.update_user_async(user_id, user, db)
+    logger.info("[ROUTER] User with ID %s updated.", user_id)
     return edited_user
 
 
@@ -152,7 +175,7 @@ def update_user(user_id: int, user: UpdateUserSchema, db: Session = Depends(get_
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def delete_user(user_id: int, db: Session = Depends(get_db),
                 current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Deleting user with ID {user_id}.")
+    logger.info("[ROUTER] Deleting user with ID %s.", user_id)
     user_repository.delete_user(user_id, db)
-    logger.info(f"[ROUTER] User with ID {user_id} deleted.")
+    logger.info("[ROUTER] User with ID %s deleted.", user_id)
     return None
@@ -1,16 +1,24 @@
-from typing import List
+from datetime import date
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
-from app.repository import warehouse_repository
+from app.db.database import get_db, get_async_db
+from app.repository import inventory_summary_repository, movement_rollup_repository, warehouse_repository
 from app.schemas.token_schema import TokenData
 from app.schemas.warehouse_schema import UpdateWarehouseSchema, CreateWarehouseSchema, WarehouseResponseSchema, \
-    WarehouseProductsResponseSchema, warehouse_example
+    WarehouseProductsResponseSchema, WarehouseSummaryResponseSchema, WarehouseMovementsResponseSchema, warehouse_example
+from app.utils.conditional import entity_tag_async, not_modified, set_etag
 from app.utils.error_response import get_error_response
-from app.utils.logger import logger
+from app.utils.logger import get_logger
 from app.utils.oauth import role_required
+from app.utils.pagination import PageParams, page_params, set_next_cursor
+from app.utils.serialization import rows_response, model_response, json_response
+
+logger = get_logger(__name__)
 
 router = APIRouter(
     prefix="/warehouse",
@@ -27,12 +35,15 @@ router = APIRouter(
                                                               "You do not have access to this resource."),
                 status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                           "Internal Server Error"), })
-def get_warehouses(db: Session = Depends(get_db),
-                   current_warehouse: TokenData = Depends(role_required(['Admin']))):
+async def get_warehouses(response: Response, page: PageParams = Depends(page_params),
+                         db: AsyncSession = Depends(get_async_db),
+                         current_warehouse: TokenData = Depends(role_required(['Admin']))):
     logger.info("[ROUTER] Fetching all warehouses.")
-    warehouse_data = warehouse_repository.get_warehouses(db)
-    logger.info(f"[ROUTER] Fetched {len(warehouse_data)} warehouses.")
-    return warehouse_data
+    warehouse_data_page = await warehouse_repository.get_warehouses_async(page, db)
+    set_next_cursor(response, warehouse_data_page.next_cursor)
+    warehouse_data = warehouse_data_page.data
+    logger.info("[ROUTER] Fetched %s warehouses.", len(warehouse_data))
+    return rows_response(warehouse_data, WarehouseResponseSchema, response)
 
 
 @router.get('/{warehouse_id}', response_model=WarehouseResponseSchema, status_code=status.HTTP_200_OK, responses={
@@ -42,16 +53,70 @@ def get_warehouses(db: Session = Depends(get_db),
     status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
                                                   "Warehouse with ID {warehouse_id} does not exist"),
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
-def get_warehouse_by_id(warehouse_id: int, db: Session = Depends(get_db),
-                        current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching warehouse with ID {warehouse_id}.")
-    warehouse = warehouse_repository.get_warehouse_by_id(warehouse_id, db)
-    logger.info(f"[ROUTER] Found warehouse: {warehouse} with ID {warehouse_id}.")
+async def get_warehouse_by_id(warehouse_id: int, db: AsyncSession = Depends(get_async_db),
+                              current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching warehouse with ID %s.", warehouse_id)
+    warehouse = await warehouse_repository.get_warehouse_by_id_async(warehouse_id, db)
+    logger.info("[ROUTER] Found warehouse with ID %s.", warehouse_id)
     return warehouse
 
 
 @router.get('/products/{warehouse_id}', response_model=WarehouseProductsResponseSchema, status_code=status.HTTP_200_OK,
+            description="Answers 304 without a body when If-None-Match holds the current ETag of the page.",
+            responses={
+                status.HTTP_304_NOT_MODIFIED: {"description": "NOT_MODIFIED"},
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
+                                                              "Warehouse with ID {warehouse_id} does not exist"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error")})
+async def get_products_by_warehouse_id(warehouse_id: int, request: Request, response: Response,
+                                       page: PageParams = Depends(page_params),
+                                       db: AsyncSession = Depends(get_async_db),
+                                       current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching products for warehouse ID %s.", warehouse_id)
+    tag = await entity_tag_async(request, ("warehouse", warehouse_id))
+    unchanged = not_modified(request, tag)
+    if unchanged:
+        logger.info("[ROUTER] Products of warehouse ID %s not modified.", warehouse_id)
+        return unchanged
+    products_warehouse_page = await warehouse_repository.get_products_by_warehouse_id_async(warehouse_id, page, db)
+    set_next_cursor(response, products_warehouse_page.next_cursor)
+    set_etag(response, tag)
+    products_warehouse = products_warehouse_page.data
+    logger.info("[ROUTER] Found %s products for client ID %s.", len(products_warehouse), warehouse_id)
+    return model_response(products_warehouse, WarehouseProductsResponseSchema, response)
+
+
+@router.get('/summary/{warehouse_id}', response_model=WarehouseSummaryResponseSchema, status_code=status.HTTP_200_OK,
+            description="Products, units and value (quantity * price) of the warehouse per category and in total.",
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
+                                                              "Warehouse with ID {warehouse_id} does not exist"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error")})
+def get_summary_by_warehouse_id(warehouse_id: int, db: Session = Depends(get_db),
+                                current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching inventory summary for warehouse ID %s.", warehouse_id)
+    summary = inventory_summary_repository.get_summary_by_warehouse_id(warehouse_id, db)
+    logger.info("[ROUTER] Found %s categories for warehouse ID %s.", len(summary['categories']), warehouse_id)
+    return summary
+
+
+@router.get('/movements/{warehouse_id}', response_model=WarehouseMovementsResponseSchema,
+            status_code=status.HTTP_200_OK,
+            description="Units in and out of the warehouse per day, week (from Monday) or month in the range, both "
+                        "days included. The last 30 days by default, the periods without movements are zero.",
             responses={
+                status.HTTP_400_BAD_REQUEST: get_error_response("ERROR: BAD REQUEST",
+                                                                "date_from must not be after date_to"),
                 status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
                                                                  "Not authenticated or invalid role provided"),
                 status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
@@ -60,12 +125,16 @@ def get_warehouse_by_id(warehouse_id: int, db: Session = Depends(get_db),
                                                               "Warehouse with ID {warehouse_id} does not exist"),
                 status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                           "Internal Server Error")})
-def get_products_by_warehouse_id(warehouse_id: int, db: Session = Depends(get_db),
-                                 current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching products for warehouse ID {warehouse_id}.")
-    products_warehouse = warehouse_repository.get_products_by_warehouse_id(warehouse_id, db)
-    logger.info(f"[ROUTER] Found {len(products_warehouse)} products for client ID {warehouse_id}.")
-    return products_warehouse
+def get_movements_by_warehouse_id(warehouse_id: int, date_from: Optional[date] = Query(None),
+                                  date_to: Optional[date] = Query(None),
+                                  granularity: Literal['day', 'week', 'month'] = Query('day'),
+                                  db: Session = Depends(get_db),
+                                  current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching %s movements for warehouse ID %s.", granularity, warehouse_id)
+    movements_warehouse = movement_rollup_repository.get_movements_by_warehouse_id(warehouse_id, date_from, date_to,
+                                                                                    granularity, db)
+    logger.info("[ROUTER] Found %s periods for warehouse ID %s.", len(movements_warehouse['buckets']), warehouse_id)
+    return movements_warehouse
 
 
 @router.get('/transactions/{warehouse_id}',
@@ -85,12 +154,44 @@ def get_products_by_warehouse_id(warehouse_id: int, db: Session = Depends(get_db
         status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
                                                                   "Internal Server Error")
     })
-def get_transactions_by_warehouse_id(warehouse_id: int, db: Session = Depends(get_db),
-                                     current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Fetching transactions for warehouse ID {warehouse_id}.")
-    transactions_warehouse = warehouse_repository.get_transactions_by_warehouse_id(warehouse_id, db)
-    logger.info(f"[ROUTER] Found {len(transactions_warehouse)} transactions for client ID {warehouse_id}.")
-    return transactions_warehouse
+async def get_transactions_by_warehouse_id(warehouse_id: int, response: Response,
+                                           page: PageParams = Depends(page_params),
+                                           db: AsyncSession = Depends(get_async_db),
+                                           current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Fetching transactions for warehouse ID %s.", warehouse_id)
+    transactions_warehouse_page = await warehouse_repository.get_transactions_by_warehouse_id_async(warehouse_id,
+                                                                                                   page, db)
+    set_next_cursor(response, transactions_warehouse_page.next_cursor)
+    transactions_warehouse = transactions_warehouse_page.data
+    logger.info("[ROUTER] Found %s transactions for client ID %s.", len(transactions_warehouse), warehouse_id)
+    return json_response(transactions_warehouse, response)
+
+
+@router.get('/transactions/{warehouse_id}/export', status_code=status.HTTP_200_OK,
+            description="Streams the whole transaction history of the warehouse as NDJSON (one transaction per line) "
+                        "or as a JSON array, with bounded memory regardless of the history length.",
+            response_class=StreamingResponse,
+            responses={
+                status.HTTP_401_UNAUTHORIZED: get_error_response("ERROR: UNAUTHORIZED",
+                                                                 "Not authenticated or invalid role provided"),
+                status.HTTP_403_FORBIDDEN: get_error_response("ERROR: FORBIDDEN",
+                                                              "You do not have access to this resource."),
+                status.HTTP_404_NOT_FOUND: get_error_response("ERROR: NOT FOUND",
+                                                              "Warehouse with ID {warehouse_id} does not exist"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR",
+                                                                          "Internal Server Error")})
+def export_transactions_by_warehouse_id(warehouse_id: int,
+                                        export_format: Literal["ndjson", "json"] = Query("ndjson", alias="format"),
+                                        db: Session = Depends(get_db),
+                                        current_user: TokenData = Depends(role_required(['Admin']))):
+    logger.info("[ROUTER] Exporting transactions for warehouse ID %s as %s.", warehouse_id, export_format)
+    # Checked before streaming so a missing warehouse still answers with a 404
+    warehouse_repository.get_warehouse_by_id(warehouse_id, db)
+    media_type = "application/x-ndjson" if export_format == "ndjson" else "application/json"
+    filename = f"warehouse_{warehouse_id}_transactions.{export_format}"
+    return StreamingResponse(warehouse_repository.stream_transactions_by_warehouse_id(warehouse_id, export_format),
+                             media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 
 @router.post('/', response_model=WarehouseResponseSchema, status_code=status.HTTP_201_CREATED, responses={
@@ -104,7 +205,7 @@ def create_warehouse(warehouse: CreateWarehouseSchema, db: Session = Depends(get
                      current_user: TokenData = Depends(role_required(['Admin']))):
     logger.info("[ROUTER] Creating new warehouse.")
     created_warehouse = warehouse_repository.create_warehouse(warehouse, db)
-    logger.info(f"[ROUTER] Warehouse created: {created_warehouse}")
+    logger.info("[ROUTER] Warehouse created with ID %s.", created_warehouse.id)
     return created_warehouse
 
 
@@ -119,9 +220,9 @@ def create_warehouse(warehouse: CreateWarehouseSchema, db: Session = Depends(get
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def update_warehouse(warehouse_id: int, warehouse: UpdateWarehouseSchema, db: Session = Depends(get_db),
                      current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Updating warehouse with ID {warehouse_id}.")
+    logger.info("[ROUTER] Updating warehouse with ID %s.", warehouse_id)
     edited_warehouse = warehouse_repository.update_warehouse(warehouse_id, warehouse, db)
-    logger.info(f"[ROUTER] Warehouse with ID {warehouse_id} updated: {edited_warehouse}.")
+    logger.info("[ROUTER] Warehouse with ID %s updated.", warehouse_id)
     return edited_warehouse
 
 
@@ -136,7 +237,7 @@ def update_warehouse(warehouse_id: int, warehouse: UpdateWarehouseSchema, db: Se
     status.HTTP_500_INTERNAL_SERVER_ERROR: get_error_response("ERROR: INTERNAL SERVER ERROR", "Internal Server Error")})
 def delete_warehouse(warehouse_id: int, db: Session = Depends(get_db),
                      current_user: TokenData = Depends(role_required(['Admin']))):
-    logger.info(f"[ROUTER] Deleting warehouse with ID {warehouse_id}.")
+    logger.info("[ROUTER] Deleting warehouse with ID %s.", warehouse_id)
     warehouse_repository.delete_warehouse(warehouse_id, db)
-    logger.info(f"[ROUTER] Warehouse with ID {warehouse_id} deleted.")
+    logger.info("[ROUTER] Warehouse with ID %s deleted.", warehouse_id)
     return None
@@ -0,0 +1,49 @@
+from typing import Optional, List
+
+from pydantic import BaseModel, Field
+
+
+class CheckoutLatencyBucket(BaseModel):
+    le_ms: Optional[int] = Field(examples=[10])
+    count: int = Field(examples=[42])
+
+
+class PoolStatsResponseSchema(BaseModel):
+    pool_size: int = Field(examples=[5])
+    max_overflow: int = Field(examples=[10])
+    timeout: float = Field(examples=[30])
+    checked_in: int = Field(examples=[3])
+    checked_out: int = Field(examples=[2])
+    overflow: int = Field(examples=[-3])
+    waiting: int = Field(examples=[0])
+    checkouts: int = Field(examples=[1250])
+    timeouts: int = Field(examples=[0])
+    wait_time_total_ms: float = Field(examples=[512.4])
+    wait_time_max_ms: float = Field(examples=[35.2])
+    wait_time_avg_ms: float = Field(examples=[0.41])
+    timeout_wait_time_total_ms: float = Field(examples=[0.0])
+    connects: int = Field(examples=[12])
+    connect_time_total_ms: float = Field(examples=[96.3])
+    connect_time_max_ms: float = Field(examples=[14.8])
+    checkout_latency_histogram: List[CheckoutLatencyBucket]
+
+
+class CacheStatsResponseSchema(BaseModel):
+    backend: str = Field(examples=["memory"])
+    entries: Optional[int] = Field(None, examples=[840])
+    hits: Optional[int] = Field(None, examples=[15230])
+    misses: Optional[int] = Field(None, examples=[1210])
+    evictions: Optional[int] = Field(None, examples=[0])
+
+
+class HashPoolStatsResponseSchema(BaseModel):
+    workers: int = Field(examples=[2])
+    max_pending: int = Field(examples=[64])
+    bcrypt_rounds: int = Field(examples=[12])
+    pending: int = Field(examples=[3])
+    submitted: int = Field(examples=[412])
+    completed: int = Field(examples=[409])
+    rejected: int = Field(examples=[0])
+    queue_time_avg_ms: float = Field(examples=[120.5])
+    queue_time_max_ms: float = Field(examples=[980.2])
+    run_time_avg_ms: float = Field(examples=[245.1])
@@ -16,6 +16,7 @@ class AlertResponseSchema(BaseModel):
     id: Optional[int] = Field(examples=[5])
     date: datetime = Field(examples=["2024-03-16T14:30:00"])
     read: bool = Field(examples=[False])
+    triggered: bool = Field(False, examples=[True])
     min_quantity: Optional[int] = Field(None, examples=[example_min_quantity])
     max_quantity: Optional[int] = Field(None, examples=[example_max_quantity])
     max_message: Optional[str] = Field(None, examples=[example_max_message])
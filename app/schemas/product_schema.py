@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
 
 from pydantic import BaseModel, Field
@@ -26,6 +26,20 @@ class ProductResponseSchema(BaseModel):
     warehouse_id: int = Field(examples=[3])
 
 
+class ProductSearchResponseSchema(BaseModel):
+    id: Optional[int] = Field(examples=[5])
+    name: str = Field(examples=[example_name])
+    quantity: int = Field(examples=[example_quantity])
+    serial_number: str = Field(examples=[example_serial_number])
+    price: float = Field(examples=[example_price])
+    description: Optional[str] = Field(examples=[example_description])
+    category: Optional[str] = Field(examples=[example_category])
+    kit_id: Optional[int] = Field(examples=[kit_id])
+    image_url: Optional[str] = Field(examples=[example_image_url])
+    warehouse_id: int = Field(examples=[3])
+    score: float = Field(examples=[0.83])
+
+
 class CreateProductSchema(BaseModel):
     name: str = Field(examples=[example_name])
     quantity: int = Field(examples=[example_quantity])
@@ -50,6 +64,22 @@ class UpdateProductSchema(BaseModel):
     warehouse_id: int = Field(None, examples=[3])
 
 
+# Bulk creation schemas
+class BulkProductResultSchema(BaseModel):
+    index: int = Field(examples=[0])
+    status: str = Field(examples=["created"])
+    id: Optional[int] = Field(None, examples=[5])
+    serial_number: str = Field(examples=[example_serial_number])
+    warehouse_id: int = Field(examples=[3])
+    detail: Optional[str] = Field(None, examples=[None])
+
+
+class BulkProductResponseSchema(BaseModel):
+    created: int = Field(examples=[1])
+    failed: int = Field(examples=[0])
+    results: List[BulkProductResultSchema]
+
+
 # Relationship schemas
 # Product products schemas
 class ProductsBase(BaseModel):
@@ -77,6 +107,39 @@ class ProductProductsResponseSchema(BaseModel):
     products: Optional[List[ProductsBase]]
 
 
+# Product bill of materials schemas
+class BomComponentBase(BaseModel):
+    id: int = Field(examples=[8])
+    name: str = Field(examples=["Placa base"])
+    serial_number: str = Field(examples=["B654321"])
+    quantity: int = Field(examples=[example_quantity])
+    category: Optional[str] = Field(examples=[example_category])
+    warehouse_id: int = Field(examples=[3])
+    kit_id: int = Field(examples=[5])
+    depth: int = Field(examples=[1])
+    buildable: Optional[int] = Field(None, examples=[4])
+
+
+class ProductBomResponseSchema(BaseModel):
+    id: Optional[int] = Field(examples=[5])
+    name: str = Field(examples=[example_name])
+    serial_number: str = Field(examples=[example_serial_number])
+    quantity: int = Field(examples=[example_quantity])
+    warehouse_id: int = Field(examples=[3])
+    buildable: int = Field(examples=[4])
+    components: List[BomComponentBase]
+
+
+class ProductBuildableResponseSchema(BaseModel):
+    id: Optional[int] = Field(examples=[5])
+    name: str = Field(examples=[example_name])
+    serial_number: str = Field(examples=[example_serial_number])
+    quantity: int = Field(examples=[example_quantity])
+    warehouse_id: int = Field(examples=[3])
+    buildable: int = Field(examples=[4])
+    components: int = Field(examples=[9])
+
+
 # Product transactions schemas
 class TransactionsBase(BaseModel):
     id: Optional[int] = Field(examples=[5])
@@ -105,6 +168,7 @@ class AlertsBase(BaseModel):
     id: Optional[int] = Field(examples=[5])
     date: datetime = Field(examples=["2024-03-16T14:30:00"])
     read: bool = Field(examples=[False])
+    triggered: bool = Field(False, examples=[True])
     min_quantity: Optional[int] = Field(None, examples=[None])
     max_quantity: Optional[int] = Field(None, examples=[30])
     max_message: Optional[str] = Field(None, examples=["Ya no puedes guardar más objetos de este tipo"])
@@ -124,3 +188,41 @@ class ProductAlertsResponseSchema(BaseModel):
     image_url: Optional[str] = Field(examples=[example_image_url])
     warehouse_id: int = Field(examples=[3])
     alerts: Optional[List[AlertsBase]]
+
+
+# Product stock ledger schemas
+class StockMovementBase(BaseModel):
+    id: int = Field(examples=[5])
+    date: datetime = Field(examples=["2024-03-16T14:30:00"])
+    delta: int = Field(examples=[-3])
+    reason: str = Field(examples=["out"])
+    transaction_id: Optional[int] = Field(None, examples=[5])
+    warehouse_id: int = Field(examples=[3])
+
+
+class ProductLedgerResponseSchema(BaseModel):
+    id: Optional[int] = Field(examples=[5])
+    name: str = Field(examples=[example_name])
+    quantity: int = Field(examples=[example_quantity])
+    serial_number: str = Field(examples=[example_serial_number])
+    warehouse_id: int = Field(examples=[3])
+    movements: List[StockMovementBase]
+
+
+# Product movement report schemas
+class MovementBucketBase(BaseModel):
+    period: date = Field(examples=["2024-03-11"])
+    quantity_in: int = Field(examples=[40])
+    quantity_out: int = Field(examples=[28])
+    net: int = Field(examples=[12])
+
+
+class ProductMovementsResponseSchema(BaseModel):
+    id: Optional[int] = Field(examples=[5])
+    name: str = Field(examples=[example_name])
+    serial_number: str = Field(examples=[example_serial_number])
+    warehouse_id: int = Field(examples=[3])
+    granularity: str = Field(examples=["week"])
+    date_from: date = Field(examples=["2024-03-11"])
+    date_to: date = Field(examples=["2024-04-09"])
+    buckets: List[MovementBucketBase]
@@ -90,6 +90,7 @@ class AlertsBase(BaseModel):
     id: Optional[int] = Field(examples=[5])
     date: datetime = Field(examples=["2024-03-16T14:30:00"])
     read: bool = Field(examples=[False])
+    triggered: bool = Field(False, examples=[True])
     min_quantity: Optional[int] = Field(None, examples=[None])
     max_quantity: Optional[int] = Field(None, examples=[30])
     max_message: Optional[str] = Field(None, examples=["Ya no puedes guardar más objetos de este tipo"])
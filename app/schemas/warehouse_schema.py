@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
 
 from pydantic import BaseModel, Field, condecimal
@@ -96,6 +96,43 @@ class WarehouseTransactionsResponseSchema(BaseModel):
     transactions: List[TransactionsBase]
 
 
+# Warehouse inventory summary schemas
+
+class CategorySummaryBase(BaseModel):
+    category: Optional[str] = Field(examples=["Ordenadores"])
+    products: int = Field(examples=[12])
+    units: int = Field(examples=[340])
+    value: float = Field(examples=[78370.00])
+
+
+class WarehouseSummaryResponseSchema(BaseModel):
+    id: Optional[int] = Field(examples=[5])
+    name: str = Field(examples=[example_name])
+    user_id: Optional[int] = Field(examples=[3])
+    products: int = Field(examples=[12])
+    units: int = Field(examples=[340])
+    value: float = Field(examples=[78370.00])
+    categories: List[CategorySummaryBase]
+
+
+# Warehouse movement report schemas
+class MovementBucketBase(BaseModel):
+    period: date = Field(examples=["2024-03-11"])
+    quantity_in: int = Field(examples=[340])
+    quantity_out: int = Field(examples=[215])
+    net: int = Field(examples=[125])
+
+
+class WarehouseMovementsResponseSchema(BaseModel):
+    id: Optional[int] = Field(examples=[5])
+    name: str = Field(examples=[example_name])
+    user_id: Optional[int] = Field(examples=[3])
+    granularity: str = Field(examples=["week"])
+    date_from: date = Field(examples=["2024-03-11"])
+    date_to: date = Field(examples=["2024-04-09"])
+    buckets: List[MovementBucketBase]
+
+
 warehouse_example = {
     "example": {
         "id": 5,
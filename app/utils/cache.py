@@ -0,0 +1,297 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from app.config.config import settings
+from app.utils.pagination import Page
+
+KEY_PREFIX = "stockify"
+EPOCH_KEY = f"{KEY_PREFIX}:epoch"
+
+
+class LRUCache:
+
+    # In-process cache bounded by entries and by time, the least recently used entry is evicted first.
+    # Its versions are only bumped by the writes of its own worker, so they give no entity tags
+
+    shared = False
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Versions of the scopes written lately, bounded like the entries. A bump takes the next value of a
+        # counter shared by every scope and a forgotten scope reads the counter as it was when the last one was
+        # evicted, so no scope ever goes back to a version its older entries were stored under
+        self._versions = OrderedDict()
+        self._clock = 0
+        self._evicted_clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value, ttl: int = None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def version(self, scope: str) -> int:
+        with self._lock:
+            version = self._versions.get(scope)
+            if version is None:
+                return self._evicted_clock
+            self._versions.move_to_end(scope)
+            return version
+
+    def bump(self, scope: str):
+        with self._lock:
+            self._clock += 1
+            self._versions[scope] = self._clock
+            self._versions.move_to_end(scope)
+            while len(self._versions) > self.max_entries:
+                _, version = self._versions.popitem(last=False)
+                self._evicted_clock = max(self._evicted_clock, version)
+
+    # The async read paths use the same in-process state, nothing here waits on I/O
+
+    async def get_async(self, key: str):
+        return self.get(key)
+
+    async def set_async(self, key: str, value, ttl: int = None):
+        self.set(key, value, ttl)
+
+    async def version_async(self, scope: str) -> int:
+        return self.version(scope)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+
+
+class RedisCache:
+
+    # Shared cache for several workers, any server speaking the Redis protocol works.
+    # Entries expire through the server TTL and its maxmemory policy bounds the size
+
+    shared = True
+
+    def __init__(self, url: str, ttl: int):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+        # The async read paths await their round trips on this client instead of blocking the event loop
+        self._async_client = redis.asyncio.Redis.from_url(url)
+        self.hits = 0
+        self.misses = 0
+
+    def _loaded(self, value):
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def get(self, key: str):
+        return self._loaded(self._client.get(key))
+
+    def set(self, key: str, value, ttl: int = None):
+        self._client.set(key, json.dumps(value), ex=ttl if ttl is not None else self.ttl)
+
+    def version(self, scope: str) -> int:
+        return int(self._client.get(f"{KEY_PREFIX}:version:{scope}") or 0)
+
+    async def get_async(self, key: str):
+        return self._loaded(await self._async_client.get(key))
+
+    async def set_async(self, key: str, value, ttl: int = None):
+        await self._async_client.set(key, json.dumps(value), ex=ttl if ttl is not None else self.ttl)
+
+    async def version_async(self, scope: str) -> int:
+        return int(await self._async_client.get(f"{KEY_PREFIX}:version:{scope}") or 0)
+
+    def bump(self, scope: str):
+        self._client.incr(f"{KEY_PREFIX}:version:{scope}")
+
+    # The epoch and the versions of a tag are read in one round trip. The epoch is created by the first worker
+    # that finds it missing, a flushed server gets a new one and no tag given before the flush matches again
+
+    @staticmethod
+    def _tag_keys(scopes):
+        return [EPOCH_KEY, *(f"{KEY_PREFIX}:version:{scope}" for scope in scopes)]
+
+    @staticmethod
+    def _tag(epoch, versions) -> str:
+        return ".".join([epoch.decode(), *(str(int(version or 0)) for version in versions)])
+
+    def tag(self, scopes) -> str:
+        epoch, *versions = self._client.mget(self._tag_keys(scopes))
+        if epoch is None:
+            self._client.set(EPOCH_KEY, secrets.token_hex(4), nx=True)
+            epoch = self._client.get(EPOCH_KEY)
+        return self._tag(epoch, versions)
+
+    async def tag_async(self, scopes) -> str:
+        epoch, *versions = await self._async_client.mget(self._tag_keys(scopes))
+        if epoch is None:
+            await self._async_client.set(EPOCH_KEY, secrets.token_hex(4), nx=True)
+            epoch = await self._async_client.get(EPOCH_KEY)
+        return self._tag(epoch, versions)
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+def _create_cache():
+    if settings.CACHE_BACKEND == "none":
+        return None
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCache(settings.REDIS_URL, settings.CACHE_TTL_SECONDS)
+    return LRUCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+
+
+cache = _create_cache()
+
+
+def _scope(entity: str, tenant) -> str:
+    return f"{entity}:{tenant}"
+
+
+def invalidate(entity: str, *tenants):
+    # Every cached read of the scope becomes unreachable, its entries are left to expire
+    if cache is None:
+        return
+    for tenant in set(tenants):
+        if tenant is not None:
+            cache.bump(_scope(entity, tenant))
+
+
+def _etag(tag: str, params: str) -> str:
+    if params:
+        tag = f"{tag}.{hashlib.blake2b(params.encode(), digest_size=6).hexdigest()}"
+    return f'"{tag}"'
+
+
+def etag(*scopes, params: str = ""):
+    # Strong validator of a read that depends on the (entity, tenant) scopes, made of their versions instead of
+    # a hash of the body. Only a shared cache sees the writes of every worker, without one there is no tag
+    if cache is None or not cache.shared:
+        return None
+    return _etag(cache.tag([_scope(entity, tenant) for entity, tenant in scopes]), params)
+
+
+async def etag_async(*scopes, params: str = ""):
+    # Same tag for the async endpoints, its round trip is awaited instead of blocking the event loop
+    if cache is None or not cache.shared:
+        return None
+    return _etag(await cache.tag_async([_scope(entity, tenant) for entity, tenant in scopes]), params)
+
+
+def _encode(value):
+    # Decimals are kept as the strings pydantic writes for them, jsonable_encoder would turn them into floats
+    # and drop their trailing zeros, so a cached response would differ from an uncached one
+    return jsonable_encoder(value, custom_encoder={Decimal: str})
+
+
+def _dump(result):
+    # Only plain JSON data is cached, never ORM instances bound to a closed session
+    if isinstance(result, Page):
+        return {"page": _encode(result.data), "next_cursor": result.next_cursor}
+    return {"value": _encode(result)}
+
+
+def _load(entry):
+    if "page" in entry:
+        return Page(data=entry["page"], next_cursor=entry["next_cursor"])
+    return entry["value"]
+
+
+def cached(entity: str, tenant_arg: str):
+    # Read-through cache for a repository read. Keys hold the entity, its tenant (the value of
+    # tenant_arg), the scope version and the remaining arguments, db excluded, so a call to
+    # invalidate(entity, tenant) from the write paths makes every previous entry of the scope stale
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def bind(args, kwargs):
+            # Arguments of the call and the scope whose version goes into the key
+            arguments = signature.bind(*args, **kwargs).arguments
+            return arguments, _scope(entity, arguments[tenant_arg])
+
+        def build_key(arguments, version: int) -> str:
+            tenant = arguments[tenant_arg]
+            params = ",".join(f"{name}={value!r}" for name, value in arguments.items()
+                              if name not in ("db", tenant_arg))
+            return f"{KEY_PREFIX}:{entity}:{tenant}:v{version}:{func.__name__}:{params}"
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if cache is None:
+                    return await func(*args, **kwargs)
+                arguments, scope = bind(args, kwargs)
+                key = build_key(arguments, await cache.version_async(scope))
+                entry = await cache.get_async(key)
+                if entry is not None:
+                    return _load(entry)
+                entry = _dump(await func(*args, **kwargs))
+                await cache.set_async(key, entry)
+                return _load(entry)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if cache is None:
+                return func(*args, **kwargs)
+            arguments, scope = bind(args, kwargs)
+            key = build_key(arguments, cache.version(scope))
+            entry = cache.get(key)
+            if entry is not None:
+                return _load(entry)
+            entry = _dump(func(*args, **kwargs))
+            cache.set(key, entry)
+            return _load(entry)
+
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> dict:
+    if cache is None:
+        return {"backend": "none"}
+    return cache.stats()
+
@@ -0,0 +1,30 @@
+from fastapi import Request, Response, status
+
+from app.utils.cache import etag, etag_async
+
+
+def entity_tag(request: Request, *scopes):
+    # ETag of a GET that depends on the (entity, tenant) scopes. The query string (page cursor, limit) is
+    # part of it, the path ids are already in the scopes
+    return etag(*scopes, params=request.url.query)
+
+
+async def entity_tag_async(request: Request, *scopes):
+    return await etag_async(*scopes, params=request.url.query)
+
+
+def not_modified(request: Request, tag):
+    # 304 when the client already holds the current representation. Called before the read, so an unchanged
+    # poll costs no query and no serialization. The tag is computed before the read too: a write that lands
+    # in between gives a newer body under the older tag, which the next poll simply fetches again
+    header = request.headers.get("if-none-match")
+    if tag is None or not header:
+        return None
+    if any(candidate.strip().removeprefix("W/") == tag for candidate in header.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+    return None
+
+
+def set_etag(response: Response, tag):
+    if tag is not None:
+        response.headers["ETag"] = tag
@@ -1,12 +1,138 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.config.config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+
+# Functions run in the worker processes, they return the result and when they started running
+def _hash_password(password: str):
+    started_at = time.time()
+    return pwd_context.hash(password), started_at
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    started_at = time.time()
+    return pwd_context.verify_and_update(password, hashed_password), started_at
+
+
+class HashPool:
+
+    # Runs bcrypt in a small pool of processes so it neither holds the GIL nor the request threadpool.
+    # At most `workers` hashes run at once and `max_pending` are accepted, the rest are rejected
+    # with a 503 so a login burst cannot queue work without bounds
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self.run_time_total = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn, a forked child could inherit locks held by the threads of the server
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def submit(self, function, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many password operations in progress, try again later"
+                )
+            self.pending += 1
+            self.submitted += 1
+            executor = self._get_executor() if self.workers > 0 else None
+
+        submitted_at = time.time()
+        if executor is not None:
+            future = executor.submit(function, *args)
+        else:
+            # HASH_WORKERS=0 hashes in the calling thread
+            future = Future()
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        future.add_done_callback(lambda done: self._record(done, submitted_at))
+        return future
+
+    def _record(self, future: Future, submitted_at: float):
+        finished_at = time.time()
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            if future.exception() is None:
+                started_at = future.result()[1]
+                queue_time = max(started_at - submitted_at, 0.0)
+                self.queue_time_total += queue_time
+                self.queue_time_max = max(self.queue_time_max, queue_time)
+                self.run_time_total += max(finished_at - started_at, 0.0)
+
+    def run(self, function, *args):
+        return self.submit(function, *args).result()[0]
+
+    async def run_async(self, function, *args):
+        result = await asyncio.wrap_future(self.submit(function, *args))
+        return result[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self.completed
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+                "pending": self.pending,
+                "submitted": self.submitted,
+                "completed": completed,
+                "rejected": self.rejected,
+                "queue_time_avg_ms": round(self.queue_time_total / completed * 1000, 3) if completed else 0.0,
+                "queue_time_max_ms": round(self.queue_time_max * 1000, 3),
+                "run_time_avg_ms": round(self.run_time_total / completed * 1000, 3) if completed else 0.0,
+            }
+
+
+hash_pool = HashPool(settings.HASH_WORKERS, settings.HASH_MAX_PENDING)
 
 
 class Hash:
 
-    def hash_password(self):
-        return pwd_context.hash(self)
+    @staticmethod
+    def hash_password(password: str) -> str:
+        return hash_pool.run(_hash_password, password)
+
+    @staticmethod
+    def verify_password(password: str, hashed_password: str) -> bool:
+        return hash_pool.run(_verify_and_update, password, hashed_password)[0]
+
+    @staticmethod
+    def verify_and_update(password: str, hashed_password: str):
+        # Returns (valid, new_hash), new_hash is set when the stored hash uses other settings than BCRYPT_ROUNDS
+        return hash_pool.run(_verify_and_update, password, hashed_password)
+
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        return await hash_pool.run_async(_hash_password, password)
 
-    def verify_password(self, hashed_password):
-        return pwd_context.verify(self, hashed_password)
+    @staticmethod
+    async def verify_and_update_async(password: str, hashed_password: str):
+        return await hash_pool.run_async(_verify_and_update, password, hashed_password)
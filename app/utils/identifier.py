@@ -1,38 +1,73 @@
+from sqlalchemy import Connection
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
 from datetime import datetime
-import logging
+import threading
 
-from app.models.transaction_model import Transaction
+from app.config.config import settings
+from app.db.dialect import upsert_insert
+from app.models.transaction_counter_model import TransactionCounter
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class IdentifierAllocator:
+
+    # Hands out transaction numbers per month from blocks reserved on the transaction_counter row.
+    # The reservation is a single atomic upsert on its own connection, so it never scans the transaction
+    # table, never returns the same number twice and only holds the counter row lock for that statement.
+
+    def __init__(self, block_size: int):
+        self.block_size = max(block_size, 1)
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    def _reserve(self, bind, period: str, block_size: int) -> int:
+        table = TransactionCounter.__table__
+        stmt = upsert_insert(bind, table).values(period=period, last_value=block_size)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.period],
+            set_={"last_value": table.c.last_value + block_size}
+        ).returning(table.c.last_value)
+
+        if isinstance(bind, Connection):
+            return bind.execute(stmt).scalar_one()
+        with bind.begin() as connection:
+            return connection.execute(stmt).scalar_one()
+
+    def next_number(self, bind, period: str) -> int:
+        if isinstance(bind, Connection):
+            # Reserved inside the transaction of the caller, whose rollback also undoes the reservation:
+            # no block is kept, a cached one would hand out the rolled back numbers again
+            return self._reserve(bind, period, 1)
+
+        with self._lock:
+            block = self._blocks.get(period)
+            if block is None or block[0] > block[1]:
+                last_value = self._reserve(bind, period, self.block_size)
+                block = [last_value - self.block_size + 1, last_value]
+                self._blocks = {period: block}
+                logger.info("Reserved identifier numbers %s-%s for period '%s'", block[0], block[1], period)
+
+            number = block[0]
+            block[0] += 1
+            return number
+
+
+allocator = IdentifierAllocator(settings.TRANSACTION_ID_BLOCK_SIZE)
 
-logger = logging.getLogger(__name__)
 
 def generate_identifier(db: Session) -> str:
     now = datetime.now()
     year_month = now.strftime("%Y/%m")
     prefix = f"TRAN-{year_month}-"
 
-    logger.info(f"Generating identifier with prefix '{prefix}'")
-
-    last_transaction = (
-        db.query(Transaction)
-        .filter(Transaction.identifier.like(f"{prefix}%"))
-        .order_by(desc(Transaction.identifier))
-        .first()
-    )
-
-    if last_transaction and last_transaction.identifier:
-        try:
-            last_number = int(last_transaction.identifier.split("-")[-1])
-            logger.info(f"Last identifier found: {last_transaction.identifier} -> Counter: {last_number}")
-            new_number = last_number + 1
-        except ValueError:
-            logger.warning(f"Could not parse last identifier number from: {last_transaction.identifier}")
-            new_number = 1
-    else:
-        logger.info("No previous identifier found for this month. Starting at 1.")
-        new_number = 1
+    # SQLite has a single writer, a second connection would wait for the lock this session already holds
+    bind = db.get_bind()
+    if bind.dialect.name == "sqlite":
+        bind = db.connection()
+    new_number = allocator.next_number(bind, year_month)
 
     new_identifier = f"{prefix}{new_number:04d}"
-    logger.info(f"Generated new identifier: {new_identifier}")
+    logger.info("Generated new identifier: %s", new_identifier)
     return new_identifier
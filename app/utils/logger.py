@@ -1,19 +1,100 @@
+import atexit
 import logging
-from logging.handlers import TimedRotatingFileHandler
 import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+from app.config.config import settings
 
 log_dir = "logs"
 os.makedirs(log_dir, exist_ok=True)
 
+LOGGER_NAME = "stockify"
+
+
+class DeferredQueueHandler(QueueHandler):
+
+    # Hands the records to the listener thread without formatting them, the message, its arguments
+    # and the traceback are rendered there. A full queue drops the record instead of blocking the request
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+
+    # Lets through at most `per_second` INFO/DEBUG records of each message template per second,
+    # warnings and errors always pass. A value of 0 disables sampling
+
+    def __init__(self, per_second: int):
+        super().__init__()
+        self.per_second = per_second
+        self._lock = threading.Lock()
+        self._windows = {}
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.per_second <= 0 or record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, record.msg)
+        second = int(time.monotonic())
+        with self._lock:
+            window, count = self._windows.get(key, (second, 0))
+            if window != second:
+                window, count = second, 0
+            if count >= self.per_second:
+                self.sampled_out += 1
+                return False
+            self._windows[key] = (window, count + 1)
+        return True
+
+
+def _log_file_name() -> str:
+    # Several uvicorn workers rotating the same file at midnight would overwrite each other's logs
+    if settings.LOG_FILE_PER_PROCESS:
+        return os.path.join(log_dir, f"stockify.{os.getpid()}")
+    return os.path.join(log_dir, "stockify")
+
+
+def _parse_levels(levels: str) -> dict:
+    # 'repository=WARNING,routers.product_router=DEBUG' -> {'stockify.repository': 'WARNING', ...}
+    parsed = {}
+    for entry in levels.split(","):
+        if "=" not in entry:
+            continue
+        name, level = (part.strip() for part in entry.split("=", 1))
+        if name != LOGGER_NAME and not name.startswith(f"{LOGGER_NAME}."):
+            name = f"{LOGGER_NAME}.{name}"
+        parsed[name] = level.upper()
+    return parsed
+
+
 # Logger configuration
-logger = logging.getLogger("stockify")
-logger.setLevel(logging.INFO)
+logger = logging.getLogger(LOGGER_NAME)
+logger.setLevel(settings.LOG_LEVEL)
+logger.propagate = False
+
+for logger_name, logger_level in _parse_levels(settings.LOG_LEVELS).items():
+    logging.getLogger(logger_name).setLevel(logger_level)
 
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
 # Daily rotating file handler with date in the filename
 daily_handler = TimedRotatingFileHandler(
-    filename=os.path.join(log_dir, "stockify"),
+    filename=_log_file_name(),
     when="midnight",
     interval=1,
     backupCount=7,
@@ -24,13 +105,48 @@ daily_handler = TimedRotatingFileHandler(
 daily_handler.suffix = "%Y-%m-%d.log"
 
 daily_handler.setFormatter(formatter)
-daily_handler.setLevel(logging.INFO)
 
 # Console handler to also show logs in the terminal
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(formatter)
-console_handler.setLevel(logging.INFO)
 
-# Add both handlers to the logger
-logger.addHandler(daily_handler)
-logger.addHandler(console_handler)
+# The request threads only put records on the queue, the listener thread formats and writes them
+sampling_filter = SamplingFilter(settings.LOG_SAMPLE_PER_SECOND)
+queue_handler = DeferredQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+queue_handler.addFilter(sampling_filter)
+logger.addHandler(queue_handler)
+
+listener = QueueListener(queue_handler.queue, daily_handler, console_handler)
+listener.start()
+
+
+def _restart_listener():
+    # A forked worker (gunicorn --preload) inherits the queue but not the listener thread
+    global listener
+    queue_handler.queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    listener = QueueListener(queue_handler.queue, daily_handler, console_handler)
+    listener.start()
+
+
+def _stop_listener():
+    # Writes the records still queued before the process exits
+    listener.stop()
+
+
+os.register_at_fork(after_in_child=_restart_listener)
+atexit.register(_stop_listener)
+
+
+def get_logger(name: str) -> logging.Logger:
+    # Module logger under 'stockify', app.repository.product_repository -> stockify.repository.product_repository
+    if name.startswith("app."):
+        name = name[len("app."):]
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def log_stats() -> dict:
+    return {
+        "queued": queue_handler.queue.qsize(),
+        "dropped": queue_handler.dropped,
+        "sampled_out": sampling_filter.sampled_out,
+    }
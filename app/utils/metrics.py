@@ -0,0 +1,310 @@
+import asyncio
+import bisect
+import functools
+import importlib
+import inspect
+import os
+import pkgutil
+import threading
+import time
+
+from anyio import to_thread
+
+from app.db.database import get_pool_stats, get_async_pool_stats
+from app.db.pool_stats import CHECKOUT_BUCKETS_MS
+from app.db.query_stats import current_query_stats
+from app.utils.cache import cache_stats
+from app.utils.hashing import hash_pool
+from app.utils.logger import log_stats
+from app.utils.token import token_cache_stats
+
+PREFIX = "stockify"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    # Monotonic counter per label values, the lock is only held for the dict update
+
+    def __init__(self, name: str, description: str, label_names=()):
+        self.name = f"{PREFIX}_{name}"
+        self.description = description
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.description}")
+        lines.append(f"# TYPE {self.name} counter")
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {_number(value)}")
+
+
+class Histogram:
+
+    # Fixed buckets per label values. An observation is one bisect plus two additions under the lock,
+    # the cumulative counts Prometheus expects are only computed when the metrics are scraped
+
+    def __init__(self, name: str, description: str, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.description = description
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.description}")
+        lines.append(f"# TYPE {self.name} histogram")
+        with self._lock:
+            series = [(label_values, list(counts), total) for label_values, (counts, total) in self._series.items()]
+        for label_values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = _labels(self.label_names, label_values, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+
+def _render_gauge(lines: list, name: str, description: str, samples, metric_type: str = "gauge"):
+    # samples: list of (labels string, value)
+    name = f"{PREFIX}_{name}"
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    for labels, value in samples:
+        lines.append(f"{name}{labels} {_number(value)}")
+
+
+http_requests = Counter("http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency.",
+                                  ("method", "route", "status"))
+http_request_queries = Histogram("http_request_db_queries", "SQL statements executed per HTTP request.",
+                                 ("method", "route"), buckets=QUERY_COUNT_BUCKETS)
+repository_duration = Histogram("repository_duration_seconds", "Duration of the repository functions.",
+                                ("function", "outcome"))
+
+_in_progress = 0
+_in_progress_lock = threading.Lock()
+_started_at = time.time()
+
+
+class MetricsMiddleware:
+
+    # Records every HTTP request under its route template, never the raw path, to keep the label set small
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _in_progress
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with _in_progress_lock:
+            _in_progress += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            with _in_progress_lock:
+                _in_progress -= 1
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method, route_path, str(status_code))
+            http_request_duration.observe(elapsed, method, route_path, str(status_code))
+            query_stats = current_query_stats.get()
+            if query_stats is not None:
+                http_request_queries.observe(query_stats.count, method, route_path)
+
+
+def _timed(name: str, func):
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                repository_duration.observe(time.perf_counter() - start, name, outcome)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = func(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            repository_duration.observe(time.perf_counter() - start, name, outcome)
+
+    return wrapper
+
+
+def instrument_repositories(package):
+    # Wraps the public functions of every *_repository module of the package with a timer. Callers
+    # that go through the module attribute (product_repository.get_product_by_id) are measured,
+    # generators are left out because their work happens after they return
+    for module_info in pkgutil.iter_modules(package.__path__):
+        if not module_info.name.endswith("_repository"):
+            continue
+        module = importlib.import_module(f"{package.__name__}.{module_info.name}")
+        for attribute, value in list(vars(module).items()):
+            if (attribute.startswith("_") or not inspect.isfunction(value) or value.__module__ != module.__name__
+                    or inspect.isgeneratorfunction(value) or getattr(value, "__metrics_timed__", False)):
+                continue
+            timed = _timed(f"{module_info.name}.{attribute}", value)
+            timed.__metrics_timed__ = True
+            setattr(module, attribute, timed)
+
+
+def _render_pools(lines: list):
+    pools = [("sync", get_pool_stats()), ("async", get_async_pool_stats())]
+    for name, description, key in (
+            ("db_pool_size", "Configured size of the connection pool.", "pool_size"),
+            ("db_pool_checked_out", "Connections currently checked out.", "checked_out"),
+            ("db_pool_checked_in", "Idle connections in the pool.", "checked_in"),
+            ("db_pool_overflow", "Overflow connections currently open.", "overflow"),
+            ("db_pool_waiting", "Requests waiting for a connection.", "waiting")):
+        _render_gauge(lines, name, description, [(f'{{pool="{pool}"}}', stats[key]) for pool, stats in pools])
+    _render_gauge(lines, "db_pool_timeouts_total", "Checkouts that timed out waiting for a connection.",
+                  [(f'{{pool="{pool}"}}', stats["timeouts"]) for pool, stats in pools], "counter")
+    _render_gauge(lines, "db_pool_timeout_wait_seconds_total", "Time spent waiting by the checkouts that timed out.",
+                  [(f'{{pool="{pool}"}}', stats["timeout_wait_time_total_ms"] / 1000) for pool, stats in pools],
+                  "counter")
+    _render_gauge(lines, "db_pool_connects_total", "New connections opened by the checkouts.",
+                  [(f'{{pool="{pool}"}}', stats["connects"]) for pool, stats in pools], "counter")
+    _render_gauge(lines, "db_pool_connect_seconds_total", "Time spent opening new connections, not counted as wait.",
+                  [(f'{{pool="{pool}"}}', stats["connect_time_total_ms"] / 1000) for pool, stats in pools], "counter")
+
+    # Only the checkouts that got a connection, in the buckets, the sum and the count alike
+    name = f"{PREFIX}_db_pool_checkout_seconds"
+    lines.append(f"# HELP {name} Time spent waiting for a connection from the pool, without opening new ones.")
+    lines.append(f"# TYPE {name} histogram")
+    for pool, stats in pools:
+        cumulative = 0
+        for bound, bucket in zip(CHECKOUT_BUCKETS_MS + (None,), stats["checkout_latency_histogram"]):
+            cumulative += bucket["count"]
+            le = "+Inf" if bound is None else _number(bound / 1000)
+            lines.append(f'{name}_bucket{{pool="{pool}",le="{le}"}} {cumulative}')
+        lines.append(f'{name}_sum{{pool="{pool}"}} {_number(stats["wait_time_total_ms"] / 1000)}')
+        lines.append(f'{name}_count{{pool="{pool}"}} {cumulative}')
+
+
+def _render_threadpool(lines: list):
+    # Threads of the anyio limiter that runs the sync endpoints and dependencies
+    limiter = to_thread.current_default_thread_limiter()
+    _render_gauge(lines, "threadpool_size", "Threads available to the sync endpoints.", [("", limiter.total_tokens)])
+    _render_gauge(lines, "threadpool_busy", "Threads running a sync endpoint or dependency.",
+                  [("", limiter.borrowed_tokens)])
+    _render_gauge(lines, "threadpool_waiting", "Calls waiting for a free thread.",
+                  [("", limiter.statistics().tasks_waiting)])
+
+
+def _render_caches(lines: list):
+    caches = [("read", cache_stats()), ("token", token_cache_stats())]
+    caches = [(name, stats) for name, stats in caches if "hits" in stats]
+    for metric, key in (("cache_hits_total", "hits"), ("cache_misses_total", "misses"),
+                        ("cache_evictions_total", "evictions")):
+        samples = [(f'{{cache="{name}"}}', stats[key]) for name, stats in caches if key in stats]
+        _render_gauge(lines, metric, f"Cache {key}.", samples, "counter")
+
+    ratios = []
+    for name, stats in caches:
+        lookups = stats["hits"] + stats["misses"]
+        ratios.append((f'{{cache="{name}"}}', stats["hits"] / lookups if lookups else 0.0))
+    _render_gauge(lines, "cache_hit_ratio", "Hits over lookups since the worker started.", ratios)
+    _render_gauge(lines, "cache_entries", "Entries held by the in-memory caches.",
+                  [(f'{{cache="{name}"}}', stats["entries"]) for name, stats in caches if "entries" in stats])
+
+
+def _render_hashing(lines: list):
+    stats = hash_pool.stats()
+    _render_gauge(lines, "hash_pending", "Password hashes queued or running.", [("", stats["pending"])])
+    _render_gauge(lines, "hash_completed_total", "Password hashes completed.", [("", stats["completed"])], "counter")
+    _render_gauge(lines, "hash_rejected_total", "Password hashes rejected with a 503.", [("", stats["rejected"])],
+                  "counter")
+
+
+def _render_logging(lines: list):
+    stats = log_stats()
+    _render_gauge(lines, "log_queued", "Log records waiting for the writer thread.", [("", stats["queued"])])
+    _render_gauge(lines, "log_dropped_total", "Log records dropped because the queue was full.",
+                  [("", stats["dropped"])], "counter")
+    _render_gauge(lines, "log_sampled_out_total", "Log records discarded by sampling.", [("", stats["sampled_out"])],
+                  "counter")
+
+
+def render_metrics() -> str:
+    # Metrics of this worker process, every uvicorn worker keeps its own counters
+    lines = []
+    _render_gauge(lines, "process_start_time_seconds", "Start time of the worker process.",
+                  [(f'{{pid="{os.getpid()}"}}', _started_at)])
+    with _in_progress_lock:
+        in_progress = _in_progress
+    _render_gauge(lines, "http_requests_in_progress", "HTTP requests being handled.", [("", in_progress)])
+    http_requests.render(lines)
+    http_request_duration.render(lines)
+    http_request_queries.render(lines)
+    repository_duration.render(lines)
+    _render_pools(lines)
+    _render_threadpool(lines)
+    _render_caches(lines)
+    _render_hashing(lines)
+    _render_logging(lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,86 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional, Any
+
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import DateTime, tuple_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams(NamedTuple):
+    cursor: Optional[str]
+    limit: int
+
+
+class Page(NamedTuple):
+    data: Any
+    next_cursor: Optional[str]
+
+
+def page_params(cursor: Optional[str] = Query(None, description="Opaque cursor returned in the X-Next-Cursor header"),
+                limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)) -> PageParams:
+    return PageParams(cursor=cursor, limit=limit)
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_column):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        if isinstance(sort_column.type, DateTime):
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+def keyset(stmt, sort_column, id_column, page: PageParams, descending: bool = False):
+    # Seeks past the last (sort_key, id) of the previous page instead of using OFFSET,
+    # so every page costs the same index range scan no matter how deep it is
+    same_column = sort_column is id_column
+
+    if page.cursor:
+        sort_value, row_id = decode_cursor(page.cursor, sort_column)
+        if same_column:
+            condition = id_column < row_id if descending else id_column > row_id
+        elif descending:
+            condition = tuple_(sort_column, id_column) < tuple_(sort_value, row_id)
+        else:
+            condition = tuple_(sort_column, id_column) > tuple_(sort_value, row_id)
+        stmt = stmt.where(condition)
+
+    order_columns = [id_column] if same_column else [sort_column, id_column]
+    if descending:
+        order_columns = [column.desc() for column in order_columns]
+
+    # One extra row tells whether there is a next page
+    return stmt.order_by(*order_columns).limit(page.limit + 1)
+
+
+def build_page(rows, page: PageParams, sort_attribute: str, id_attribute: str = "id") -> Page:
+    rows = list(rows)
+    if len(rows) <= page.limit:
+        return Page(data=rows, next_cursor=None)
+
+    rows = rows[:page.limit]
+    last = rows[-1]
+    return Page(data=rows, next_cursor=encode_cursor(getattr(last, sort_attribute), getattr(last, id_attribute)))
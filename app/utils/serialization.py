@@ -0,0 +1,128 @@
+import types
+import typing
+from decimal import Decimal
+from functools import lru_cache
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+from sqlalchemy import Row
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def _unwrap_optional(annotation):
+    # Optional[X] -> X, anything else unchanged
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _to_float(value):
+    return value if value is None or isinstance(value, float) else float(value)
+
+
+def _to_decimal_string(value):
+    # Pydantic writes Decimal fields as strings in JSON
+    return value if value is None else str(value)
+
+
+def _converter(annotation):
+    # Conversion a field needs to serialize the way its pydantic type would, None when orjson writes
+    # the value as is (int, str, bool, datetime)
+    optional = _unwrap_optional(annotation) is not annotation
+    annotation = _unwrap_optional(annotation)
+    if _is_model(annotation):
+        return encoder_for(annotation).encode
+    if typing.get_origin(annotation) in (list, typing.List):
+        item = _unwrap_optional(typing.get_args(annotation)[0])
+        if _is_model(item):
+            encode = encoder_for(item).encode
+            return lambda values: values if values is None else [encode(value) for value in values]
+    if annotation is float:
+        return _to_float if optional else float
+    if annotation is Decimal:
+        return _to_decimal_string
+    return None
+
+
+class RowEncoder:
+
+    # Turns projected rows, ORM objects or cached dicts into the plain dicts the schema would produce, without
+    # building and validating a pydantic model per row. Only the schema fields are read, in the schema order.
+    # Loaded ORM columns are read from the instance __dict__, going through the attribute only when one is
+    # missing (expired or not loaded yet)
+
+    def __init__(self, schema: type[BaseModel]):
+        self.names = tuple(schema.model_fields)
+        self.converters = tuple((name, convert) for name, convert in
+                                ((name, _converter(field.annotation)) for name, field in schema.model_fields.items())
+                                if convert is not None)
+
+    def encode(self, row) -> dict:
+        if row is None:
+            return None
+        is_dict = isinstance(row, dict)
+        if is_dict:
+            state = row
+        elif isinstance(row, Row):
+            state = row._mapping
+        else:
+            state = row.__dict__
+        try:
+            values = {name: state[name] for name in self.names}
+        except KeyError:
+            if is_dict:
+                values = {name: row.get(name) for name in self.names}
+            else:
+                values = {name: getattr(row, name, None) for name in self.names}
+        for name, convert in self.converters:
+            values[name] = convert(values[name])
+        return values
+
+
+@lru_cache(maxsize=None)
+def encoder_for(schema: type[BaseModel]) -> RowEncoder:
+    return RowEncoder(schema)
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+
+
+def _headers(response: Response):
+    if response is None:
+        return None
+    return {key: value for key, value in response.headers.items() if key != "content-length"}
+
+
+def rows_response(rows, schema: type[BaseModel], response: Response = None) -> Response:
+    # Fast path of the list endpoints: the rows are trusted (they come from the database) so they are
+    # written straight to JSON bytes. The endpoint keeps its response_model for the OpenAPI schema, FastAPI
+    # skips it when a Response is returned, and the headers set on the injected response are carried over
+    encoder = encoder_for(schema)
+    return Response(content=dumps([encoder.encode(row) for row in rows]), media_type=JSON_MEDIA_TYPE,
+                    headers=_headers(response))
+
+
+def model_response(row, schema: type[BaseModel], response: Response = None) -> Response:
+    # Same as rows_response for a single object with nested lists (products of a warehouse)
+    return json_response(encoder_for(schema).encode(row), response)
+
+
+def json_response(content, response: Response = None) -> Response:
+    # Endpoints without response_model that return plain dicts, Decimal is written as a number
+    # like jsonable_encoder does
+    return Response(content=dumps(content), media_type=JSON_MEDIA_TYPE, headers=_headers(response))
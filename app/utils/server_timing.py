@@ -0,0 +1,42 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+
+from app.db.query_stats import QueryStats, current_query_stats, report_repeated_statements
+
+DB_QUERIES_HEADER = "X-DB-Queries"
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+class ServerTimingMiddleware:
+
+    # Counts the SQL statements of every request and adds them to the response as
+    # X-DB-Queries and Server-Timing (db and total time, shown by the browser devtools)
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers[DB_QUERIES_HEADER] = str(stats.count)
+                headers.append(SERVER_TIMING_HEADER,
+                               f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", '
+                               f'app;dur={total_ms:.2f}')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_stats.reset(token)
+            report_repeated_statements(stats, scope["method"], scope["path"])
@@ -1,10 +1,14 @@
+import hashlib
 import os
+import time
 from datetime import datetime, timedelta, timezone
 
 import jwt
 from dotenv import load_dotenv
 
+from app.config.config import settings
 from app.schemas.token_schema import TokenData
+from app.utils.cache import LRUCache
 
 load_dotenv()
 
@@ -12,6 +16,9 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Claims of the tokens already verified, keyed by the token digest and kept until the token expires
+verified_tokens = LRUCache(settings.TOKEN_CACHE_MAX_ENTRIES, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -21,14 +28,29 @@ def create_access_token(data: dict) -> str:
 
 
 def verify_token(token: str, credentials_exception: Exception) -> TokenData:
+    token_digest = hashlib.sha256(token.encode()).hexdigest()
+    token_data = verified_tokens.get(token_digest)
+    if token_data is not None:
+        return token_data
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
         role = payload.get("role")
         if not username or not role:
             raise credentials_exception
-        return TokenData(username=username, role=role)
+        token_data = TokenData(username=username, role=role)
     except jwt.ExpiredSignatureError:
         raise credentials_exception
     except jwt.InvalidTokenError:
         raise credentials_exception
+
+    # Tokens without exp never expire, they are kept for the default lifetime of a token
+    expires_in = payload["exp"] - time.time() if "exp" in payload else verified_tokens.ttl
+    if expires_in > 0:
+        verified_tokens.set(token_digest, token_data, ttl=expires_in)
+    return token_data
+
+
+def token_cache_stats() -> dict:
+    return verified_tokens.stats()
@@ -20,6 +20,12 @@ from app.models.warehouse_model import Warehouse
 from app.models.alert_model import Alert
 from app.models.user_model import User
 from app.models.transaction_products_midtable import TransactionProduct
+from app.models.transaction_counter_model import TransactionCounter
+from app.models.stock_movement_model import StockMovement
+from app.models.inventory_summary_model import InventorySummary
+from app.models.product_movement_daily_model import ProductMovementDaily
+from app.models.warehouse_movement_daily_model import WarehouseMovementDaily
+from app.db.search import include_object
 
 target_metadata = Base.metadata
 
@@ -63,7 +69,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object(connection.dialect.name)
         )
 
         with context.begin_transaction():
@@ -0,0 +1,54 @@
+"""Add stock_movement ledger table with the opening balance of every product
+
+Revision ID: 1301ac696d7d
+Revises: 2cd63ce2723a
+Create Date: 2026-10-18 11:02:47.513094
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1301ac696d7d'
+down_revision: Union[str, None] = '2cd63ce2723a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('stock_movement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('transaction_id', sa.Integer(), nullable=True),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(length=20), nullable=False),
+    sa.Column('date', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transaction.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouse.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stock_movement_id'), 'stock_movement', ['id'], unique=False)
+    op.create_index('ix_stock_movement_product_date', 'stock_movement', ['product_id', 'date', 'id'], unique=False)
+    op.create_index('ix_stock_movement_warehouse_date', 'stock_movement', ['warehouse_id', 'date'], unique=False)
+
+    # The earlier history cannot be replayed, every product starts the ledger with its current quantity
+    op.execute(
+        """
+        INSERT INTO stock_movement (product_id, warehouse_id, delta, reason, date)
+        SELECT id, warehouse_id, quantity, 'opening', now()
+        FROM product
+        WHERE quantity <> 0
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_movement_warehouse_date', table_name='stock_movement')
+    op.drop_index('ix_stock_movement_product_date', table_name='stock_movement')
+    op.drop_index(op.f('ix_stock_movement_id'), table_name='stock_movement')
+    op.drop_table('stock_movement')
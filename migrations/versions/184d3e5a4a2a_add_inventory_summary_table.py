@@ -0,0 +1,45 @@
+"""Add inventory_summary table with the current valuation of every warehouse
+
+Revision ID: 184d3e5a4a2a
+Revises: 9dd9a7ba3412
+Create Date: 2026-10-18 17:20:31.884512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '184d3e5a4a2a'
+down_revision: Union[str, None] = '9dd9a7ba3412'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('inventory_summary',
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('products', sa.Integer(), nullable=False),
+    sa.Column('units', sa.BigInteger(), nullable=False),
+    sa.Column('value', sa.Numeric(precision=16, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouse.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('warehouse_id', 'category')
+    )
+
+    # Filled from the current products, the write paths keep it current from here on
+    op.execute(
+        """
+        INSERT INTO inventory_summary (warehouse_id, category, products, units, value)
+        SELECT warehouse_id, COALESCE(category, ''), COUNT(*), COALESCE(SUM(quantity), 0),
+               COALESCE(SUM(quantity * price), 0)
+        FROM product
+        GROUP BY warehouse_id, COALESCE(category, '')
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('inventory_summary')
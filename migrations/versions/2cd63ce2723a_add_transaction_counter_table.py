@@ -0,0 +1,41 @@
+"""Add transaction_counter table to allocate the transaction identifiers
+
+Revision ID: 2cd63ce2723a
+Revises: 6393994345b5
+Create Date: 2026-10-18 10:12:31.204817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2cd63ce2723a'
+down_revision: Union[str, None] = '6393994345b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('transaction_counter',
+    sa.Column('period', sa.String(length=7), nullable=False),
+    sa.Column('last_value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('period')
+    )
+
+    # Start every month from the highest number already used by its identifiers
+    op.execute(
+        """
+        INSERT INTO transaction_counter (period, last_value)
+        SELECT substring(identifier from 6 for 7), max(CAST(split_part(identifier, '-', 3) AS INTEGER))
+        FROM transaction
+        WHERE identifier ~ '^TRAN-[0-9]{4}/[0-9]{2}-[0-9]+$'
+        GROUP BY substring(identifier from 6 for 7)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('transaction_counter')
@@ -0,0 +1,38 @@
+"""Add triggered column in alert table
+
+Revision ID: 640a5bd05a6c
+Revises: 1301ac696d7d
+Create Date: 2026-10-18 11:48:09.371552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '640a5bd05a6c'
+down_revision: Union[str, None] = '1301ac696d7d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('alert', sa.Column('triggered', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    # Existing alerts start with the state of the current quantities
+    op.execute(
+        """
+        UPDATE alert
+        SET triggered = TRUE
+        FROM product
+        WHERE alert.product_id = product.id
+          AND ((alert.min_quantity IS NOT NULL AND product.quantity <= alert.min_quantity)
+            OR (alert.max_quantity IS NOT NULL AND product.quantity >= alert.max_quantity))
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('alert', 'triggered')
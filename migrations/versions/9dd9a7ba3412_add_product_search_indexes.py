@@ -0,0 +1,72 @@
+"""Add product search indexes
+
+Revision ID: 9dd9a7ba3412
+Revises: cd02c5589c7a
+Create Date: 2026-10-18 16:12:44.501873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9dd9a7ba3412'
+down_revision: Union[str, None] = 'cd02c5589c7a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_COLUMNS = ['name', 'serial_number', 'category', 'description']
+
+# SQLite: FTS5 table over the product columns, kept in sync by triggers
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+    "name, serial_number, category, description, content='product', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product BEGIN "
+    "INSERT INTO product_search(rowid, name, serial_number, category, description) "
+    "VALUES (new.id, new.name, new.serial_number, new.category, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product BEGIN "
+    "INSERT INTO product_search(product_search, rowid, name, serial_number, category, description) "
+    "VALUES ('delete', old.id, old.name, old.serial_number, old.category, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE OF name, serial_number, category, description "
+    "ON product BEGIN "
+    "INSERT INTO product_search(product_search, rowid, name, serial_number, category, description) "
+    "VALUES ('delete', old.id, old.name, old.serial_number, old.category, old.description); "
+    "INSERT INTO product_search(rowid, name, serial_number, category, description) "
+    "VALUES (new.id, new.name, new.serial_number, new.category, new.description); END",
+    "INSERT INTO product_search(product_search) VALUES ('rebuild')",
+]
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS product_search_au",
+    "DROP TRIGGER IF EXISTS product_search_ad",
+    "DROP TRIGGER IF EXISTS product_search_ai",
+    "DROP TABLE IF EXISTS product_search",
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+        return
+
+    # Postgres: trigram GIN indexes, built CONCURRENTLY like the other large indexes
+    with op.get_context().autocommit_block():
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in SEARCH_COLUMNS:
+            op.create_index(f'ix_product_{column}_trgm', 'product', [column], unique=False, if_not_exists=True,
+                            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+                            postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+        return
+
+    # The pg_trgm extension is left installed, other objects may use it
+    with op.get_context().autocommit_block():
+        for column in reversed(SEARCH_COLUMNS):
+            op.drop_index(f'ix_product_{column}_trgm', table_name='product', if_exists=True,
+                          postgresql_concurrently=True)
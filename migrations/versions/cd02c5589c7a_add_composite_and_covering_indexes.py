@@ -0,0 +1,68 @@
+"""Add composite and covering indexes
+
+Revision ID: cd02c5589c7a
+Revises: 640a5bd05a6c
+Create Date: 2026-10-18 14:05:37.218460
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cd02c5589c7a'
+down_revision: Union[str, None] = '640a5bd05a6c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns, columns only stored in the index on Postgres)
+INDEXES = [
+    ('ix_transaction_date_id', 'transaction', ['date', 'id'], None),
+    ('ix_transaction_warehouse_date', 'transaction', ['warehouse_id', 'date', 'id'], None),
+    ('ix_transaction_client_date', 'transaction', ['client_id', 'date', 'id'], None),
+    ('ix_transaction_products_product', 'transaction_products', ['product_id', 'transaction_id'], ['quantity']),
+    ('ix_alert_date_id', 'alert', ['date', 'id'], None),
+    ('ix_alert_user_read_date', 'alert', ['user_id', 'read', 'date'], None),
+    ('ix_alert_product_id', 'alert', ['product_id'], None),
+    ('ix_product_name_id', 'product', ['name', 'id'], None),
+    ('ix_product_warehouse_name', 'product', ['warehouse_id', 'name', 'id'], None),
+    ('ix_product_kit_id', 'product', ['kit_id'], None),
+    ('ix_warehouse_name_id', 'warehouse', ['name', 'id'], None),
+    ('ix_warehouse_user_id', 'warehouse', ['user_id'], None),
+    ('ix_client_name_id', 'client', ['name', 'id'], None),
+    ('ix_client_user_id', 'client', ['user_id'], None),
+    ('ix_user_admin_id', 'user', ['admin_id'], None),
+    ('ix_stock_movement_transaction_id', 'stock_movement', ['transaction_id'], None),
+]
+
+# Single column indexes that are now the leading column of one of the above
+REPLACED_INDEXES = [
+    ('ix_transaction_date', 'transaction', ['date']),
+    ('ix_alert_date', 'alert', ['date']),
+    ('ix_product_name', 'product', ['name']),
+    ('ix_warehouse_name', 'warehouse', ['name']),
+    ('ix_client_name', 'client', ['name']),
+]
+
+
+def upgrade() -> None:
+    # On Postgres the indexes are built CONCURRENTLY, outside the migration transaction, so the
+    # tables keep taking writes while a large one is indexed
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, columns, include in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_include=include or [], postgresql_concurrently=concurrently)
+        for name, table, _ in REPLACED_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=concurrently)
+
+
+def downgrade() -> None:
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, columns in REPLACED_INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=concurrently)
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=concurrently)
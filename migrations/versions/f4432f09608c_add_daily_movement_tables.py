@@ -0,0 +1,59 @@
+"""Add product_movement_daily and warehouse_movement_daily tables with the units in and out per day
+
+Revision ID: f4432f09608c
+Revises: 184d3e5a4a2a
+Create Date: 2026-10-18 18:41:07.215390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4432f09608c'
+down_revision: Union[str, None] = '184d3e5a4a2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Units of the 'in' and 'out' lines per key and day, the other transaction types move no stock
+BACKFILL = """
+    INSERT INTO {table} ({key}, day, quantity_in, quantity_out)
+    SELECT {source}, date(t.date),
+           SUM(CASE WHEN t.type = 'in' THEN tp.quantity ELSE 0 END),
+           SUM(CASE WHEN t.type = 'out' THEN tp.quantity ELSE 0 END)
+    FROM "transaction" t
+    JOIN transaction_products tp ON tp.transaction_id = t.id
+    WHERE t.type IN ('in', 'out')
+    GROUP BY {source}, date(t.date)
+"""
+
+
+def upgrade() -> None:
+    op.create_table('product_movement_daily',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('quantity_in', sa.BigInteger(), nullable=False),
+    sa.Column('quantity_out', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'day')
+    )
+    op.create_table('warehouse_movement_daily',
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('quantity_in', sa.BigInteger(), nullable=False),
+    sa.Column('quantity_out', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouse.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('warehouse_id', 'day')
+    )
+
+    # Filled from the existing transactions in one pass, `python -m app.commands.backfill_movements`
+    # rewrites them in chunks of days when a large history has to be rebuilt later
+    op.execute(BACKFILL.format(table='product_movement_daily', key='product_id', source='tp.product_id'))
+    op.execute(BACKFILL.format(table='warehouse_movement_daily', key='warehouse_id', source='t.warehouse_id'))
+
+
+def downgrade() -> None:
+    op.drop_table('warehouse_movement_daily')
+    op.drop_table('product_movement_daily')
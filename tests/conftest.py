@@ -0,0 +1,113 @@
+import asyncio
+import importlib
+import os
+import pkgutil
+import tempfile
+
+# The tests run on a throwaway SQLite database, configured before the app reads its settings
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='stockify-tests-'), 'stockify.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["DB_ECHO"] = "false"
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["HASH_WORKERS"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "5"
+os.environ.setdefault("JWT_SECRET_KEY", "stockify-tests-secret-stockify-tests")
+os.environ["LOG_LEVEL"] = "CRITICAL"
+
+import pytest  # noqa: E402
+
+import app.models  # noqa: E402
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine  # noqa: E402
+from app.models.user_model import User  # noqa: E402
+from app.models.warehouse_model import Warehouse  # noqa: E402
+
+for module in pkgutil.iter_modules(app.models.__path__):
+    importlib.import_module(f"app.models.{module.name}")
+
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    user = User(username="admin", password="not-a-hash", email="admin@stockify.com", role="Admin")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def warehouses(db, user):
+    rows = [Warehouse(name=f"Warehouse {index}", address="Street 1", phone="600000000", user_id=user.id)
+            for index in range(2)]
+    db.add_all(rows)
+    db.commit()
+    return [row.id for row in rows]
+
+
+@pytest.fixture
+def run_async():
+    # Awaits function(*args, async_session) on a fresh event loop, the pooled connections do not outlive it
+    def run(function, *args):
+        async def main():
+            try:
+                async with AsyncSessionLocal() as session:
+                    return await function(*args, session)
+            finally:
+                await async_engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
+
+
+@pytest.fixture
+def make_product(db):
+    from app.repository import product_repository
+    from app.schemas.product_schema import CreateProductSchema
+
+    serial_numbers = iter(range(1, 1_000_000))
+
+    def make(warehouse_id, quantity, price=10.5, category="Ordenadores", kit_id=None, serial_number=None):
+        product = CreateProductSchema(
+            name="Ordenador", quantity=quantity, serial_number=serial_number or f"SN-{next(serial_numbers):06d}",
+            price=price, description=None, category=category, kit_id=kit_id, image_url=None,
+            warehouse_id=warehouse_id)
+        return product_repository.create_product(product, db).id
+
+    return make
+
+
+@pytest.fixture
+def make_transaction(db):
+    from app.repository import transaction_repository
+    from app.schemas.transaction_schema import CreateTransactionSchema, ProductTransaction
+
+    def make(transaction_type, warehouse_id, lines):
+        transaction = CreateTransactionSchema(
+            type=transaction_type, warehouse_id=warehouse_id, client_id=None,
+            products=[ProductTransaction(product_id=product_id, quantity=quantity) for product_id, quantity in lines])
+        return transaction_repository.create_transaction(transaction, db)
+
+    return make
+
+
+@pytest.fixture
+def client(db):
+    # The API with an Admin token, on the same throwaway database
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.utils.token import create_access_token
+
+    with TestClient(app) as client:
+        client.headers["Authorization"] = f"Bearer {create_access_token({'sub': 'admin', 'role': 'Admin'})}"
+        yield client
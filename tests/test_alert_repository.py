@@ -0,0 +1,27 @@
+from app.repository import alert_repository, product_repository, user_repository
+from app.schemas.alert_schema import CreateAlertSchema
+from app.schemas.product_schema import UpdateProductSchema
+from app.schemas.user_schema import UserAlertsResponseSchema
+
+
+def user_alerts(db, user_id):
+    # Validated like the /user/alerts/{user_id} response
+    return sorted(UserAlertsResponseSchema(**user_repository.get_alerts_by_user_id(user_id, db)).alerts,
+                  key=lambda alert: alert.id)
+
+
+def test_stock_changes_raise_and_clear_the_alerts(db, user, warehouses, make_product, make_transaction):
+    product_id = make_product(warehouses[0], 10)
+    low = alert_repository.create_alert(CreateAlertSchema(read=True, min_quantity=5, product_id=product_id,
+                                                          user_id=user.id), db)
+    high = alert_repository.create_alert(CreateAlertSchema(read=True, max_quantity=10, product_id=product_id,
+                                                           user_id=user.id), db)
+    # The new alert is evaluated against the current stock right away
+    assert [(alert.id, alert.triggered, alert.read) for alert in user_alerts(db, user.id)] == \
+        [(low.id, False, True), (high.id, True, False)]
+
+    make_transaction("out", warehouses[0], [(product_id, 6)])
+    assert [(alert.triggered, alert.read) for alert in user_alerts(db, user.id)] == [(True, False), (False, False)]
+
+    product_repository.update_product(product_id, UpdateProductSchema(quantity=7), db)
+    assert [alert.triggered for alert in user_alerts(db, user.id)] == [False, False]
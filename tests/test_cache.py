@@ -0,0 +1,44 @@
+from app.utils import cache as cache_module
+from app.utils.cache import LRUCache, cached, invalidate
+
+
+def test_versions_are_bounded_like_the_entries():
+    cache = LRUCache(max_entries=2, ttl=30)
+    for scope in ("a", "b", "c", "d"):
+        cache.bump(scope)
+    assert list(cache._versions) == ["c", "d"]
+
+
+def test_forgotten_scope_never_goes_back_to_an_older_version():
+    cache = LRUCache(max_entries=2, ttl=30)
+    seen = [cache.version("a")]
+    for _ in range(3):
+        cache.bump("a")
+        seen.append(cache.version("a"))
+        # Writes to other scopes push "a" out of the versions
+        cache.bump("b")
+        cache.bump("c")
+        assert "a" not in cache._versions
+        assert cache.version("a") not in seen[:-1]
+    assert seen == sorted(set(seen))
+
+
+def test_cached_read_is_recomputed_after_its_version_is_evicted(monkeypatch):
+    monkeypatch.setattr(cache_module, "cache", LRUCache(max_entries=2, ttl=30))
+    calls = []
+
+    @cached("product", "product_id")
+    def read(product_id: int, db):
+        calls.append(product_id)
+        return {"id": product_id, "read": len(calls)}
+
+    assert read(1, None) == read(1, None) == {"id": 1, "read": 1}
+    invalidate("product", 1)
+    assert read(1, None) == {"id": 1, "read": 2}
+
+    invalidate("product", 2, 3)
+    assert "product:1" not in cache_module.cache._versions
+    # Nothing wrote to the scope since, its entry stays valid, and the next write still makes it stale
+    assert read(1, None) == {"id": 1, "read": 2}
+    invalidate("product", 1)
+    assert read(1, None) == read(1, None) == {"id": 1, "read": 3}
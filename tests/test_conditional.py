@@ -0,0 +1,83 @@
+import fakeredis
+import pytest
+
+from app.repository import alert_repository
+from app.schemas.alert_schema import CreateAlertSchema
+from app.utils import cache as cache_module
+from app.utils.cache import LRUCache, RedisCache
+
+
+@pytest.fixture
+def redis_cache(monkeypatch):
+    # A RedisCache whose clients talk to an in-process server
+    server = fakeredis.FakeServer()
+    cache = RedisCache("redis://localhost:6379/0", 30)
+    cache._client = fakeredis.FakeRedis(server=server)
+    cache._async_client = fakeredis.FakeAsyncRedis(server=server)
+    monkeypatch.setattr(cache_module, "cache", cache)
+    return cache
+
+
+def test_unchanged_product_answers_304_until_it_is_written(redis_cache, client, warehouses, make_product):
+    product_id = make_product(warehouses[0], 10)
+
+    response = client.get(f"/product/{product_id}")
+    assert response.status_code == 200
+    tag = response.headers["etag"]
+    # A read from the cache gives the same tag
+    assert client.get(f"/product/{product_id}").headers["etag"] == tag
+
+    response = client.get(f"/product/{product_id}", headers={"If-None-Match": f'"other", W/{tag}'})
+    assert (response.status_code, response.headers["etag"], response.content) == (304, tag, b"")
+
+    response = client.put(f"/product/{product_id}", json={"quantity": 4})
+    assert response.status_code == 200
+    response = client.get(f"/product/{product_id}", headers={"If-None-Match": tag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != tag
+    assert response.json()["quantity"] == 4
+
+
+def test_collection_tag_follows_its_writes_and_query(redis_cache, client, warehouses, make_product):
+    make_product(warehouses[0], 10)
+    make_product(warehouses[1], 10)
+    tag = client.get(f"/warehouse/products/{warehouses[0]}").headers["etag"]
+    assert client.get(f"/warehouse/products/{warehouses[0]}?limit=1").headers["etag"] != tag
+    assert client.get(f"/warehouse/products/{warehouses[0]}", headers={"If-None-Match": tag}).status_code == 304
+
+    # A new product of the warehouse changes the collection, the other warehouse keeps its tag
+    other = client.get(f"/warehouse/products/{warehouses[1]}").headers["etag"]
+    make_product(warehouses[0], 1)
+    assert client.get(f"/warehouse/products/{warehouses[0]}", headers={"If-None-Match": tag}).status_code == 200
+    assert client.get(f"/warehouse/products/{warehouses[1]}", headers={"If-None-Match": other}).status_code == 304
+
+
+def test_alerts_tag_changes_with_a_new_alert(db, user, redis_cache, client, warehouses, make_product):
+    product_id = make_product(warehouses[0], 10)
+    alert_repository.create_alert(CreateAlertSchema(read=False, min_quantity=5, product_id=product_id,
+                                                    user_id=user.id), db)
+    tag = client.get(f"/user/alerts/{user.id}").headers["etag"]
+    assert client.get(f"/user/alerts/{user.id}", headers={"If-None-Match": tag}).status_code == 304
+
+    alert_repository.create_alert(CreateAlertSchema(read=False, max_quantity=50, product_id=product_id,
+                                                    user_id=user.id), db)
+    response = client.get(f"/user/alerts/{user.id}", headers={"If-None-Match": tag})
+    assert response.status_code == 200
+    assert len(response.json()["alerts"]) == 2
+
+
+def test_flushed_server_invalidates_every_tag(redis_cache, client, warehouses, make_product):
+    product_id = make_product(warehouses[0], 10)
+    tag = client.get(f"/product/{product_id}").headers["etag"]
+    redis_cache._client.flushall()
+    assert client.get(f"/product/{product_id}", headers={"If-None-Match": tag}).status_code == 200
+
+
+@pytest.mark.parametrize("backend", [None, LRUCache(100, 30)])
+def test_no_tag_without_a_shared_cache(monkeypatch, client, warehouses, make_product, backend):
+    # The versions of an in-process cache only see the writes of its own worker
+    monkeypatch.setattr(cache_module, "cache", backend)
+    product_id = make_product(warehouses[0], 10)
+    response = client.get(f"/product/{product_id}", headers={"If-None-Match": "*"})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
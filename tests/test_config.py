@@ -0,0 +1,32 @@
+import runpy
+
+import app.config.config
+
+
+def load_settings(monkeypatch, **environment):
+    # The settings are read once at import, a fresh copy of the module sees the patched environment
+    for name in ("DATABASE_URL", "ASYNC_DATABASE_URL"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in environment.items():
+        monkeypatch.setenv(name, value)
+    return runpy.run_path(app.config.config.__file__)["settings"]
+
+
+def test_postgres_settings_build_both_urls(monkeypatch):
+    settings = load_settings(monkeypatch, POSTGRES_USER="stockify", POSTGRES_PASSWORD="secret",
+                             POSTGRES_SERVER="db", POSTGRES_PORT="5432", POSTGRES_DB="stockify")
+    assert settings.DATABASE_URL == "postgresql://stockify:secret@db:5432/stockify"
+    assert settings.ASYNC_DATABASE_URL == "postgresql+asyncpg://stockify:secret@db:5432/stockify"
+
+
+def test_database_url_replaces_postgres_settings(monkeypatch):
+    settings = load_settings(monkeypatch, DATABASE_URL="sqlite:///stockify.db")
+    assert settings.DATABASE_URL == "sqlite:///stockify.db"
+    assert settings.ASYNC_DATABASE_URL == "sqlite+aiosqlite:///stockify.db"
+
+
+def test_async_database_url_overrides_the_derived_one(monkeypatch):
+    settings = load_settings(monkeypatch, DATABASE_URL="postgresql://stockify@db/stockify",
+                             ASYNC_DATABASE_URL="postgresql+psycopg://stockify@db/stockify")
+    assert settings.DATABASE_URL == "postgresql://stockify@db/stockify"
+    assert settings.ASYNC_DATABASE_URL == "postgresql+psycopg://stockify@db/stockify"
@@ -0,0 +1,25 @@
+import pytest
+from fastapi import HTTPException
+
+from app.utils.hashing import HashPool, _hash_password
+
+
+def test_pool_rejects_operations_beyond_max_pending():
+    pool = HashPool(workers=0, max_pending=1)
+
+    # With HASH_WORKERS=0 the operation runs in the calling thread, one submitted from inside it finds the pool full
+    def hash_while_full(password):
+        with pytest.raises(HTTPException) as error:
+            pool.submit(_hash_password, password)
+        assert error.value.status_code == 503
+        return _hash_password(password)
+
+    assert pool.run(hash_while_full, "secret").startswith("$2b$05$")
+    stats = pool.stats()
+    assert (stats["pending"], stats["completed"], stats["rejected"]) == (0, 1, 1)
+
+
+def test_pool_accepts_operations_again_once_drained():
+    pool = HashPool(workers=0, max_pending=1)
+    assert pool.run(_hash_password, "secret") != pool.run(_hash_password, "secret")
+    assert pool.stats()["rejected"] == 0
@@ -0,0 +1,67 @@
+import re
+from datetime import datetime
+
+from app.models.transaction_counter_model import TransactionCounter
+from app.models.transaction_model import Transaction
+from app.utils.identifier import IdentifierAllocator, allocator, generate_identifier
+
+PERIOD = "2024/03"
+
+
+def counter(db):
+    db.expire_all()
+    row = db.get(TransactionCounter, PERIOD)
+    return row.last_value if row else None
+
+
+def test_blocks_hand_out_consecutive_numbers(db):
+    numbers = IdentifierAllocator(block_size=3)
+
+    # Reserved on their own connection, two round trips give five numbers and keep one for later
+    assert [numbers.next_number(db.get_bind(), PERIOD) for _ in range(5)] == [1, 2, 3, 4, 5]
+    assert counter(db) == 6
+
+
+def test_numbers_reserved_apart_survive_a_rolled_back_caller(db):
+    numbers = IdentifierAllocator(block_size=1)
+    db.query(Transaction).count()
+
+    assert numbers.next_number(db.get_bind(), PERIOD) == 1
+    db.rollback()
+
+    # The reservation was committed apart, the number is never given again
+    assert numbers.next_number(db.get_bind(), PERIOD) == 2
+    assert counter(db) == 2
+
+
+def test_rolled_back_caller_transaction_undoes_its_reservation(db):
+    numbers = IdentifierAllocator(block_size=10)
+    connection = db.connection()
+    assert numbers.next_number(connection, PERIOD) == 1
+    db.rollback()
+
+    # The counter row is back where it was and no block was cached, so the number is handed out once
+    assert counter(db) is None
+    assert numbers._blocks == {}
+    assert numbers.next_number(db.connection(), PERIOD) == 1
+    assert numbers.next_number(db.connection(), PERIOD) == 2
+    db.commit()
+    assert counter(db) == 2
+
+
+def test_generated_identifiers_stay_unique_after_a_rollback(db, warehouses):
+    # SQLite reserves in the session transaction, the identifier of a rolled back transaction is handed out again
+    first = generate_identifier(db)
+    db.rollback()
+
+    identifiers = []
+    for _ in range(2):
+        identifier = generate_identifier(db)
+        db.add(Transaction(identifier=identifier, type="in", date=datetime.now(), warehouse_id=warehouses[0]))
+        db.commit()
+        identifiers.append(identifier)
+
+    prefix = datetime.now().strftime("TRAN-%Y/%m-")
+    assert identifiers == [first, f"{prefix}0002"]
+    assert re.fullmatch(rf"{re.escape(prefix)}0001", first)
+    assert allocator._blocks == {}
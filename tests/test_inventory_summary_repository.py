@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+from app.models.inventory_summary_model import InventorySummary
+from app.repository import inventory_summary_repository, product_repository, transaction_repository, \
+    warehouse_repository
+from app.schemas.product_schema import UpdateProductSchema
+
+
+def assert_summaries_match(db):
+    db.expire_all()
+    assert inventory_summary_repository.rebuild_summaries(db, dry_run=True) == []
+
+
+def summary(db, warehouse_id):
+    data = inventory_summary_repository.get_summary_by_warehouse_id(warehouse_id, db)
+    return data["products"], data["units"], data["value"]
+
+
+def test_writes_keep_the_summaries_in_step(db, warehouses, make_product, make_transaction):
+    product_id = make_product(warehouses[0], 10, price=2.25)
+    kit_id = make_product(warehouses[0], 1, price=100, category="Kits")
+    make_product(warehouses[0], 4, price=7.5, category="Piezas", kit_id=kit_id)
+    make_product(warehouses[1], 3, price=12, category=None)
+    assert_summaries_match(db)
+    assert summary(db, warehouses[0]) == (3, 15, Decimal("152.50"))
+
+    product_repository.update_product(product_id, UpdateProductSchema(quantity=6, price=3.1), db)
+    assert_summaries_match(db)
+    product_repository.update_product(product_id, UpdateProductSchema(category="Pantallas",
+                                                                      warehouse_id=warehouses[1]), db)
+    assert_summaries_match(db)
+
+    make_transaction("in", warehouses[1], [(product_id, 5)])
+    out = make_transaction("out", warehouses[1], [(product_id, 7)])
+    assert_summaries_match(db)
+    # Deleting a transaction keeps the stock it moved
+    transaction_repository.delete_transaction(out["id"], db)
+    assert_summaries_match(db)
+
+    # The kit goes with its components
+    product_repository.delete_product(kit_id, db)
+    assert_summaries_match(db)
+    assert summary(db, warehouses[0]) == (0, 0, Decimal("0.00"))
+    assert summary(db, warehouses[1]) == (2, 7, Decimal("48.40"))
+
+    warehouse_repository.delete_warehouse(warehouses[1], db)
+    assert_summaries_match(db)
+    assert db.query(InventorySummary).filter(InventorySummary.warehouse_id == warehouses[1],
+                                             InventorySummary.products != 0).count() == 0
+
+
+def test_rebuild_rewrites_a_drifted_summary(db, warehouses, make_product):
+    make_product(warehouses[0], 10, price=2)
+    db.query(InventorySummary).update({InventorySummary.units: 99})
+    db.commit()
+
+    drifted = [{"warehouse_id": warehouses[0], "category": "Ordenadores", "stored": (1, 99, Decimal("20.00")),
+                "expected": (1, 10, Decimal("20.00"))}]
+    assert inventory_summary_repository.rebuild_summaries(db, dry_run=True) == drifted
+    assert inventory_summary_repository.rebuild_summaries(db) == drifted
+    assert_summaries_match(db)
+    assert summary(db, warehouses[0]) == (1, 10, Decimal("20.00"))
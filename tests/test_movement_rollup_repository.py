@@ -0,0 +1,75 @@
+from sqlalchemy import select
+
+from app.models.product_movement_daily_model import ProductMovementDaily
+from app.models.warehouse_movement_daily_model import WarehouseMovementDaily
+from app.repository import movement_rollup_repository, product_repository, transaction_repository, \
+    warehouse_repository
+
+
+def buckets(db):
+    # A deleted transaction leaves its buckets at zero where a rebuild writes none, both report the same
+    def rows(model, key_column):
+        return sorted(db.execute(
+            select(key_column, model.day, model.quantity_in, model.quantity_out)
+            .where((model.quantity_in != 0) | (model.quantity_out != 0))
+        ).all())
+
+    return (rows(ProductMovementDaily, ProductMovementDaily.product_id),
+            rows(WarehouseMovementDaily, WarehouseMovementDaily.warehouse_id))
+
+
+def assert_rebuild_agrees(db):
+    # Rebuilding the buckets from the transaction lines leaves them as the write paths left them
+    maintained = buckets(db)
+    movement_rollup_repository.backfill_movements(db, chunk_days=7)
+    assert buckets(db) == maintained
+    return maintained
+
+
+def warehouse_totals(maintained):
+    return {warehouse_id: (quantity_in, quantity_out) for warehouse_id, _, quantity_in, quantity_out in maintained[1]}
+
+
+def test_transactions_fill_and_leave_the_buckets(db, warehouses, make_product, make_transaction):
+    product_id = make_product(warehouses[0], 10)
+    make_transaction("in", warehouses[0], [(product_id, 5)])
+    out = make_transaction("out", warehouses[1], [(product_id, 7)])
+    assert warehouse_totals(assert_rebuild_agrees(db)) == {warehouses[0]: (5, 0), warehouses[1]: (0, 7)}
+
+    transaction_repository.delete_transaction(out["id"], db)
+    assert warehouse_totals(assert_rebuild_agrees(db)) == {warehouses[0]: (5, 0)}
+
+
+def test_product_delete_takes_its_lines_out_of_the_warehouse_buckets(db, warehouses, make_product,
+                                                                      make_transaction):
+    product_id = make_product(warehouses[0], 10)
+    other_id = make_product(warehouses[1], 3)
+    make_transaction("in", warehouses[0], [(product_id, 5), (other_id, 2)])
+    make_transaction("out", warehouses[1], [(product_id, 7)])
+
+    product_repository.delete_product(product_id, db)
+    assert warehouse_totals(assert_rebuild_agrees(db)) == {warehouses[0]: (2, 0)}
+
+
+def test_kit_delete_takes_the_lines_of_its_components_out(db, warehouses, make_product, make_transaction):
+    kit_id = make_product(warehouses[0], 1, category="Kits")
+    component_id = make_product(warehouses[0], 4, kit_id=kit_id)
+    other_id = make_product(warehouses[0], 4)
+    make_transaction("out", warehouses[0], [(component_id, 3), (other_id, 1)])
+
+    product_repository.delete_product(kit_id, db)
+    assert warehouse_totals(assert_rebuild_agrees(db)) == {warehouses[0]: (0, 1)}
+
+
+def test_warehouse_delete_takes_its_lines_out_of_the_other_buckets(db, warehouses, make_product,
+                                                                   make_transaction):
+    product_id = make_product(warehouses[0], 10)
+    other_id = make_product(warehouses[1], 10)
+    # A line of the other warehouse's product in a transaction of the deleted one, and the reverse
+    make_transaction("in", warehouses[0], [(other_id, 4)])
+    make_transaction("out", warehouses[1], [(product_id, 2), (other_id, 1)])
+
+    warehouse_repository.delete_warehouse(warehouses[0], db)
+    maintained = assert_rebuild_agrees(db)
+    assert warehouse_totals(maintained) == {warehouses[1]: (0, 1)}
+    assert [(row[0], row[2], row[3]) for row in maintained[0]] == [(other_id, 0, 1)]
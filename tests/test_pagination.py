@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.transaction_model import Transaction
+from app.repository import product_repository, transaction_repository
+from app.utils.pagination import PageParams, encode_cursor
+
+
+def walk(fetch, limit):
+    # Follows the cursors from the first page to the last one
+    rows, cursor = [], None
+    while True:
+        page = fetch(PageParams(cursor=cursor, limit=limit))
+        assert len(page.data) <= limit
+        rows.extend(page.data)
+        if page.next_cursor is None:
+            return rows
+        cursor = page.next_cursor
+
+
+def test_cursor_round_trip_over_ties_in_the_sort_key(db, warehouses, make_product, run_async):
+    # Every product has the same name, only the id breaks the tie
+    product_ids = [make_product(warehouses[0], 1) for _ in range(7)]
+
+    rows = walk(lambda page: product_repository.get_products(page, db), 3)
+    assert [row.id for row in rows] == product_ids
+    rows = walk(lambda page: run_async(product_repository.get_products_async, page), 2)
+    assert [row.id for row in rows] == product_ids
+
+
+def test_descending_cursor_round_trip_over_equal_dates(db, warehouses, make_product, make_transaction, run_async):
+    product_id = make_product(warehouses[0], 10)
+    transaction_ids = [make_transaction("in", warehouses[0], [(product_id, 1)])["id"] for _ in range(5)]
+    db.query(Transaction).update({Transaction.date: datetime(2024, 5, 1, 12, 0)})
+    db.commit()
+
+    rows = walk(lambda page: transaction_repository.get_transactions(page, db), 2)
+    assert [row.id for row in rows] == transaction_ids[::-1]
+    rows = walk(lambda page: run_async(transaction_repository.get_transactions_async, page), 4)
+    assert [row.id for row in rows] == transaction_ids[::-1]
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor!", "bm90LWpzb24", encode_cursor("Ordenador", 1)[:-4],
+                                    "WyJPcmRlbmFkb3IiXQ"])
+def test_malformed_cursor_is_a_bad_request(db, cursor):
+    with pytest.raises(HTTPException) as error:
+        product_repository.get_products(PageParams(cursor=cursor, limit=10), db)
+    assert error.value.status_code == 400
+
+
+def test_malformed_date_cursor_is_a_bad_request(db):
+    with pytest.raises(HTTPException) as error:
+        transaction_repository.get_transactions(PageParams(cursor=encode_cursor("yesterday", 1), limit=10), db)
+    assert error.value.status_code == 400
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import exc
+
+from app.db.pool_stats import InstrumentedQueuePool
+
+
+def make_pool(**kwargs):
+    return InstrumentedQueuePool(lambda: sqlite3.connect(":memory:", check_same_thread=False), **kwargs)
+
+
+def test_checkout_that_reenters_the_pool_is_counted_once(monkeypatch):
+    pool = make_pool(pool_size=1, max_overflow=1)
+    inc_overflow = pool._inc_overflow
+    lost_race = []
+
+    # Losing the overflow race once makes QueuePool._do_get call itself again before connecting
+    def inc_overflow_after_losing_once():
+        if not lost_race:
+            lost_race.append(True)
+            return False
+        return inc_overflow()
+
+    monkeypatch.setattr(pool, "_inc_overflow", inc_overflow_after_losing_once)
+
+    connection = pool.connect()
+    snapshot = pool.stats.snapshot(pool)
+    assert (snapshot["checkouts"], snapshot["waiting"], snapshot["connects"]) == (1, 0, 1)
+    assert sum(bucket["count"] for bucket in snapshot["checkout_latency_histogram"]) == 1
+    connection.close()
+
+    # The idle connection is reused, nothing new is opened
+    pool.connect().close()
+    snapshot = pool.stats.snapshot(pool)
+    assert (snapshot["checkouts"], snapshot["connects"]) == (2, 1)
+    assert pool._checkouts == {}
+
+
+def test_checkout_that_times_out_is_kept_apart():
+    pool = make_pool(pool_size=1, max_overflow=0, timeout=0.05)
+    connection = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+
+    snapshot = pool.stats.snapshot(pool)
+    assert (snapshot["checkouts"], snapshot["timeouts"], snapshot["waiting"]) == (1, 1, 0)
+    assert snapshot["timeout_wait_time_total_ms"] >= 50
+    assert snapshot["wait_time_max_ms"] < 50
+    connection.close()
@@ -0,0 +1,55 @@
+from app.models.product_model import Product
+from app.repository import inventory_summary_repository, product_repository, stock_movement_repository
+from app.schemas.product_schema import CreateProductSchema
+
+
+def bulk_product(serial_number, warehouse_id, quantity=3, kit_id=None):
+    return CreateProductSchema(
+        name="Ordenador", quantity=quantity, serial_number=serial_number, price=10.5, description=None,
+        category="Ordenadores", kit_id=kit_id, image_url=None, warehouse_id=warehouse_id)
+
+
+def statuses(response):
+    return [(result["status"], result["detail"]) for result in response["results"]]
+
+
+def test_duplicates_in_the_batch_and_in_the_database_are_rejected_per_row(db, warehouses, make_product):
+    make_product(warehouses[0], 1, serial_number="SN-TAKEN")
+
+    response = product_repository.create_products_bulk([
+        bulk_product("SN-A", warehouses[0]),
+        bulk_product("SN-A", warehouses[0]),
+        # The same serial number in another warehouse is a different product
+        bulk_product("SN-A", warehouses[1]),
+        bulk_product("SN-TAKEN", warehouses[0]),
+        bulk_product("SN-B", 999),
+    ], db)
+
+    assert (response["created"], response["failed"]) == (2, 3)
+    assert statuses(response) == [
+        ("created", None),
+        ("rejected", "Serial Number repeated in the request at index 0"),
+        ("created", None),
+        ("rejected", "Serial Number already registered"),
+        ("rejected", "Warehouse with ID 999 does not exist"),
+    ]
+    created = {result["id"] for result in response["results"] if result["id"] is not None}
+    assert {row.id for row in db.query(Product.id).filter(Product.serial_number == "SN-A")} == created
+
+
+def test_failing_chunk_falls_back_to_row_by_row_savepoints(db, warehouses):
+    # The missing kit only breaks its own INSERT, the rest of the chunk is created
+    response = product_repository.create_products_bulk([
+        bulk_product("SN-A", warehouses[0]),
+        bulk_product("SN-B", warehouses[0], kit_id=999),
+        bulk_product("SN-C", warehouses[1]),
+    ], db)
+
+    assert (response["created"], response["failed"]) == (2, 1)
+    assert [result["status"] for result in response["results"]] == ["created", "rejected", "created"]
+    assert "FOREIGN KEY" in response["results"][1]["detail"]
+    assert sorted(serial for (serial,) in db.query(Product.serial_number)) == ["SN-A", "SN-C"]
+
+    # Only the created rows reached the ledger and the summaries
+    assert stock_movement_repository.rebuild_stock(db, dry_run=True) == []
+    assert inventory_summary_repository.rebuild_summaries(db, dry_run=True) == []
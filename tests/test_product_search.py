@@ -0,0 +1,75 @@
+import pytest
+from fastapi import HTTPException
+
+from app.models.user_model import User
+from app.models.warehouse_model import Warehouse
+from app.repository import product_repository
+from app.schemas.product_schema import CreateProductSchema
+
+
+@pytest.fixture
+def catalog(db, warehouses):
+    products = {}
+    for serial_number, name, category, description, warehouse_id in [
+        ("SN-MON-1", "Monitor Samsung", "Pantallas", None, warehouses[0]),
+        ("SN-MON-2", "Monitor LG", "Pantallas", None, warehouses[1]),
+        ("SN-TEC-1", "Teclado", "Periféricos", None, warehouses[0]),
+        ("SN-TEC-2", "Tecla de repuesto", "Piezas", None, warehouses[0]),
+        ("SN-CAB-1", "Cable HDMI", "Cables", "Para conectar el monitor", warehouses[0]),
+    ]:
+        product = CreateProductSchema(name=name, quantity=1, serial_number=serial_number, price=10.5,
+                                      description=description, category=category, kit_id=None, image_url=None,
+                                      warehouse_id=warehouse_id)
+        products[name] = product_repository.create_product(product, db).id
+    return products
+
+
+def search(db, query, warehouse_id=None, user_id=None, limit=10):
+    return product_repository.search_products(query, warehouse_id, user_id, limit, db)
+
+
+def test_substring_matches_rank_above_fuzzy_ones(db, warehouses, catalog):
+    found = search(db, "teclado", warehouse_id=warehouses[0])
+    # "Tecla de repuesto" only shares some trigrams of the query
+    assert [row.name for row in found] == ["Teclado", "Tecla de repuesto"]
+    assert found[0].score >= 1 > found[1].score
+
+    # A name match ranks above a description match, a misspelt query is still found
+    assert [row.name for row in search(db, "monitor", warehouse_id=warehouses[0])] == \
+        ["Monitor Samsung", "Cable HDMI"]
+    found = search(db, "monitr", warehouse_id=warehouses[0])
+    assert found[0].name == "Monitor Samsung"
+    assert all(row.score < 1 for row in found)
+
+
+def test_short_queries_match_as_substrings(db, user, catalog):
+    assert [row.name for row in search(db, "lg", user_id=user.id)] == ["Monitor LG"]
+    # The name prefix ranks first
+    assert [row.name for row in search(db, "te", user_id=user.id)][:2] == ["Tecla de repuesto", "Teclado"]
+
+
+def test_search_is_scoped_to_a_warehouse_or_to_the_warehouses_of_a_user(db, user, warehouses, catalog, run_async):
+    other = User(username="other", password="not-a-hash", email="other@stockify.com", role="Admin")
+    db.add(other)
+    db.flush()
+    db.add(Warehouse(name="Other", address="Street 2", phone="600000001", user_id=other.id))
+    db.commit()
+
+    assert [row.name for row in search(db, "monitor", warehouse_id=warehouses[1])] == ["Monitor LG"]
+    assert {row.name for row in search(db, "monitor", user_id=user.id)} == \
+        {"Monitor Samsung", "Monitor LG", "Cable HDMI"}
+    assert run_async(product_repository.search_products_async, "monitor", None, other.id, 10) == []
+    assert len(search(db, "monitor", user_id=user.id, limit=2)) == 2
+
+
+@pytest.mark.parametrize("query, warehouse_id, user_id, status_code", [
+    ("monitor", 999, None, 404),
+    ("monitor", None, 999, 404),
+    ("monitor", 1, 1, 400),
+    ("monitor", None, None, 400),
+    ("   ", 1, None, 400),
+])
+def test_search_rejects_a_bad_scope(db, warehouses, query, warehouse_id, user_id, status_code):
+    with pytest.raises(HTTPException) as error:
+        search(db, query, warehouse_id, user_id)
+    assert error.value.status_code == status_code
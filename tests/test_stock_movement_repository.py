@@ -0,0 +1,54 @@
+from sqlalchemy import func, select
+
+from app.models.product_model import Product
+from app.models.stock_movement_model import StockMovement
+from app.repository import product_repository, stock_movement_repository, transaction_repository
+from app.schemas.product_schema import UpdateProductSchema
+from app.utils.pagination import PageParams
+
+
+def assert_ledger_matches(db):
+    # Every stored quantity is the sum of its ledger entries, and a rebuild finds nothing to correct
+    db.expire_all()
+    ledger = dict(db.execute(
+        select(StockMovement.product_id, func.sum(StockMovement.delta)).group_by(StockMovement.product_id)).all())
+    stored = dict(db.execute(select(Product.id, Product.quantity)).all())
+    assert {product_id: ledger.get(product_id, 0) for product_id in stored} == stored
+    assert stock_movement_repository.rebuild_stock(db, dry_run=True) == []
+
+
+def test_writes_keep_the_ledger_and_the_quantity_in_step(db, warehouses, make_product, make_transaction):
+    product_id = make_product(warehouses[0], 10)
+    other_id = make_product(warehouses[1], 3)
+    assert_ledger_matches(db)
+
+    make_transaction("in", warehouses[0], [(product_id, 5), (other_id, 2)])
+    out = make_transaction("out", warehouses[0], [(product_id, 7)])
+    assert_ledger_matches(db)
+
+    # A manual correction and a move to another warehouse
+    product_repository.update_product(product_id, UpdateProductSchema(quantity=6), db)
+    product_repository.update_product(other_id, UpdateProductSchema(quantity=1, warehouse_id=warehouses[0]), db)
+    assert_ledger_matches(db)
+
+    transaction_repository.delete_transaction(out["id"], db)
+    assert_ledger_matches(db)
+
+    reasons = [movement["reason"] for movement in stock_movement_repository.get_movements_by_product_id(
+        other_id, PageParams(cursor=None, limit=10), db).data["movements"]]
+    assert sorted(reasons) == ["in", "opening", "transfer_in", "transfer_out"]
+
+
+def test_rebuild_corrects_a_drifted_quantity(db, warehouses, make_product, make_transaction):
+    product_id = make_product(warehouses[0], 10)
+    make_transaction("out", warehouses[0], [(product_id, 4)])
+    db.query(Product).filter(Product.id == product_id).update({Product.quantity: 50})
+    db.commit()
+
+    drifted = [{"product_id": product_id, "warehouse_id": warehouses[0], "quantity": 50, "expected": 6}]
+    assert stock_movement_repository.rebuild_stock(db, dry_run=True) == drifted
+    assert db.get(Product, product_id).quantity == 50
+
+    assert stock_movement_repository.rebuild_stock(db) == drifted
+    assert_ledger_matches(db)
+    assert db.get(Product, product_id).quantity == 6
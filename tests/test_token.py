@@ -0,0 +1,61 @@
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from app.utils import token as token_module
+from app.utils.cache import LRUCache
+from app.utils.token import ALGORITHM, SECRET_KEY, create_access_token, verify_token
+
+credentials_exception = HTTPException(status_code=401, detail="Could not validate credentials")
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    # A fresh token cache, and the tokens that had to be decoded
+    monkeypatch.setattr(token_module, "verified_tokens", LRUCache(100, 60))
+    decoded = []
+    decode = jwt.decode
+
+    def counted_decode(token, *args, **kwargs):
+        decoded.append(token)
+        return decode(token, *args, **kwargs)
+
+    monkeypatch.setattr(token_module.jwt, "decode", counted_decode)
+    return decoded
+
+
+def test_verified_token_is_served_from_the_cache(decodes):
+    token = create_access_token({"sub": "admin", "role": "Admin"})
+    first = verify_token(token, credentials_exception)
+    assert verify_token(token, credentials_exception) == first
+    assert (first.username, first.role) == ("admin", "Admin")
+    assert decodes == [token]
+
+
+def test_cached_token_expires_with_its_exp(decodes):
+    token = jwt.encode({"sub": "admin", "role": "Admin", "exp": time.time() + 1}, SECRET_KEY, algorithm=ALGORITHM)
+    verify_token(token, credentials_exception)
+    verify_token(token, credentials_exception)
+    assert decodes == [token]
+
+    time.sleep(1.1)
+    with pytest.raises(HTTPException):
+        verify_token(token, credentials_exception)
+    assert decodes == [token, token]
+
+
+def test_tampered_token_misses_the_cache(decodes):
+    token = create_access_token({"sub": "admin", "role": "Admin"})
+    verify_token(token, credentials_exception)
+
+    header, payload, signature = token.split(".")
+    forged = jwt.encode({"sub": "admin", "role": "Admin"}, "not-the-secret-key-not-the-secret", algorithm=ALGORITHM)
+    # A broken signature, and the claims of a token signed with another key under the original signature
+    tampered = [f"{header}.{payload}.{signature[:-2]}AA", f"{header}.{forged.split('.')[1]}.{signature}"]
+    for candidate in tampered:
+        with pytest.raises(HTTPException):
+            verify_token(candidate, credentials_exception)
+    assert decodes == [token, *tampered]
+    assert len(token_module.verified_tokens._entries) == 1
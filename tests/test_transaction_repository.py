@@ -0,0 +1,46 @@
+import pytest
+from fastapi import HTTPException
+
+from app.models.product_model import Product
+from app.models.transaction_model import Transaction
+
+
+def quantity(db, product_id):
+    db.expire_all()
+    return db.get(Product, product_id).quantity
+
+
+def test_in_and_out_transactions_move_stock(db, warehouses, make_product, make_transaction):
+    product_id = make_product(warehouses[0], 10)
+    other_id = make_product(warehouses[0], 4)
+
+    make_transaction("in", warehouses[0], [(product_id, 5), (other_id, 1)])
+    assert (quantity(db, product_id), quantity(db, other_id)) == (15, 5)
+
+    # Lines of the same product are applied together
+    make_transaction("out", warehouses[0], [(product_id, 3), (product_id, 4), (other_id, 5)])
+    assert (quantity(db, product_id), quantity(db, other_id)) == (8, 0)
+
+
+def test_out_transaction_above_stock_is_rejected(db, warehouses, make_product, make_transaction):
+    product_id = make_product(warehouses[0], 2)
+    other_id = make_product(warehouses[0], 20)
+
+    with pytest.raises(HTTPException) as error:
+        make_transaction("out", warehouses[0], [(other_id, 5), (product_id, 1), (product_id, 2)])
+    assert error.value.status_code == 400
+    assert error.value.detail == f"Insufficient stock for product {product_id}"
+
+    # Nothing of the rejected transaction is kept
+    assert (quantity(db, product_id), quantity(db, other_id)) == (2, 20)
+    assert db.query(Transaction).count() == 0
+
+
+def test_transaction_of_missing_product_is_not_found(db, warehouses, make_product, make_transaction):
+    product_id = make_product(warehouses[0], 3)
+
+    with pytest.raises(HTTPException) as error:
+        make_transaction("in", warehouses[0], [(product_id, 1), (404, 1)])
+    assert error.value.status_code == 404
+    assert quantity(db, product_id) == 3
+    assert db.query(Transaction).count() == 0
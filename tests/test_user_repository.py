@@ -0,0 +1,69 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from passlib.context import CryptContext
+
+from app.models.user_model import User
+from app.repository import auth_repository, user_repository
+from app.schemas.user_schema import CreateUserSchema, UpdateUserSchema
+from app.utils.hashing import Hash, hash_pool
+
+
+def new_user(username="pepe"):
+    return CreateUserSchema(username=username, password="secret", email=f"{username}@stockify.com", role="Admin",
+                            image_url=None, admin_id=None)
+
+
+def login(username, password):
+    return OAuth2PasswordRequestForm(username=username, password=password)
+
+
+def stored_hash(db, user_id):
+    db.expire_all()
+    return db.get(User, user_id).password
+
+
+def test_async_create_and_update_hash_the_password(db, run_async):
+    created = run_async(user_repository.create_user_async, new_user())
+    assert Hash.verify_password("secret", stored_hash(db, created.id))
+
+    run_async(user_repository.update_user_async, created.id, UpdateUserSchema(password="changed"))
+    assert Hash.verify_password("changed", stored_hash(db, created.id))
+    assert not Hash.verify_password("secret", stored_hash(db, created.id))
+
+
+def test_async_create_and_update_answer_503_when_the_hash_pool_is_full(db, run_async, monkeypatch):
+    created = run_async(user_repository.create_user_async, new_user())
+    password = stored_hash(db, created.id)
+
+    monkeypatch.setattr(hash_pool, "pending", hash_pool.max_pending)
+    with pytest.raises(HTTPException) as error:
+        run_async(user_repository.create_user_async, new_user("maria"))
+    assert error.value.status_code == 503
+    with pytest.raises(HTTPException) as error:
+        run_async(user_repository.update_user_async, created.id, UpdateUserSchema(password="changed"))
+    assert error.value.status_code == 503
+
+    # Nothing was written by the rejected operations
+    assert db.query(User).count() == 1
+    assert stored_hash(db, created.id) == password
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_login_rehashes_a_password_made_with_other_rounds(db, run_async, asynchronous):
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secret")
+    user = User(username="pepe", password=old_hash, email="pepe@stockify.com", role="Admin")
+    db.add(user)
+    db.commit()
+
+    if asynchronous:
+        token = run_async(auth_repository.auth_user_async, login("pepe", "secret"))
+    else:
+        token = auth_repository.auth_user(login("pepe", "secret"), db)
+    assert token["id"] == user.id
+
+    # The hash now uses BCRYPT_ROUNDS (5 in the tests) and still matches, a second login keeps it
+    new_hash = stored_hash(db, user.id)
+    assert new_hash.startswith("$2b$05$") and Hash.verify_password("secret", new_hash)
+    auth_repository.auth_user(login("pepe", "secret"), db)
+    assert stored_hash(db, user.id) == new_hash
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from app.config.config import settings
+from app.repository import warehouse_repository
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # Two rows per round trip and a chunk per transaction, so the history spans several of both
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(warehouse_repository, "EXPORT_CHUNK_SIZE", 1)
+
+
+@pytest.fixture
+def history(warehouses, make_product, make_transaction):
+    first, second = make_product(warehouses[0], 50), make_product(warehouses[0], 50)
+    # Two lines per transaction, so a transaction can start in one batch and end in the next one
+    transactions = [make_transaction("in" if index % 2 else "out", warehouses[0], [(first, 1), (second, index + 1)])
+                    for index in range(5)]
+    make_transaction("in", warehouses[1], [(make_product(warehouses[1], 1), 1)])
+    return transactions
+
+
+def exported(chunks, export_format):
+    body = "".join(chunks)
+    if export_format == "ndjson":
+        return [json.loads(line) for line in body.splitlines()]
+    return json.loads(body)
+
+
+@pytest.mark.parametrize("export_format", ["ndjson", "json"])
+def test_stream_keeps_every_transaction_whole_across_batches(small_batches, history, warehouses, export_format):
+    chunks = list(warehouse_repository.stream_transactions_by_warehouse_id(warehouses[0], export_format))
+    assert len(chunks) > 1
+
+    rows = exported(chunks, export_format)
+    assert [row["id"] for row in rows] == sorted((transaction["id"] for transaction in history), reverse=True)
+    for row, transaction in zip(rows, reversed(history)):
+        assert row["identifier"] == transaction["identifier"]
+        assert row["warehouse_id"] == warehouses[0]
+        assert sorted(line["quantity"] for line in row["products"]) == \
+            sorted(line["quantity"] for line in transaction["products"])
+
+
+@pytest.mark.parametrize("export_format, empty", [("ndjson", []), ("json", ["[]"])])
+def test_stream_of_an_empty_history(warehouses, export_format, empty):
+    assert list(warehouse_repository.stream_transactions_by_warehouse_id(warehouses[0], export_format)) == empty
+
+
+@pytest.mark.parametrize("export_format, media_type", [("ndjson", "application/x-ndjson"),
+                                                       ("json", "application/json")])
+def test_export_route_streams_the_history(small_batches, history, warehouses, client, export_format, media_type):
+    response = client.get(f"/warehouse/transactions/{warehouses[0]}/export", params={"format": export_format})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(media_type)
+    assert f"warehouse_{warehouses[0]}_transactions.{export_format}" in response.headers["content-disposition"]
+    assert len(exported([response.text], export_format)) == len(history)
+
+
+def test_export_route_of_an_unknown_warehouse(db, user, client):
+    response = client.get("/warehouse/transactions/999/export")
+    assert response.status_code == 404